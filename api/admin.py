@@ -1,5 +1,5 @@
 from flask import Blueprint, flash, current_app, request, redirect, jsonify
-from helpers import is_admin, get_current_user, notify
+from helpers import is_admin, get_current_user, notify, clear_site_config_cache, clear_popular_tags_cache, bump_search_cache_version
 from models import Feedback, Character, Location, ChapterGuide, Tag, News, Role, SiteConfig, CreditPackage, CreditConfig, TokenCostConfig, User, Story, db
 from flask import url_for
 bp = Blueprint('admin', __name__)
@@ -354,6 +354,7 @@ def delete_story(story_id):
     Location.query.filter_by(story_id=story.id).delete()
     ChapterGuide.query.filter_by(story_id=story.id).delete()
     db.session.commit()
+    bump_search_cache_version()
     from helpers import delete_images_for_story
     delete_images_for_story(story_id)
     flash("Story Deleted")
@@ -442,6 +443,7 @@ def tags():
         tag = Tag(name=name, description=description)
         db.session.add(tag)
         db.session.commit()
+        clear_popular_tags_cache()
         flash("Tag Created")
     return redirect(url_for('admin_views.tags'))
 
@@ -469,6 +471,7 @@ def edit_tag(tag_id):
     tag.name = request.form.get("name")
     tag.description = request.form.get("description")
     db.session.commit()
+    clear_popular_tags_cache()
     flash("Tag Edited")
     return redirect(url_for('admin_views.tags'))
 
@@ -494,6 +497,7 @@ def delete_tag(tag_id):
     tag = Tag.query.get_or_404(tag_id)
     db.session.delete(tag)
     db.session.commit()
+    clear_popular_tags_cache()
     flash("Tag Deleted")
     return redirect(url_for('admin_views.tags'))
 
@@ -518,6 +522,7 @@ def update_site_config():
     site_config.registration_disabled = bool(request.form.get("registration_disabled"))
     site_config.maintenance_mode = bool(request.form.get("maintenance_mode"))
     db.session.commit()
+    clear_site_config_cache()
     flash("Config Updated")
     return redirect(url_for('admin_views.site_settings'))
 
@@ -551,6 +556,7 @@ def delete_user(user_id):
         return jsonify({"error": "User has an active subscription."}), 400  
     db.session.delete(user_to_delete)
     db.session.commit()
+    bump_search_cache_version()
     notify(f"User {user_to_delete.username} deleted.", user.id)
     return jsonify({"message": f"User {user_to_delete.username} deleted."})
 
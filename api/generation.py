@@ -1,30 +1,31 @@
 import eventlet
 eventlet.monkey_patch(all=False, socket=True)
 import redis
-from flask import Blueprint, request, jsonify
-from helpers import notify, get_current_user, is_story_author_or_admin, can_spend_credits
+import uuid
+from flask import Blueprint, request, jsonify, current_app
+from helpers import notify, get_current_user, is_authenticated, is_story_author_or_admin, can_spend_credits
 from predictions import (
     calculate_predicted_story_arcs_cost,
     calculate_predicted_meta_cost,
+    calculate_predicted_meta_cost_batch,
     calculate_predicted_summaries_cost,
     calculate_predicted_chapter_cost,
     calculate_predicted_all_chapters_cost,
     calculate_predicted_chapter_guide_cost,
     calculate_predicted_story_arcs_cost,
-    calculate_image_cost
-)
-from models import Story, Chapter, GenerationLog, db, Character, Location, ChapterGuide
-from prompt_templates import (
-    build_meta_prompt,
-    build_story_arcs_prompt,
-    build_chapter_guide_prompt,
-    build_chapter_summaries_prompt,
-    build_chapter_content_prompt
+    calculate_predicted_total_cost,
+    calculate_image_cost,
+    story_cost_fingerprint,
+    PREDICTED_COST_CACHE_TTL
 )
+from models import Story, Chapter, GenerationLog, db
+from openai_handler import model_for
 import json
 
 bp = Blueprint('generation', __name__)
 locking_queue = redis.StrictRedis(host='localhost', port=6379, db=2, decode_responses=True)
+BATCH_GENERATION_LOCK_EXPIRE = 25 * 3600
+PREDICT_BATCH_LIMIT = 100
 
 def set_user_generation_lock(user_id, expire=2000):
     """
@@ -61,6 +62,59 @@ def clear_user_generation_lock(user_id):
     key = f"generation_lock:{user_id}"
     locking_queue.delete(key)
 
+def cost_prediction_key(kind, story, user_id, chapter_index=None):
+    """
+	Builds the Redis key that holds a story's pending or finished exact cost prediction for a user.
+    
+    Args:
+        kind (str): The prediction kind (see PREDICTED_COST_FUNCTIONS).
+        story (Story): The story being priced.
+        user_id (int): The ID of the user who asked for the prediction.
+        chapter_index (int, optional): The zero-based chapter index when kind is "chapter".
+    
+    Returns:
+        str: The key; it changes whenever the story changes in a way that affects its price.
+    """
+    return f"cost_prediction:{user_id}:{kind}:{chapter_index}:{story_cost_fingerprint(story)}"
+
+def cost_preview(kind, story, chapter_index=None):
+    """
+	Returns the body of a cost preview response for the current user.
+    
+    An exact prediction already in this process's prediction cache, or one a predict_cost_task has
+    already stored for the same story state, is returned inline. Otherwise the byte-based estimate is
+    returned along with the job_id of the exact prediction; a task already queued for the same story
+    state is reused rather than queued again. Its result is pushed to the user's socket room as a
+    "cost_predicted" event whose job_id matches.
+    
+    Args:
+        kind (str): The prediction kind, e.g. "meta", "arcs" or "chapter" (see PREDICTED_COST_FUNCTIONS).
+        story (Story): The story to price.
+        chapter_index (int, optional): The zero-based chapter index when kind is "chapter".
+    
+    Returns:
+        dict: {"total_predicted_credit_cost": <int>}, plus "job_id" when the total is only an estimate.
+    """
+    from tasks import predict_cost_task
+    total = calculate_predicted_total_cost(kind, story, chapter_index, cached_only=True)
+    if total is not None:
+        return {"total_predicted_credit_cost": total}
+    user = get_current_user()
+    key = cost_prediction_key(kind, story, user.id, chapter_index)
+    stored = locking_queue.hgetall(key)
+    if "total" in stored:
+        return {"total_predicted_credit_cost": int(stored["total"])}
+    job_id = str(uuid.uuid4())
+    if locking_queue.hsetnx(key, "job_id", job_id):
+        locking_queue.expire(key, PREDICTED_COST_CACHE_TTL)
+        predict_cost_task.apply_async(args=(kind, story.id, user.id, chapter_index, key), task_id=job_id)
+    else:
+        job_id = locking_queue.hget(key, "job_id")
+    return {
+        "total_predicted_credit_cost": calculate_predicted_total_cost(kind, story, chapter_index, estimate=True),
+        "job_id": job_id
+    }
+
 @bp.route('/api/predict_meta_cost/<int:story_id>', methods=["GET"])
 @is_story_author_or_admin
 def predict_meta_cost(story_id):
@@ -77,9 +131,33 @@ def predict_meta_cost(story_id):
     story = Story.query.get(story_id)
     if not story:
         return jsonify({"error": "Story not found."}), 404
-    prediction = calculate_predicted_meta_cost(story)
+    return jsonify(cost_preview("meta", story))
+
+@bp.route('/api/predict_meta_costs', methods=["POST"])
+@is_authenticated
+def predict_meta_costs():
+    """
+	Predicts the meta cost for several of the current user's stories at once.
+    
+    The request body is {"story_ids": [...]} with at most PREDICT_BATCH_LIMIT IDs. Stories that do not
+    exist or belong to another user (unless the user is an admin) are left out of the response.
+    
+    Returns:
+        flask.Response: A JSON object mapping each story ID to its total predicted credit cost,
+                        or a 400 error if story_ids is not a list of integers.
+    """
+    user = get_current_user()
+    try:
+        story_ids = [int(story_id) for story_id in (request.json or {}).get("story_ids", [])][:PREDICT_BATCH_LIMIT]
+    except (TypeError, ValueError):
+        return jsonify({"error": "story_ids must be a list of integers."}), 400
+    query = Story.query.filter(Story.id.in_(story_ids))
+    if user.role.name != "admin":
+        query = query.filter(Story.user_id == user.id)
+    predictions = calculate_predicted_meta_cost_batch(query.all())
     return jsonify({
-        "total_predicted_credit_cost": prediction.get('total_predicted_credit_cost')
+        str(story_id): prediction.total_credit_cost
+        for story_id, prediction in predictions.items()
     })
 
 @bp.route('/api/predict_arcs_cost/<int:story_id>', methods=["GET"])
@@ -101,10 +179,7 @@ def predict_arcs_cost(story_id):
     story = Story.query.get(story_id)
     if not story:
         return jsonify({"error": "Story not found."}), 404
-    prediction = calculate_predicted_story_arcs_cost(story)
-    return jsonify({
-        "total_predicted_credit_cost": prediction.get('total_predicted_credit_cost')
-    })
+    return jsonify(cost_preview("arcs", story))
 
 @bp.route('/api/predict_chapter_guide_cost/<int:story_id>', methods=["GET"])
 @is_story_author_or_admin
@@ -125,10 +200,7 @@ def predict_chapter_guide_cost(story_id):
     story = Story.query.get(story_id)
     if not story:
         return jsonify({"error": "Story not found."}), 404
-    prediction = calculate_predicted_chapter_guide_cost(story)
-    return jsonify({
-        "total_predicted_credit_cost": prediction.get('total_predicted_credit_cost')
-    })
+    return jsonify(cost_preview("chapter_guide", story))
 
 @bp.route('/api/predict_summaries_cost/<int:story_id>', methods=["GET"])
 @is_story_author_or_admin
@@ -151,10 +223,7 @@ def predict_summaries_cost(story_id):
     story = Story.query.get(story_id)
     if not story:
         return jsonify({"error": "Story not found."}), 404
-    prediction = calculate_predicted_summaries_cost(story)
-    return jsonify({
-        "total_predicted_credit_cost": prediction.get('total_predicted_credit_cost')
-    })
+    return jsonify(cost_preview("summaries", story))
 
 @bp.route('/api/predict_chapter_cost/<int:story_id>/<int:chapter_number>', methods=["GET"])
 @is_story_author_or_admin
@@ -177,10 +246,7 @@ def predict_chapter_cost(story_id, chapter_number):
     if not story:
         return jsonify({"error": "Story not found."}), 404
     chapter_index = chapter_number - 1
-    prediction = calculate_predicted_chapter_cost(story, chapter_index)
-    return jsonify({
-        "total_predicted_credit_cost": prediction.get('total_predicted_credit_cost')
-    })
+    return jsonify(cost_preview("chapter", story, chapter_index))
 
 @bp.route('/api/predict_all_chapters_cost/<int:story_id>', methods=["GET"])
 @is_story_author_or_admin
@@ -201,10 +267,7 @@ def predict_all_chapters_cost(story_id):
     story = Story.query.get(story_id)
     if not story:
         return jsonify({"error": "Story not found."}), 404
-    prediction = calculate_predicted_all_chapters_cost(story)
-    return jsonify({
-        "total_predicted_credit_cost": prediction.get('total_predicted_credit_cost')
-    })
+    return jsonify(cost_preview("all_chapters", story))
 
 @bp.route('/api/predict_image_cost/<int:story_id>', methods=["GET"])
 @is_story_author_or_admin
@@ -380,8 +443,8 @@ def api_generate_meta():
     story = Story.query.get(story_id)
     if not story:
         return jsonify({"error": "Story not found."}), 404
-    prediction = calculate_predicted_meta_cost(story)
-    total_predicted_cost = prediction.get("total_predicted_credit_cost")
+    prediction = calculate_predicted_meta_cost(story, fresh=True)
+    total_predicted_cost = prediction.total_credit_cost
     if not can_spend_credits(user, "text", total_predicted_cost):
         notify("You Don't Have Enough Credits!", user.id)
         return jsonify({
@@ -389,11 +452,8 @@ def api_generate_meta():
             "required": total_predicted_cost,
             "available": user.text_credits
         }), 400
-    tags = ", ".join([tag.name for tag in story.tags]) if story.tags else ""
-    inspirations = story.inspirations
-    full_prompt = build_meta_prompt(story.title, story.details, tags, inspirations, story.chapters_count)
     try:
-        task = generate_meta_task.delay(int(story_id), full_prompt, user.id, prediction["input_tokens"])
+        task = generate_meta_task.delay(int(story_id), prediction.prompt, user.id, prediction.input_tokens, story.quality_tier)
         log_entry = GenerationLog(
             user_id=user.id,
             task_id=task.id,
@@ -407,7 +467,7 @@ def api_generate_meta():
         return jsonify({
             "task_id": task.id,
             "status": "queued",
-            "predicted_cost": prediction
+            "predicted_cost": prediction.to_dict()
         })
     except Exception as e:
         notify("Metadata Generation Failed", user.id)
@@ -439,23 +499,8 @@ def api_generate_arcs():
     story = Story.query.get(story_id)
     if not story:
         return jsonify({"error": "Story not found."}), 404
-    num_chapters = story.chapters_count
-    characters = Character.query.filter_by(story_id=story.id).all()
-    locations = Location.query.filter_by(story_id=story.id).all()
-    meta = {
-        "characters": [{"name": c.name, "description": c.description} for c in characters],
-        "locations": [{"name": l.name, "description": l.description} for l in locations]
-    }
-    tags = ", ".join([tag.name for tag in story.tags]) if story.tags else ""
-    full_prompt = build_story_arcs_prompt(
-        title=story.title,
-        details=story.details,
-        total_chapters=num_chapters,
-        tags=tags,
-        meta=meta
-    )
-    prediction = calculate_predicted_story_arcs_cost(story)
-    total_predicted_cost = prediction.get("total_predicted_credit_cost")
+    prediction = calculate_predicted_story_arcs_cost(story, fresh=True)
+    total_predicted_cost = prediction.total_credit_cost
     if not can_spend_credits(user, "text", total_predicted_cost):
         notify("You Don't Have Enough Credits!", user.id)
         return jsonify({
@@ -464,7 +509,7 @@ def api_generate_arcs():
             "available": user.text_credits
         }), 400
     try:
-        task = generate_story_arcs_task.delay(int(story_id), full_prompt, user.id, prediction["input_tokens"])
+        task = generate_story_arcs_task.delay(int(story_id), prediction.prompt, user.id, prediction.input_tokens, story.quality_tier)
         log_entry = GenerationLog(
             user_id=user.id,
             task_id=task.id,
@@ -478,7 +523,7 @@ def api_generate_arcs():
         return jsonify({
             "task_id": task.id,
             "status": "queued",
-            "predicted_cost": prediction
+            "predicted_cost": prediction.to_dict()
         })
     except Exception as e:
         notify("Story Arcs Generation Failed", user.id)
@@ -513,15 +558,8 @@ def api_generate_summaries():
     if not set_user_generation_lock(user.id):
         notify("A generation task is already in progress", user.id)
         return jsonify({"error": "A generation task is already in progress."}), 400
-    tags = ", ".join([tag.name for tag in story.tags]) if story.tags else ""
-    meta = {
-        "characters": [{"name": c.name, "description": c.description} for c in Character.query.filter_by(story_id=story.id).all()],
-        "locations": [{"name": l.name, "description": l.description} for l in Location.query.filter_by(story_id=story.id).all()]
-    }
-    arcs = [arc.arc_text for arc in story.arcs]
-    full_prompt = build_chapter_summaries_prompt(story.title, story.details, tags, meta, arcs, story.inspirations, story.chapters_count)
-    prediction = calculate_predicted_summaries_cost(story)
-    total_predicted_cost = prediction.get("total_predicted_credit_cost")
+    prediction = calculate_predicted_summaries_cost(story, fresh=True)
+    total_predicted_cost = prediction.total_credit_cost
     if not can_spend_credits(user, "text", total_predicted_cost):
         notify("You Don't Have Enough Credits!", user.id)
         return jsonify({
@@ -530,7 +568,7 @@ def api_generate_summaries():
             "available": user.text_credits
         }), 400
     try:
-        task = generate_summaries_task.delay(int(story_id), full_prompt, user.id, prediction["input_tokens"])
+        task = generate_summaries_task.delay(int(story_id), prediction.prompt, user.id, prediction.input_tokens, story.quality_tier)
         log_entry = GenerationLog(
             user_id=user.id,
             task_id=task.id,
@@ -544,7 +582,7 @@ def api_generate_summaries():
         return jsonify({
             "task_id": task.id,
             "status": "queued",
-            "predicted_cost": prediction
+            "predicted_cost": prediction.to_dict()
         })
     except Exception as e:
         notify("Summaries Generation Failed", user.id)
@@ -578,30 +616,8 @@ def api_generate_chapter_guide():
     if not story:
         return jsonify({"error": "Story not found."}), 404    
 
-    characters = Character.query.filter_by(story_id=story.id).all()
-    locations = Location.query.filter_by(story_id=story.id).all()
-    meta = {
-        "characters": [{"name": char.name, "description": char.description or ""} for char in characters],
-        "locations": [{"name": loc.name, "description": loc.description or ""} for loc in locations]
-    }
-    sorted_chapters = sorted(story.chapters, key=lambda c: c.chapter_number)
-    chapters = [ch.title for ch in sorted_chapters]
-    summaries = [ch.summary or "" for ch in sorted_chapters]
-    overall_arcs = [arc.arc_text for arc in story.arcs] if story.arcs else []
-    tags_str = ", ".join([tag.name for tag in story.tags]) if story.tags else ""
-    
-    full_prompt = build_chapter_guide_prompt(
-        story.title,
-        story.details or "",
-        tags_str,
-        meta,
-        chapters,
-        summaries,
-        overall_arcs
-    )
-    
-    prediction = calculate_predicted_chapter_guide_cost(story)
-    total_predicted_cost = prediction.get("total_predicted_credit_cost")
+    prediction = calculate_predicted_chapter_guide_cost(story, fresh=True)
+    total_predicted_cost = prediction.total_credit_cost
     if not can_spend_credits(user, "text", total_predicted_cost):
         notify("You Don't Have Enough Credits!", user.id)
         return jsonify({
@@ -611,7 +627,7 @@ def api_generate_chapter_guide():
         }), 400
     
     try:
-        task = generate_chapter_guide_task.delay(story_id, full_prompt, user.id, prediction["input_tokens"])
+        task = generate_chapter_guide_task.delay(story_id, prediction.prompt, user.id, prediction.input_tokens, story.quality_tier)
         log_entry = GenerationLog(
             user_id=user.id,
             task_id=task.id,
@@ -625,7 +641,7 @@ def api_generate_chapter_guide():
         return jsonify({
             "task_id": task.id,
             "status": "queued",
-            "predicted_cost": prediction
+            "predicted_cost": prediction.to_dict()
         })
     except Exception as e:
         notify("Detailed Story Arcs Generation Failed", user.id)
@@ -663,64 +679,12 @@ def api_generate_chapter():
         notify("A generation task is already in progress", user.id)
         return jsonify({"error": "A generation task is already in progress."}), 400
 
-    chapters = Chapter.query.filter_by(story_id=story.id).order_by(Chapter.chapter_number).all()
-    if not chapters or len(chapters) < chapter_number:
+    if len(story.chapters) < chapter_number:
         clear_user_generation_lock(user.id)
         return jsonify({"error": "Chapter data not found."}), 400
 
-    chapter_obj = chapters[chapter_number - 1]
-    chapter_title = chapter_obj.title
-    chapter_summary = chapter_obj.summary if chapter_obj.summary else ""
-    previous_summary = chapters[chapter_number - 2].summary if chapter_number - 2 >= 0 else ""
-    next_summary = chapters[chapter_number].summary if chapter_number < len(chapters) else ""
-
-    tags = ", ".join([tag.name for tag in story.tags]) if story.tags else ""
-    chapter_mappings = ChapterGuide.query.filter_by(
-        story_id=story_id, chapter_title=chapter_title
-    ).order_by(ChapterGuide.part_index).all()
-    
-    detailed_arc_parts = [{
-        "arc_text": mapping.part_text,
-        "characters": mapping.characters,
-        "locations": mapping.locations
-    } for mapping in chapter_mappings]
-    
-    unique_characters = set()
-    unique_locations = set()
-    for part in detailed_arc_parts:
-        for char in part.get("characters", []):
-            unique_characters.add(char)
-        for loc in part.get("locations", []):
-            unique_locations.add(loc)
-
-    character_objs = Character.query.filter(
-        Character.story_id == story_id,
-        Character.name.in_(list(unique_characters))
-    ).all()
-
-    location_objs = Location.query.filter(
-        Location.story_id == story_id,
-        Location.name.in_(list(unique_locations))
-    ).all()
-
-    character_details = {
-        character.name: {
-            "description": character.description,
-            "example_dialogue": character.example_dialogue
-        }
-        for character in character_objs
-    }
-    location_details = {location.name: location.description for location in location_objs}
-
-    full_prompt = build_chapter_content_prompt(
-        chapter_title, chapter_summary,
-        story.title, story.details, tags, detailed_arc_parts,
-        previous_summary, next_summary,
-        story.inspirations, story.writing_style,
-        character_details, location_details
-    )
-    prediction = calculate_predicted_chapter_cost(story, chapter_number - 1)
-    total_predicted_cost = prediction.get("total_predicted_credit_cost")
+    prediction = calculate_predicted_chapter_cost(story, chapter_number - 1, fresh=True)
+    total_predicted_cost = prediction.total_credit_cost
     if not can_spend_credits(user, "text", total_predicted_cost):
         notify("You Don't Have Enough Credits!", user.id)
         clear_user_generation_lock(user.id)
@@ -731,8 +695,8 @@ def api_generate_chapter():
         }), 400
     try:
         task = generate_chapter_task.delay(
-            int(story_id), full_prompt, chapter_number, user.id,
-            prediction["input_tokens"]
+            int(story_id), prediction.prompt, chapter_number, user.id,
+            prediction.input_tokens, story.quality_tier
         )
         log_entry = GenerationLog(
             user_id=user.id,
@@ -747,7 +711,7 @@ def api_generate_chapter():
         return jsonify({
             "task_id": task.id,
             "status": "queued",
-            "predicted_cost": prediction
+            "predicted_cost": prediction.to_dict()
         })
     except Exception as e:
         notify("Chapter Generation Failed", user.id)
@@ -766,6 +730,13 @@ def api_generate_all_chapters():
     queues the generation tasks for processing. Notifications are sent to the user 
     regarding the status of their credits and the generation process.
     
+    When the story has batch_mode enabled, the prompts are submitted as one OpenAI Batch API 
+    job instead of one Celery task per chapter, and poll_chapter_batch_task writes the results 
+    back when the batch completes (within 24 hours, at the discounted batch rate).
+    
+    Stories without a quality tier of their own are drafted at BULK_DEFAULT_TIER, so a bulk run 
+    uses gpt-4o-mini unless the story is set to "final".
+    
     Returns:
         flask.Response: A JSON response indicating the status of the generation process.
             - If successful, returns a message indicating that chapters are being generated.
@@ -778,21 +749,19 @@ def api_generate_all_chapters():
         notify("Top up your credits to see generation", user.id)
         return jsonify({"error": True})
     user = get_current_user()
-    from tasks import generate_chapter_task
+    from tasks import generate_chapter_task, poll_chapter_batch_task
     data = request.json
     story_id = data.get("story_id")
     story = Story.query.get(story_id)
     if not story:
         return jsonify({"error": "Story not found."}), 404
-    if not set_user_generation_lock(user.id):
+    tier = story.quality_tier or current_app.config.get("BULK_DEFAULT_TIER", "draft")
+    lock_expire = BATCH_GENERATION_LOCK_EXPIRE if story.batch_mode else 2000
+    if not set_user_generation_lock(user.id, expire=lock_expire):
         notify("A generation task is already in progress", user.id)
         return jsonify({"error": "A generation task is already in progress."}), 400
 
-    tags = ", ".join([tag.name for tag in story.tags]) if story.tags else ""
-    chapters = Chapter.query.filter_by(story_id=story.id).order_by(Chapter.chapter_number).all()
-    total_chapters = len(chapters)
-
-    prediction_all = calculate_predicted_all_chapters_cost(story)
+    prediction_all = calculate_predicted_all_chapters_cost(story, fresh=True, tier=tier, batch=bool(story.batch_mode))
     total_predicted_cost = prediction_all.get("total_predicted_credit_cost")
     if not can_spend_credits(user, "text", total_predicted_cost):
         notify("You Don't Have Enough Credits!", user.id)
@@ -803,72 +772,57 @@ def api_generate_all_chapters():
             "available": user.text_credits
         }), 400
 
-    for i in range(total_chapters):
-        chapter_obj = chapters[i]
-        chapter_title = chapter_obj.title
-        chapter_summary = chapter_obj.summary if chapter_obj.summary else ""
-        previous_summary = chapters[i - 1].summary if i - 1 >= 0 else ""
-        next_summary = chapters[i + 1].summary if i + 1 < total_chapters else ""
-        chapter_mappings = ChapterGuide.query.filter_by(
-            story_id=story_id, chapter_title=chapter_title
-        ).order_by(ChapterGuide.part_index).all()
-        detailed_arc_parts = [{
-            "arc_text": mapping.part_text,
-            "characters": mapping.characters,
-            "locations": mapping.locations
-        } for mapping in chapter_mappings]
-
-        unique_characters = set()
-        unique_locations = set()
-        for part in detailed_arc_parts:
-            for char in part.get("characters", []):
-                unique_characters.add(char)
-            for loc in part.get("locations", []):
-                unique_locations.add(loc)
-
-        character_objs = Character.query.filter(
-            Character.story_id == story_id,
-            Character.name.in_(list(unique_characters))
-        ).all()
-
-        location_objs = Location.query.filter(
-            Location.story_id == story_id,
-            Location.name.in_(list(unique_locations))
-        ).all()
-
-        character_details = {
-            character.name: {
-                "description": character.description,
-                "example_dialogue": character.example_dialogue
-            }
-            for character in character_objs
-        }
-        location_details = {location.name: location.description for location in location_objs}
-
-        full_prompt = build_chapter_content_prompt(
-            chapter_title, chapter_summary,
-            story.title, story.details, tags, detailed_arc_parts,
-            previous_summary, next_summary,
-            story.inspirations, story.writing_style,
-            character_details, location_details
-        )
-        chapter_prediction = calculate_predicted_chapter_cost(story, i)
+    batch_prompts = []
+    batch_predictions = []
+    for i, chapter_cost in enumerate(prediction_all["chapters"]):
+        chapter_prediction = chapter_cost["details"]
+        if story.batch_mode:
+            batch_prompts.append(chapter_prediction.prompt)
+            batch_predictions.append(chapter_prediction)
+            continue
         task = generate_chapter_task.delay(
-            story_id, full_prompt, i + 1, user.id,
-            chapter_prediction["input_tokens"]
+            story_id, chapter_prediction.prompt, i + 1, user.id,
+            chapter_prediction.input_tokens, tier
         )
         log_entry = GenerationLog(
             user_id=user.id,
             task_id=task.id,
             generation_type="chapter",
-            predicted_cost=chapter_prediction.get("total_predicted_credit_cost"),
+            predicted_cost=chapter_prediction.total_credit_cost,
             status="pending"
         )
         db.session.add(log_entry)
         db.session.commit()
+
+    if story.batch_mode and batch_prompts:
+        from openai_batch import submit_chapter_batch
+        try:
+            batch_id = submit_chapter_batch(batch_prompts, tier=tier)
+        except Exception as e:
+            clear_user_generation_lock(user.id)
+            notify("Chapter Generation Failed", user.id)
+            return jsonify({"error": str(e)}), 502
+        for i, chapter_prediction in enumerate(batch_predictions):
+            db.session.add(GenerationLog(
+                user_id=user.id,
+                task_id=f"{batch_id}:{i + 1}",
+                generation_type="chapter",
+                predicted_cost=chapter_prediction.total_credit_cost,
+                status="pending"
+            ))
+        db.session.commit()
+        poll_chapter_batch_task.apply_async(
+            args=[batch_id, story.id, user.id,
+                  {str(i + 1): p.input_tokens for i, p in enumerate(batch_predictions)},
+                  model_for("chapter", tier)],
+            countdown=60
+        )
     notify("Generating All Chapters...", user.id)
     return jsonify({
         "status": "queued",
         "message": "Chapters are being generated in the background.",
-        "predicted_cost": prediction_all
+        "predicted_cost": {
+            "total_predicted_credit_cost": total_predicted_cost,
+            "chapters": [dict(chapter, details=chapter["details"].to_dict()) for chapter in prediction_all["chapters"]]
+        }
     })
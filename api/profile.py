@@ -1,6 +1,6 @@
 from flask import Blueprint, current_app, flash, request, redirect, url_for, jsonify
 from models import User, Role, Revenue, Notification, CreditPackage, db
-from helpers import get_current_user, is_authenticated, is_valid_password
+from helpers import get_current_user, is_authenticated, is_valid_password, reset_unread_notifications
 import stripe
 
 bp = Blueprint('profile', __name__)
@@ -306,6 +306,7 @@ def mark_all_notifications_read():
     for n in notifications:
         n.is_read = True
     db.session.commit()
+    reset_unread_notifications(user.id)
     flash("All notifications marked as read.", "success")
     return redirect(url_for('profile_views.notifications'))
 
@@ -327,5 +328,6 @@ def clear_notifications():
     for n in notifications:
         db.session.delete(n)
     db.session.commit()
+    reset_unread_notifications(user.id)
     flash("Notifications cleared.", "success")
     return redirect(url_for("profile_views.notifications"))
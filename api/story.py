@@ -1,12 +1,28 @@
-import subprocess
-from flask import Blueprint, send_file, flash, request, redirect, url_for, jsonify
-from helpers import notify, get_current_user, is_authenticated, is_story_author_or_admin, is_comment_author_or_admin, get_image_url
-from models import User, Story, Comment, Chapter, Notification, Tag, db, StoryArc, ChapterGuide, Character, Location
+from sqlalchemy import func, select, exists, and_, or_, case, false, update
+from datetime import datetime
+from sqlalchemy.orm import load_only, selectinload
+from flask import Blueprint, flash, request, redirect, url_for, jsonify, abort, Response
+from helpers import notify, get_current_user, is_authenticated, is_story_author_or_admin, is_comment_author_or_admin, get_image_urls
+from helpers import redis_cache, get_search_cache_key, bump_search_cache_version, SEARCH_CACHE_TTL, encode_cursor, decode_cursor
+from helpers import conditional_response
+from helpers import ojson, get_popular_tags, TAG_SUGGESTION_LIMIT, queue_notification, get_payload_signature, is_payload_unchanged, store_payload_signature, clear_payload_signature
+from models import User, Story, Comment, Chapter, Tag, db, StoryArc, ChapterGuide, Character, Location
+from models.Story import story_tags, story_flags
 import json
-import io
 
 bp = Blueprint('story', __name__)
 
+SEARCH_PAGE_SIZE = 9
+SEARCH_BROWSER_MAX_AGE = 30
+QUALITY_TIERS = ("draft", "final")
+
+SAVE_FIELD_COLUMNS = {
+    "title": Story.title,
+    "details": Story.details,
+    "writing_style": Story.writing_style,
+    "inspirations": Story.inspirations
+}
+
 @bp.route('/api/update_arc_combined/<int:mapping_id>', methods=["PUT"])
 @is_story_author_or_admin
 def update_arc_combined(mapping_id):
@@ -108,8 +124,11 @@ def save_new_arc_part():
     part_text = data.get("part_text")
     if not story_id or not chapter_title or not part_text:
         return jsonify({"error": "Missing data for new arc part."}), 400
-    current_parts = ChapterGuide.query.filter_by(story_id=story_id, chapter_title=chapter_title).all()
-    new_index = max([part.part_index for part in current_parts], default=0) + 1
+    max_index = db.session.query(func.max(ChapterGuide.part_index)).filter(
+        ChapterGuide.story_id == story_id,
+        ChapterGuide.chapter_title == chapter_title
+    ).scalar()
+    new_index = (max_index or 0) + 1
     mapping = ChapterGuide(
         story_id=story_id,
         chapter_title=chapter_title,
@@ -212,6 +231,7 @@ def update_story_arc_order():
         else:
             print(f"Arc {arc_id} not found or does not belong to story {story_id}.")
     db.session.commit()
+    clear_payload_signature("arcs", story_id)
     notify("Story Arc Order Updated", user.id)
     return jsonify({"message": "Arc order updated successfully."})
 
@@ -266,9 +286,8 @@ def list_characters(story_id):
     Returns:
         flask.Response: A JSON response containing a list of character names.
     """
-    characters = Character.query.filter_by(story_id=story_id).all()
-    data = [c.name for c in characters]
-    return jsonify(data)
+    data = [name for (name,) in db.session.query(Character.name).filter_by(story_id=story_id)]
+    return ojson(data)
 
 @bp.route('/api/list_locations/<int:story_id>', methods=["GET"])
 @is_story_author_or_admin
@@ -282,9 +301,8 @@ def list_locations(story_id):
     Returns:
         flask.Response: A JSON response containing a list of location names.
     """
-    locations = Location.query.filter_by(story_id=story_id).all()
-    data = [l.name for l in locations]
-    return jsonify(data)
+    data = [name for (name,) in db.session.query(Location.name).filter_by(story_id=story_id)]
+    return ojson(data)
 
 @bp.route('/story/<int:story_id>', methods=["POST"])
 @is_story_author_or_admin
@@ -316,6 +334,8 @@ def edit_story(story_id):
     story.inspirations = request.form.get("inspirations")
     story.chapters_count = int(request.form.get("chapters_count") or 20)
     story.is_mature = True if request.form.get("mature") == "on" else False
+    story.batch_mode = True if request.form.get("batch_mode") == "on" else False
+    story.quality_tier = request.form.get("quality_tier") if request.form.get("quality_tier") in QUALITY_TIERS else None
     story.shared = True if request.form.get("shared") == "on" else False
     if user.under_review:
         story.shared = False
@@ -325,19 +345,22 @@ def edit_story(story_id):
     except Exception:
         tag_items = []
     new_tag_ids = {int(item.get("id")) for item in tag_items if item.get("id")}
-    current_tag_ids = {tag.id for tag in story.tags}
-    if new_tag_ids:
-        new_tags_dict = {tag.id: tag for tag in Tag.query.filter(Tag.id.in_(new_tag_ids)).all()}
-    else:
-        new_tags_dict = {}
-    for tag_id in new_tag_ids - current_tag_ids:
-        tag = new_tags_dict.get(tag_id)
-        if tag:
-            story.tags.append(tag)
-    for tag in list(story.tags):
-        if tag.id not in new_tag_ids:
-            story.tags.remove(tag)
+    current_tag_ids = {tag_id for (tag_id,) in db.session.execute(
+        select(story_tags.c.tag_id).where(story_tags.c.story_id == story.id)
+    )}
+    to_add = new_tag_ids - current_tag_ids
+    if to_add:
+        to_add = {tag_id for (tag_id,) in db.session.query(Tag.id).filter(Tag.id.in_(to_add))}
+    to_remove = current_tag_ids - new_tag_ids
+    if to_add:
+        db.session.execute(story_tags.insert(), [{"story_id": story.id, "tag_id": tag_id} for tag_id in to_add])
+    if to_remove:
+        db.session.execute(story_tags.delete().where(
+            story_tags.c.story_id == story.id,
+            story_tags.c.tag_id.in_(to_remove)
+        ))
     db.session.commit()
+    bump_search_cache_version()
     flash("Story Saved")
     return redirect(url_for("story_views.overview", story_id=story.id))
     
@@ -367,6 +390,7 @@ def delete_story(story_id):
         Location.query.filter_by(story_id=story.id).delete()
         ChapterGuide.query.filter_by(story_id=story.id).delete()
         db.session.commit()
+        bump_search_cache_version()
         delete_images_for_story(story_id)
     except:
         print("error")
@@ -400,6 +424,8 @@ def new_story():
     inspirations = request.form.get("inspirations")
     chapters_count = int(request.form.get("chapters_count") or 3)
     is_mature = True if request.form.get("mature") == "on" else False
+    batch_mode = True if request.form.get("batch_mode") == "on" else False
+    quality_tier = request.form.get("quality_tier") if request.form.get("quality_tier") in QUALITY_TIERS else None
     shared = True if request.form.get("shared") == "on" else False
     if user.under_review:
         shared = False
@@ -408,14 +434,9 @@ def new_story():
         tag_items = json.loads(tags_json)
     except Exception:
         tag_items = []
-    tag_list = []
-    for item in tag_items:
-        tag_id = item.get("id")
-        if tag_id:
-            tag = Tag.query.get(tag_id)
-            if tag:
-                tag_list.append(tag)
-    story = Story(title=title, is_mature=is_mature, writing_style=writing_style, inspirations=inspirations, shared=shared, details=details, chapters_count=chapters_count, user_id=user.id)
+    tag_ids = {int(item.get("id")) for item in tag_items if item.get("id")}
+    tag_list = Tag.query.filter(Tag.id.in_(tag_ids)).all() if tag_ids else []
+    story = Story(title=title, is_mature=is_mature, batch_mode=batch_mode, quality_tier=quality_tier, writing_style=writing_style, inspirations=inspirations, shared=shared, details=details, chapters_count=chapters_count, user_id=user.id, author_username=user.username)
     story.tags = tag_list
     db.session.add(story)
     db.session.commit()
@@ -453,6 +474,10 @@ def update_meta():
     
     story = Story.query.get_or_404(story_id)
     
+    signature = get_payload_signature(characters_data, locations_data)
+    if is_payload_unchanged("meta", story.id, signature):
+        return jsonify({"message": "Characters and locations updated."})
+    
     Character.query.filter_by(story_id=story_id).delete()
     Location.query.filter_by(story_id=story_id).delete()
     
@@ -472,6 +497,7 @@ def update_meta():
             db.session.add(new_loc)
     
     db.session.commit()
+    store_payload_signature("meta", story.id, signature)
     notify("Meta saved", user.id)
     return jsonify({"message": "Characters and locations updated."})
 
@@ -503,6 +529,10 @@ def save_arcs():
     
     story = Story.query.get_or_404(story_id)
     
+    signature = get_payload_signature(arcs_array)
+    if is_payload_unchanged("arcs", story.id, signature):
+        return jsonify({"message": "Story arcs saved."})
+    
     StoryArc.query.filter_by(story_id=story_id).delete()
     
     for arc_text in arcs_array:
@@ -511,6 +541,7 @@ def save_arcs():
             db.session.add(new_arc)
     
     db.session.commit()
+    store_payload_signature("arcs", story.id, signature)
     notify("Story arcs saved", user.id)
     return jsonify({"message": "Story arcs saved."})
 
@@ -541,9 +572,9 @@ def api_save_field():
     story_id = data.get("story_id")
     field = data.get("field")
     value = data.get("value")
-    story = Story.query.get_or_404(story_id)
 
     if field == 'chapter_summaries':
+        story = Story.query.get_or_404(story_id)
         try:
             new_data = json.loads(value) if isinstance(value, str) else value
         except Exception as e:
@@ -575,7 +606,12 @@ def api_save_field():
         notify("Chapter Summaries Saved!", user.id)
         return jsonify({"message": "Chapter Summaries saved."})
     else:
-        setattr(story, field, value)
+        column = SAVE_FIELD_COLUMNS.get(field)
+        if column is None:
+            return jsonify({"error": f"{field} cannot be saved."}), 400
+        updated = Story.query.filter_by(id=story_id).update({column: value}, synchronize_session=False)
+        if not updated:
+            abort(404)
         db.session.commit()
     notify("Saved!", user.id)
     return jsonify({"message": f"{field} saved."})
@@ -663,16 +699,17 @@ def save_chapter():
     Raises:
         ValueError: If chapter_number is not convertible to an integer.
     """
+    user = get_current_user()
     data = request.json
     story_id = data.get("story_id")
     chapter_number = int(data.get("chapter_number"))
     content = data.get("content")
-    chapter = Chapter.query.filter_by(story_id=story_id, chapter_number=chapter_number).first()
+    chapter_id = db.session.query(Chapter.id).filter_by(story_id=story_id, chapter_number=chapter_number).scalar()
     
-    if chapter:
-        chapter.content = content
+    if chapter_id:
+        Chapter.query.filter_by(id=chapter_id).update({Chapter.content: content}, synchronize_session=False)
     else:
-        chapter = Chapter(story_id=story_id, chapter_number=chapter_number, content=content)
+        chapter = Chapter(story_id=story_id, chapter_number=chapter_number, title=f"Chapter {chapter_number}", content=content)
         db.session.add(chapter)
     db.session.commit()
     notify("Chapter Saved", user.id)
@@ -687,6 +724,7 @@ def toggle_favorite(story_id):
     This function allows a user to add or remove a story from their list of favorite stories. 
     It checks if the user is trying to favorite their own story or if the story is shared. 
     If the story is already favorited, it will be removed; otherwise, it will be added to the user's favorites.
+    The story's favorites_count is adjusted with an atomic UPDATE so concurrent toggles cannot lose a change.
     
     Args:
         story_id (int): The ID of the story to be favorited or unfavorited.
@@ -698,7 +736,9 @@ def toggle_favorite(story_id):
         HTTPException: If the story is not found or if the user does not have permission to favorite the story.
     """
     user = get_current_user()
-    story = Story.query.get_or_404(story_id)
+    story = Story.query.options(
+        load_only(Story.id, Story.user_id, Story.shared, Story.favorites_count)
+    ).get_or_404(story_id)
     if user.id == story.user_id:
         return jsonify({"error": "You cannot favorite your own story."}), 403
     if not story.shared:
@@ -706,17 +746,24 @@ def toggle_favorite(story_id):
     
     if user.favorite_stories.filter_by(id=story.id).first():
         user.favorite_stories.remove(story)
-        story.favorites_count = (story.favorites_count or 0) - 1
+        delta = -1
         status = False
         notify("Removed from favorites", user.id)
     else:
         user.favorite_stories.append(story)
-        story.favorites_count = (story.favorites_count or 0) + 1
+        delta = 1
         status = True
         notify("Added to favorites", user.id)
     
+    favorites_count = db.session.execute(
+        update(Story)
+        .where(Story.id == story.id)
+        .values(favorites_count=func.coalesce(Story.favorites_count, 0) + delta)
+        .returning(Story.favorites_count)
+        .execution_options(synchronize_session=False)
+    ).scalar()
     db.session.commit()
-    return jsonify({"favorite": status, "favorites_count": story.favorites_count})
+    return jsonify({"favorite": status, "favorites_count": favorites_count})
 
 @bp.route('/story/flag/<int:story_id>', methods=['POST'])
 @is_authenticated
@@ -733,7 +780,9 @@ def flag_story(story_id):
         Response: A JSON response indicating the result of the flagging action, including any error messages or the current flag count.
     """
     user = get_current_user()
-    story = Story.query.get_or_404(story_id)
+    story = Story.query.options(
+        load_only(Story.id, Story.user_id, Story.shared, Story.flagged)
+    ).get_or_404(story_id)
     
     if not story.shared:
         return jsonify({"error": "This story is not shared publicly."}), 403
@@ -741,29 +790,31 @@ def flag_story(story_id):
     if story.user_id == user.id:
         return jsonify({"error": "You cannot flag your own story."}), 403
 
-    if story.flaggers.filter_by(id=user.id).first():
-        story.flaggers.remove(user)
-        db.session.commit()
-        return jsonify({"message": "Flag removed.", "flag_count": story.flaggers.count()})
+    user_flag = (story_flags.c.story_id == story.id) & (story_flags.c.user_id == user.id)
+    flag_count_query = select(func.count()).select_from(story_flags).where(story_flags.c.story_id == story.id)
     
-    story.flaggers.append(user)
-    db.session.commit()
+    if db.session.query(exists().where(user_flag)).scalar():
+        db.session.execute(story_flags.delete().where(user_flag))
+        flag_count = db.session.execute(flag_count_query).scalar()
+        db.session.commit()
+        return jsonify({"message": "Flag removed.", "flag_count": flag_count})
     
-    flag_count = story.flaggers.count()
+    db.session.execute(story_flags.insert().values(story_id=story.id, user_id=user.id))
+    flag_count = db.session.execute(flag_count_query).scalar()
     
     if flag_count >= 5:
         story.shared = False
         story.flagged = True
         
-        story.flaggers = []
+        db.session.execute(story_flags.delete().where(story_flags.c.story_id == story.id))
         
-        author = User.query.get(story.user_id)
-        if author:
-            author.under_review = True
+        User.query.filter_by(id=story.user_id).update({User.under_review: True}, synchronize_session=False)
         
         db.session.commit()
+        bump_search_cache_version()
         return jsonify({"message": "Story has been flagged and removed from public view.", "flag_count": 0})
     
+    db.session.commit()
     return jsonify({"message": "Story flagged.", "flag_count": flag_count})
 
 @bp.route('/story/<int:story_id>/comments', methods=["POST"])
@@ -803,9 +854,7 @@ def new_comment(story_id):
     
     if story.user_id != user.id:
         notif_message = f"{user.username} commented on your story '{story.title}'."
-        notification = Notification(user_id=story.user_id, story_id=story_id, message=notif_message)
-        db.session.add(notification)
-        db.session.commit()
+        queue_notification(story.user_id, notif_message, story_id=story.id)
     
     flash("Comment posted.", "success")
     return redirect(url_for("story_views.story_comments", story_id=story.id))
@@ -877,67 +926,116 @@ def delete_comment(comment_id):
 @is_authenticated
 def api_search_public_stories():
     """
-	Search for public stories based on user-defined filters and return paginated results.
+	Search for public stories based on user-defined filters and return one page of results.
     
-    This function retrieves public stories that are shared and not marked as spotlight. It allows filtering by tags, sorting by favorites or creation date, and pagination. The function also checks the user's preference for mature content and adjusts the query accordingly.
+    This function retrieves public stories that are shared and not marked as spotlight. It allows filtering by tags, sorting by favorites or creation date, and keyset pagination. The function also checks the user's preference for mature content and adjusts the query accordingly.
+    
+    Pages are addressed by an opaque cursor holding the sort value and ID of the last story on the previous page, so no COUNT query is needed.
     
     Args:
         tags (str): A comma-separated string of tags to filter the stories. Default is an empty string.
-        page (int): The page number for pagination. Default is 1.
-        sort_by (str): The field to sort the results by. Can be 'favorites' or 'date'. Default is 'date'.
+        cursor (str): The cursor returned as next_cursor by the previous page. Omit for the first page.
+        sort_by (str): The field to sort the results by. Can be 'favorites', 'chapters' or 'date'. Default is 'date'.
         order (str): The order of sorting. Can be 'asc' for ascending or 'desc' for descending. Default is 'desc'.
     
     Returns:
-        flask.Response: A JSON response containing the paginated list of stories, along with pagination metadata.
+        flask.Response: A JSON response containing the page of stories, along with pagination metadata.
             - stories (list): A list of dictionaries representing the stories, each including the author's username.
-            - page (int): The current page number.
-            - total_pages (int): The total number of pages available.
             - has_next (bool): Indicates if there is a next page.
-            - has_prev (bool): Indicates if there is a previous page.
-            - next_page (int or None): The next page number if available, otherwise None.
-            - prev_page (int or None): The previous page number if available, otherwise None.
+            - has_prev (bool): Indicates if this is not the first page.
+            - next_cursor (str or None): The cursor for the next page if available, otherwise None.
     """
     user = get_current_user()
     tags = request.args.get('tags', '')
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor') or None
     sort_by = request.args.get('sort_by', 'date')
     order = request.args.get('order', 'desc')
     show_mature = user.show_mature
+    tag_list = sorted({t.strip() for t in tags.split(",") if t.strip()})
+
+    cache_key = get_search_cache_key(tag_list, sort_by, order, cursor, bool(show_mature))
+    cached = redis_cache.get(cache_key)
+    if cached:
+        return conditional_response(Response(cached, mimetype="application/json"), max_age=SEARCH_BROWSER_MAX_AGE)
 
-    query = Story.query.filter_by(shared=True)
-    query = query.filter(Story.chapters.any())
+    query = Story.query.options(
+        load_only(Story.id, Story.title, Story.created_at, Story.favorites_count, Story.chapters_count,
+                  Story.cover_image_key, Story.user_id, Story.author_username),
+        selectinload(Story.tags)
+    ).filter_by(shared=True)
+    query = query.filter(Story.has_chapters == True)
     if not show_mature:
         query = query.filter(Story.is_mature == False)
-    if tags:
-        tag_list = [t.strip() for t in tags.split(",") if t.strip()]
-        for t in tag_list:
-            query = query.filter(Story.tags.any(Tag.name.ilike(f"%{t}%")))
+    if tag_list:
+        # Resolve every term's matching tags in one query, then require a match for each term
+        # with a single grouped subquery over story_tags instead of one EXISTS per term.
+        matches = db.session.query(Tag.id, Tag.name).filter(or_(*[Tag.name.ilike(f"%{t}%") for t in tag_list])).all()
+        term_ids = [{tag_id for tag_id, name in matches if t.lower() in name.lower()} for t in tag_list]
+        if not all(term_ids):
+            query = query.filter(false())
+        else:
+            tagged = select(story_tags.c.story_id)\
+                .where(story_tags.c.tag_id.in_(set().union(*term_ids)))\
+                .group_by(story_tags.c.story_id)
+            if len(term_ids) > 1:
+                tagged = tagged.having(and_(*[
+                    func.max(case((story_tags.c.tag_id.in_(ids), 1), else_=0)) == 1 for ids in term_ids
+                ]))
+            query = query.filter(Story.id.in_(tagged))
     
     if sort_by == 'favorites':
-        order_column = Story.favorites_count
+        # favorites_count is nullable; a NULL would fall out of the keyset comparison, so sort on 0 instead.
+        order_column = func.coalesce(Story.favorites_count, 0)
+        sort_attr = "favorites_count"
     elif sort_by == 'chapters':
         order_column = Story.chapters_count  # assumes you have this column in your model
+        sort_attr = "chapters_count"
     else:
         order_column = Story.created_at
-    order_clause = order_column.asc() if order == 'asc' else order_column.desc()
+        sort_attr = "created_at"
+    descending = order != 'asc'
 
-    pagination = query.order_by(order_clause).paginate(page=page, per_page=9, error_out=False)
-    stories = pagination.items
-    for story in stories:
-        author = User.query.get(story.user_id)
-        story.author = author.username if author else "Unknown"
-        story.presigned_cover_url = get_image_url(story.cover_image_key)
+    if cursor:
+        try:
+            cursor_value, cursor_id = decode_cursor(cursor)
+            if sort_attr == "created_at":
+                cursor_value = datetime.fromisoformat(cursor_value)
+        except (ValueError, TypeError):
+            return jsonify({"error": "Invalid cursor."}), 400
+        if descending:
+            query = query.filter(or_(order_column < cursor_value, and_(order_column == cursor_value, Story.id < cursor_id)))
+        else:
+            query = query.filter(or_(order_column > cursor_value, and_(order_column == cursor_value, Story.id > cursor_id)))
+    order_clauses = (order_column.desc(), Story.id.desc()) if descending else (order_column.asc(), Story.id.asc())
+
+    stories = query.order_by(*order_clauses).limit(SEARCH_PAGE_SIZE + 1).all()
+    has_next = len(stories) > SEARCH_PAGE_SIZE
+    stories = stories[:SEARCH_PAGE_SIZE]
+    cover_urls = get_image_urls([story.cover_image_key for story in stories])
+    last_value = getattr(stories[-1], sort_attr) if stories else None
+    if sort_attr == "favorites_count":
+        last_value = last_value or 0
 
     data = {
-        "stories": [dict(story.to_dict(), author=story.author, presigned_cover_url=story.presigned_cover_url) for story in stories],
-        "page": pagination.page,
-        "total_pages": pagination.pages,
-        "has_next": pagination.has_next,
-        "has_prev": pagination.has_prev,
-        "next_page": pagination.next_num if pagination.has_next else None,
-        "prev_page": pagination.prev_num if pagination.has_prev else None,
+        "stories": [{
+            "id": story.id,
+            "title": story.title,
+            "chapters_count": story.chapters_count,
+            "author": story.author_username or "Unknown",
+            "cover_image_key": story.cover_image_key,
+            "favorites_count": story.favorites_count or 0,
+            "tags": [{"id": tag.id, "name": tag.name} for tag in story.tags],
+            "created_at": story.created_at.isoformat(),
+            "user_id": story.user_id,
+            "presigned_cover_url": cover_urls.get(story.cover_image_key, False)
+        } for story in stories],
+        "has_next": has_next,
+        "has_prev": cursor is not None,
+        "next_cursor": encode_cursor(last_value, stories[-1].id) if has_next else None,
     }
-    return jsonify(data)
+    body = json.dumps(data)
+    redis_cache.setex(cache_key, SEARCH_CACHE_TTL, body)
+    return conditional_response(Response(body, mimetype="application/json"), max_age=SEARCH_BROWSER_MAX_AGE)
 
 @bp.route('/api/tags', methods=["GET"])
 @is_authenticated
@@ -945,73 +1043,39 @@ def tags():
     """
 	Retrieve a list of tags based on a search query.
     
-    This function checks for a query parameter in the request. If a query is provided, it filters the tags whose names match the query (case-insensitive). If no query is provided, it retrieves all tags. The result is returned as a JSON response containing a list of tag objects with their IDs and names.
+    This function checks for a query parameter in the request. If a query is provided, it returns the tags whose names start with the query (case-insensitive). If no query is provided, it returns the most popular tags. At most TAG_SUGGESTION_LIMIT tags are returned as a JSON response containing a list of tag objects with their IDs and names.
     
     Returns:
         flask.Response: A JSON response containing a list of dictionaries, each representing a tag with its 'id' and 'value' (name).
     """
     query = request.args.get("query", "").strip()
-    if query:
-        tags = Tag.query.filter(Tag.name.ilike(f"%{query}%")).all()
-    else:
-        tags = Tag.query.all()
+    if not query:
+        return ojson(get_popular_tags())
+    tags = Tag.query.filter(Tag.name.ilike(f"{query}%")).order_by(Tag.name).limit(TAG_SUGGESTION_LIMIT).all()
     suggestions = [{"id": tag.id, "value": tag.name} for tag in tags]
-    return jsonify(suggestions)
+    return ojson(suggestions)
 
 @bp.route('/api/generate_epub', methods=["POST"])
 @is_authenticated
 def api_generate_epub():
     """
-	Generates an EPUB file from a story's content and sends it as a downloadable file.
+	Queues EPUB generation for a story.
     
     This function retrieves the current user and the story ID from the request JSON. It checks if the user has permission to access the story, either by verifying if the story is shared or if the user is the owner. If the user does not have permission, a 403 error is returned. 
     
-    If the story has final markdown, it uses that; otherwise, it compiles the markdown from the story's chapters. The function then uses Pandoc to convert the markdown to an EPUB format. If the conversion fails, a 500 error is returned with the error message. If successful, the EPUB file is sent to the user as a downloadable attachment.
+    Otherwise the pandoc conversion is handed to a background task, which uploads the EPUB and sends the user an "epub_generated" socket event with a download URL when it is ready.
     
     Returns:
-        Response: A Flask response object containing the EPUB file or an error message.
+        Response: A JSON response with the queued task ID, or an error message.
     """
+    from tasks import generate_epub_task
     user = get_current_user()
     data = request.json
     story_id = data.get("story_id")
-    story = Story.query.get_or_404(story_id)
+    story = Story.query.options(load_only(Story.id, Story.user_id, Story.shared)).get_or_404(story_id)
     
     if not (story.shared or story.user_id == user.id):
         return jsonify({"error": "You do not have permission to access this story."}), 403
 
-    if story.final_markdown:
-        combined_md = story.final_markdown
-    else:
-        chapters = Chapter.query.filter_by(story_id=story.id).order_by(Chapter.chapter_number).all()
-        combined_md = (
-            f"# {story.title}\n\n"
-            f"**Date:** {story.created_at.strftime('%B %d, %Y')}\n\n"
-        )
-        for chapter in chapters:
-            combined_md += (
-                f"# Chapter {chapter.chapter_number}: {chapter.title}\n\n"
-                f"{chapter.content}\n\n"
-            )
-
-    cmd = [
-        "pandoc",
-        "--from", "markdown",
-        "--to", "epub",
-        "--epub-chapter-level=2",
-        "--metadata", f"title={story.title}",
-        "--metadata", "language=English",
-        "-"
-    ]
-
-    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    epub_data, err = proc.communicate(input=combined_md.encode("utf-8"))
-
-    if proc.returncode != 0:
-        return jsonify({"error": err.decode("utf-8")}), 500
-
-    return send_file(
-        io.BytesIO(epub_data),
-        mimetype="application/epub+zip",
-        as_attachment=True,
-        download_name="novel.epub"
-    )
\ No newline at end of file
+    task = generate_epub_task.delay(story.id, user.id)
+    return jsonify({"task_id": task.id, "status": "queued"}), 202
\ No newline at end of file
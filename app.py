@@ -1,9 +1,9 @@
 import os
-from flask import Flask, jsonify, render_template, get_flashed_messages, redirect, url_for, request
+from flask import Flask, jsonify, render_template, get_flashed_messages, redirect, url_for, request, make_response
 from flask_jwt_extended import JWTManager
 from flask_socketio import SocketIO, join_room
-from models import db, Story, Tag, News, Notification, SiteConfig, TokenCostConfig, User, CreditConfig, Role
-from helpers import is_unauthenticated, is_authenticated, get_current_user, get_image_url
+from models import db, bcrypt, Story, Tag, News, TokenCostConfig, User, CreditConfig, Role
+from helpers import is_unauthenticated, is_authenticated, get_current_user, get_image_urls, get_site_config, get_unread_notification_count, persist_queued_notifications, conditional_response
 from flask import jsonify
 from flask_jwt_extended import decode_token
 import stripe
@@ -15,7 +15,12 @@ if env == "development":
 app = Flask(__name__)
 app.config.from_pyfile('config.py')
 
+if app.config["SQLALCHEMY_DATABASE_URI"].startswith("postgresql"):
+    from psycogreen.eventlet import patch_psycopg
+    patch_psycopg()
+
 db.init_app(app)
+bcrypt.init_app(app)
 jwt = JWTManager(app)
 socketio = SocketIO(app, cors_allowed_origins='*', message_queue='redis://localhost:6379/1')
 
@@ -70,8 +75,25 @@ def on_connect():
     else:
         print("No access token provided.")
 
-with app.app_context():
-    stripe.api_key = app.config.get('STRIPE_SECRET_KEY')
+stripe.api_key = app.config.get('STRIPE_SECRET_KEY')
+
+if os.environ.get("FLASK_AUTO_MIGRATE"):
+    with app.app_context():
+        db.create_all()
+
+@app.cli.command("init-db")
+def init_db():
+    """
+	Creates the database tables and seeds the default configuration.
+    
+    This command creates any missing tables, then adds the default OpenAI token costs, 
+    credit modifiers, admin and user roles and the admin account if they do not exist yet. 
+    It is meant to be run once per deployment with `flask --app app init-db`, rather than 
+    on every worker start.
+    
+    Returns:
+        None
+    """
     db.create_all()
     if TokenCostConfig.query.count() == 0:
         config = TokenCostConfig(
@@ -103,6 +125,10 @@ with app.app_context():
             config = CreditConfig(action=conf["action"], type=conf["type"], modifier=conf["modifier"])
             db.session.add(config)
         print("Default credit configurations added.")
+    # Batch chapters are billed at half the API price, so pass the discount on (added separately for existing installs).
+    for action in ("chapter_batch_input", "chapter_batch_output"):
+        if not CreditConfig.query.filter_by(action=action).first():
+            db.session.add(CreditConfig(action=action, type="text", modifier=1))
     admin_role = Role.query.filter_by(name="admin").first()
     if not admin_role:
         admin_role = Role(name="admin", default_text_credits=1000, default_image_credits=1000, default_audio_credits=1000, protected=True)
@@ -169,7 +195,7 @@ def inject_unread_notifications():
     user = get_current_user()
     unread_count = 0
     if user:
-        unread_count = Notification.query.filter_by(user_id=user.id, is_read=False).count()
+        unread_count = get_unread_notification_count(user.id)
     return dict(unread_notifications=unread_count)
 
 @app.before_request
@@ -185,14 +211,12 @@ def check_maintenance_mode():
     Raises:
         None: This function does not raise exceptions but may handle requests differently based on the application's configuration.
     """
+    if request.path.startswith('/static'):
+        return
     user = get_current_user()
-    site_config = SiteConfig.query.first()
-    if site_config:
-        app.config["REGISTRATION_DISABLED"] = site_config.registration_disabled
-        app.config["MAINTENANCE_MODE"] = site_config.maintenance_mode
-    else:
-        app.config["REGISTRATION_DISABLED"] = False
-        app.config["MAINTENANCE_MODE"] = False
+    site_config = get_site_config()
+    app.config["REGISTRATION_DISABLED"] = site_config["registration_disabled"]
+    app.config["MAINTENANCE_MODE"] = site_config["maintenance_mode"]
     is_admin = user and user.role.name.lower() == "admin"
     
     if app.config["MAINTENANCE_MODE"] and not is_admin:
@@ -287,17 +311,18 @@ def dashboard():
         .order_by(Story.created_at.desc())\
         .paginate(page=stories_page, per_page=10, error_out=False)
     stories = stories_pagination.items
-    for story in stories:
-        story.presigned_cover_url = get_image_url(story.cover_image_key)
 
     favorites_pagination = user.favorite_stories\
         .order_by(Story.created_at.desc())\
         .paginate(page=favorites_page, per_page=10, error_out=False)
     favorites = favorites_pagination.items
 
+    cover_urls = get_image_urls([story.cover_image_key for story in stories + favorites])
+    for story in stories:
+        story.presigned_cover_url = cover_urls.get(story.cover_image_key, False)
     for story in favorites:
-        story.author = User.query.get(story.user_id).username
-        story.presigned_cover_url = get_image_url(story.cover_image_key)
+        story.author = story.author_username or "Unknown"
+        story.presigned_cover_url = cover_urls.get(story.cover_image_key, False)
 
     return render_template("dashboard.html", 
                            stories=stories,
@@ -385,17 +410,39 @@ def explore():
         spotlight_query = spotlight_query.filter(Story.is_mature == False)
     spotlight_pagination = spotlight_query.order_by(Story.created_at.desc()).paginate(page=spotlight_page, per_page=4, error_out=False)
     spotlight_stories = spotlight_pagination.items
+    cover_urls = get_image_urls([story.cover_image_key for story in spotlight_stories])
     for story in spotlight_stories:
-        author = User.query.get(story.user_id)
-        story.presigned_cover_url = get_image_url(story.cover_image_key)
-        story.author = author.username if author else "Unknown"
+        story.presigned_cover_url = cover_urls.get(story.cover_image_key, False)
+        story.author = story.author_username or "Unknown"
 
-    return render_template(
+    return conditional_response(make_response(render_template(
         "explore.html",
         spotlight_stories=spotlight_stories,
         spotlight_pagination=spotlight_pagination,
         user=user
-    )
+    )))
+
+def notification_writer():
+    """
+	Background loop that saves queued notifications in batches.
+    
+    The queue is polled without blocking (the development server started from app.py is
+    not monkey-patched, so a blocking BRPOP would stall the eventlet hub); when it is empty
+    the loop yields for a quarter of a second. wsgi.py starts the same loop under gunicorn.
+    
+    Returns:
+        None
+    """
+    while True:
+        persisted = 0
+        with app.app_context():
+            try:
+                persisted = persist_queued_notifications()
+            except Exception as e:
+                app.logger.error(f"Failed to persist notifications: {e}")
+        if not persisted:
+            socketio.sleep(0.25)
 
 if __name__ == '__main__':
+    socketio.start_background_task(notification_writer)
     socketio.run(app, debug=True, host='0.0.0.0', port=port)
@@ -7,6 +7,14 @@ ADMIN_PASSWORD = "SET_SECURE_PASSWORD_HERE"
 SECRET_KEY = "FLASK_SECRET_KEY"
 SQLALCHEMY_DATABASE_URI = "sqlite:///novelapp.db"
 SQLALCHEMY_TRACK_MODIFICATIONS = False
+SQLALCHEMY_ENGINE_OPTIONS = {
+    "pool_size": 20,
+    "max_overflow": 40,
+    "pool_pre_ping": True,
+    "pool_recycle": 1800,
+    "pool_use_lifo": True
+}
+BCRYPT_LOG_ROUNDS = int(os.environ.get("BCRYPT_LOG_ROUNDS", 12))
 JWT_SECRET_KEY = "JWT_SECRET_KEY"
 JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=2)
 CELERY_BROKER_URL = "redis://localhost:6379/0"
@@ -25,6 +33,29 @@ else:
     STRIPE_WEBHOOK_SECRET="PROD_STRIPE_WEBHOOK_SECRET"
     STRIPE_PUBLISHABLE_KEY="PROD_STRIPE_PUBLISHABLE_KEY"
 OPENAI_API_KEY = "OPEN_API_KEY"
+OPENAI_MAX_RETRIES = 5
+OPENAI_RESPONSE_CACHE = False
+LLM_INPROC_CACHE = False
+LLM_INFLIGHT_LIMIT = 16
+# Per-process request/token budgets; set to the account's limits divided by the number of worker processes.
+OPENAI_RPM = int(os.environ.get("OPENAI_RPM", 500))
+OPENAI_TPM = int(os.environ.get("OPENAI_TPM", 200000))
+OPENAI_STORE = env == "development"
+# Quality tier for stories without one: "draft" (gpt-4o-mini) or "final" (each generation's own model).
+DEFAULT_TIER = "final"
+BULK_DEFAULT_TIER = "draft"
+# Reuse a response for a near-identical prompt (cosine >= threshold) within the same story/chapter.
+# Only consulted by callers that pass deterministic=True, never for user-initiated generations.
+LLM_SEMANTIC_CACHE = False
+SEMANTIC_CACHE_THRESHOLD = 0.95
+# max_completion_tokens per generation kind; for o1 models this includes reasoning tokens.
+OPENAI_MAX_COMPLETION_TOKENS = {
+    "meta": 1200,
+    "summaries": 8000,
+    "story_arcs": 8000,
+    "chapter_guide": 12000,
+    "chapter": 16000,
+}
 S3_IMAGE_BUCKET = "BUCKET_NAME"
 S3_ENDPOINT = "BUCKET_URL"
 S3_REGION = "BUCKET_REGION"
@@ -0,0 +1,147 @@
+import threading
+import json
+from collections import namedtuple
+from types import SimpleNamespace
+from cachetools import TTLCache
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from models import TokenCostConfig, CreditConfig
+from helpers import redis_cache
+
+COST_CONFIG_CACHE_TTL = 15
+COST_CONFIG_SHARED_TTL = 300
+DEFAULT_CREDIT_MODIFIER = 2
+TOKEN_COST_KEY = "cost_config:token"
+CREDIT_MODIFIERS_KEY = "cost_config:modifiers"
+
+_config_cache = TTLCache(maxsize=32, ttl=COST_CONFIG_CACHE_TTL)
+_config_cache_lock = threading.Lock()
+_MISSING = object()
+
+# Tokens per credit for one model family, plus integer copies in hundredths of a token for exact credit conversion.
+PricingTuple = namedtuple("PricingTuple", ["input_tpc", "output_tpc", "input_tpc_hundredths", "output_tpc_hundredths"])
+
+def _tokens_per_credit(credit_cost_dollar, cost_per_million):
+    return round((credit_cost_dollar * 1_000_000) / cost_per_million, 2)
+
+def _pricing_tuple(cost_per_credit, cost_per_1m_input, cost_per_1m_output):
+    input_tpc = _tokens_per_credit(cost_per_credit, cost_per_1m_input)
+    output_tpc = _tokens_per_credit(cost_per_credit, cost_per_1m_output)
+    return PricingTuple(input_tpc, output_tpc, round(input_tpc * 100), round(output_tpc * 100))
+
+def _pricing_snapshot(columns):
+    config = SimpleNamespace(**columns)
+    config.gpt4o = _pricing_tuple(config.cost_per_credit, config.cost_per_1m_input, config.cost_per_1m_output)
+    config.o1 = _pricing_tuple(config.o1_cost_per_credit, config.o1_cost_per_1m_input, config.o1_cost_per_1m_output)
+    return config
+
+def get_token_cost_config():
+    """
+	Returns the token pricing from the first TokenCostConfig row, cached in-process and in Redis.
+
+    Lookups go to a per-process TTL cache (COST_CONFIG_CACHE_TTL seconds), then to Redis, which
+    every web and Celery process shares for COST_CONFIG_SHARED_TTL seconds, and only then to the
+    database. Committed edits clear both layers (see _clear_after_commit).
+
+    The cached value is a plain snapshot of the columns rather than the ORM object, so it is safe to
+    share between sessions and threads. Tokens per credit for each model family are computed once
+    when the snapshot is taken and stored as a PricingTuple in the gpt4o and o1 attributes.
+
+    Returns:
+        types.SimpleNamespace or None: The TokenCostConfig column values plus the gpt4o and o1 PricingTuples as attributes, or None if no row exists.
+    """
+    config = _config_cache.get("token_cost", _MISSING)
+    if config is not _MISSING:
+        return config
+    shared = redis_cache.get(TOKEN_COST_KEY)
+    if shared is not None:
+        columns = json.loads(shared)
+    else:
+        row = TokenCostConfig.query.first()
+        columns = {
+            column.name: getattr(row, column.name) for column in TokenCostConfig.__table__.columns
+        } if row else None
+        redis_cache.setex(TOKEN_COST_KEY, COST_CONFIG_SHARED_TTL, json.dumps(columns))
+    config = _pricing_snapshot(columns) if columns else None
+    with _config_cache_lock:
+        _config_cache["token_cost"] = config
+    return config
+
+def get_credit_modifier(action):
+    """
+	Returns the credit modifier for an action, cached in-process and in Redis.
+
+    Args:
+        action (str): The CreditConfig action, e.g. "meta_input" or "image".
+
+    Returns:
+        float: The configured modifier, or DEFAULT_CREDIT_MODIFIER if the action has no row.
+    """
+    return get_credit_modifiers((action,))[action]
+
+def get_credit_modifiers(actions):
+    """
+	Returns the credit modifiers for several actions, fetching any uncached ones in a single query.
+
+    Modifiers missing from the in-process cache are read from the shared Redis hash with one HMGET;
+    only those missing there too are queried from the database, and the results (including the
+    default for actions without a row) are written back to the hash.
+
+    Args:
+        actions (tuple): The CreditConfig actions, e.g. ("meta_input", "meta_output").
+
+    Returns:
+        dict: {action: modifier}, with DEFAULT_CREDIT_MODIFIER for actions that have no row.
+    """
+    modifiers = {action: _config_cache.get(("modifier", action)) for action in actions}
+    missing = [action for action, modifier in modifiers.items() if modifier is None]
+    if missing:
+        shared = dict(zip(missing, redis_cache.hmget(CREDIT_MODIFIERS_KEY, missing)))
+        unshared = [action for action in missing if shared[action] is None]
+        if unshared:
+            rows = CreditConfig.query.filter(CreditConfig.action.in_(unshared)).all()
+            found = {row.action: row.modifier for row in rows}
+            loaded = {action: found.get(action, DEFAULT_CREDIT_MODIFIER) for action in unshared}
+            pipe = redis_cache.pipeline()
+            pipe.hset(CREDIT_MODIFIERS_KEY, mapping=loaded)
+            pipe.expire(CREDIT_MODIFIERS_KEY, COST_CONFIG_SHARED_TTL)
+            pipe.execute()
+            shared.update(loaded)
+        with _config_cache_lock:
+            for action in missing:
+                modifiers[action] = float(shared[action])
+                _config_cache[("modifier", action)] = modifiers[action]
+    return modifiers
+
+def clear_cost_config_cache():
+    """
+	Drops the cached pricing and modifiers so the next lookup reads them from the database.
+
+    The shared Redis copies are deleted for every process; other processes' in-process caches
+    expire within COST_CONFIG_CACHE_TTL seconds.
+
+    Returns:
+        None
+    """
+    redis_cache.delete(TOKEN_COST_KEY, CREDIT_MODIFIERS_KEY)
+    with _config_cache_lock:
+        _config_cache.clear()
+
+def _mark_cost_config_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info["cost_config_changed"] = True
+
+for _model in (TokenCostConfig, CreditConfig):
+    for _event in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _event, _mark_cost_config_changed)
+
+@event.listens_for(Session, "after_commit")
+def _clear_after_commit(session):
+    # Clearing only once the edit is committed keeps another process from re-caching the old row mid-transaction.
+    if session.info.pop("cost_config_changed", False):
+        clear_cost_config_cache()
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session):
+    session.info.pop("cost_config_changed", None)
@@ -1,162 +1,619 @@
 import logging
+import threading
+import time
 from functools import wraps
-from datetime import timedelta
-from flask import request, redirect, url_for, jsonify, current_app
-from models import User, Story, GenerationLog, Comment, db
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import request, redirect, url_for, jsonify, current_app, Response, g
+from models import User, Story, GenerationLog, Comment, SiteConfig, Notification, Tag, Role, db
+from models.Story import story_tags
 from flask_jwt_extended import decode_token, create_access_token
 import re
+from string import Template
+import json
+import hashlib
+import base64
 import requests
-from sqlalchemy import desc
+from requests.adapters import HTTPAdapter
+import redis
+import orjson
+from cachetools import TTLCache
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
 import boto3
+from botocore.config import Config
 from config import S3_REGION, S3_ENDPOINT, S3_IMAGE_ACCESS_KEY_ID, S3_IMAGE_SECRET_KEY
 
 s3_client = boto3.client('s3',
     region_name=S3_REGION,
     endpoint_url=S3_ENDPOINT,
     aws_access_key_id=S3_IMAGE_ACCESS_KEY_ID,
-    aws_secret_access_key=S3_IMAGE_SECRET_KEY)
+    aws_secret_access_key=S3_IMAGE_SECRET_KEY,
+    config=Config(
+        max_pool_connections=50,
+        retries={'max_attempts': 3, 'mode': 'adaptive'},
+        tcp_keepalive=True))
+
+mailgun_session = requests.Session()
+mailgun_session.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=20))
+
+redis_cache = redis.StrictRedis(host='localhost', port=6379, db=1, decode_responses=True)
 
 active_streaming_tasks = {}
 
-def send_password_reset_email(email, token, username):
-    """
-	Send a password reset email to the specified user.
-    
-    This function constructs a password reset email containing a reset URL and sends it using the Mailgun API. It logs the success or failure of the email sending process.
-    
-    Args:
-        email (str): The recipient's email address to which the password reset email will be sent.
-        token (str): The token used to authenticate the password reset request.
-        username (str): The username of the user requesting the password reset.
-    
-    Returns:
-        None
-    
-    Raises:
-        Exception: If there is an error in sending the email, an error message will be logged.
-    """
-    reset_url = url_for("auth_views.reset_password", token=token, _external=True)
-    mailgun_domain = current_app.config.get("MAILGUN_DOMAIN")
-    mailgun_api_key = current_app.config.get("MAILGUN_API_KEY")
-    from_email = current_app.config.get("MAILGUN_FROM_EMAIL")
-    
-    html_content = f"""
+# INCRBY only when the counter is seeded, in one step, so a key that expires in between isn't recreated without a TTL.
+_incr_if_exists = redis_cache.register_script(
+    "if redis.call('exists', KEYS[1]) == 1 then return redis.call('incrby', KEYS[1], ARGV[1]) end"
+)
+
+_socketio = None
+
+PAYLOAD_SIGNATURE_TTL = 86400
+SITE_CONFIG_CACHE_TTL = 30
+UNREAD_NOTIFICATIONS_TTL = 3600
+POPULAR_TAGS_CACHE_TTL = 300
+TAG_SUGGESTION_LIMIT = 20
+SEARCH_CACHE_TTL = 60
+NOTIFICATION_QUEUE_KEY = "notif:persist"
+NOTIFICATION_DEAD_LETTER_KEY = "notif:dead"
+NOTIFICATION_BATCH_SIZE = 100
+MAILGUN_BATCH_SIZE = 1000
+S3_DELETE_WORKERS = 8
+
+_CREDIT_ATTR = {
+    "meta": "text_credits",
+    "story_arcs": "text_credits",
+    "summaries": "text_credits",
+    "chapter_guide": "text_credits",
+    "chapter": "text_credits",
+    "image": "image_credits"
+}
+
+_PW_RE = re.compile(r"^(?=.*[a-z])(?=.*[A-Z])(?=.*\d)(?=.*[\W_]).{8,}$")
+
+_CREDIT_TYPE_ATTR = {
+    "text": "text_credits",
+    "image": "image_credits",
+    "audio": "audio_credits"
+}
+IMAGE_URL_EXPIRY = 3600
+IMAGE_URL_LOCAL_TTL = 300
+IMAGE_URL_CACHE_TTL = IMAGE_URL_EXPIRY - 60 - IMAGE_URL_LOCAL_TTL
+
+_url_cache = TTLCache(maxsize=10000, ttl=IMAGE_URL_LOCAL_TTL)
+_url_cache_lock = threading.Lock()
+
+JWT_DECODE_CACHE_TTL = 60
+_jwt_cache = TTLCache(maxsize=10000, ttl=JWT_DECODE_CACHE_TTL)
+_jwt_cache_lock = threading.Lock()
+
+_RESET_EMAIL_TEMPLATE = Template("""
     <html>
       <head>
         <meta charset="utf-8">
         <style>
-          body {{
+          body {
             font-family: Arial, sans-serif;
             line-height: 1.6;
             color: #333;
-          }}
-          .button {{
+          }
+          .button {
             display: inline-block;
             padding: 10px 15px;
             background-color: #dfeaf8;
             color: #fff;
             text-decoration: none;
             border-radius: 5px;
-          }}
+          }
         </style>
       </head>
       <body>
-        <p>Hello {username},</p>
+        <p>Hello $username,</p>
         <p>You recently requested to reset your password. Click the button below to proceed:</p>
-        <p><a href="{reset_url}" class="button">Reset Your Password</a></p>
+        <p><a href="$reset_url" class="button">Reset Your Password</a></p>
         <p>If you did not request this, please ignore this email.</p>
         <p>Thank you,<br>example.com</p>
       </body>
     </html>
-    """
-    
-    data = {
-        "from": from_email,
-        "to": email,
-        "subject": "[example.com] Password Reset Request",
-        "html": html_content,
-    }
-    
-    response = requests.post(
-        f"https://api.mailgun.net/v3/{mailgun_domain}/messages",
-        auth=("api", mailgun_api_key),
-        data=data
-    )
-    
-    if response.status_code == 200:
-        current_app.logger.info("Password reset email sent successfully.")
-    else:
-        current_app.logger.error(f"Mailgun error: {response.text}")
+    """)
 
-def send_verification_email(email, token, username):
-    """
-	Send a verification email to the specified user.
-    
-    This function constructs a verification email containing a unique token and sends it to the user's email address using the Mailgun API. It logs the result of the email sending operation.
-    
-    Args:
-        email (str): The recipient's email address.
-        token (str): The unique token for email verification.
-        username (str): The username of the recipient (not used in the current implementation).
-    
-    Returns:
-        None
-    
-    Raises:
-        Exception: If there is an error in sending the email, an error message is logged.
-    """
-    verification_url = url_for("auth.verify_email", token=token, _external=True)
-    mailgun_domain = current_app.config.get("MAILGUN_DOMAIN")
-    mailgun_api_key = current_app.config.get("MAILGUN_API_KEY")
-    from_email = current_app.config.get("MAILGUN_FROM_EMAIL")
-    
-    html_content = f"""
+_VERIFY_EMAIL_TEMPLATE = Template("""
     <html>
       <head>
         <meta charset="utf-8">
         <style>
-          body {{
+          body {
             font-family: Arial, sans-serif;
             line-height: 1.6;
             color: #333;
-          }}
-          .button {{
+          }
+          .button {
             display: inline-block;
             padding: 10px 15px;
             background-color: #dfeaf8;
             color: #fff;
             text-decoration: none;
             border-radius: 5px;
-          }}
+          }
         </style>
       </head>
       <body>
-        <p>Hello {username},</p>
+        <p>Hello $username,</p>
         <p>Thank you for registering with us. Please verify your email address by clicking the button below:</p>
-        <p><a href="{verification_url}" class="button">Verify Email Address</a></p>
+        <p><a href="$verification_url" class="button">Verify Email Address</a></p>
         <p>If you did not create an account, please disregard this email.</p>
         <p>Best regards,<br>example.com</p>
       </body>
     </html>
+    """)
+
+def send_password_reset_email(email, token, username):
+    """
+	Send a password reset email to the specified user.
+    
+    This function constructs a password reset email containing a reset URL and queues it to be sent through the Mailgun API by a background task, so the request does not wait on Mailgun.
+    
+    Args:
+        email (str): The recipient's email address to which the password reset email will be sent.
+        token (str): The token used to authenticate the password reset request.
+        username (str): The username of the user requesting the password reset.
+    
+    Returns:
+        None
     """
+    from tasks import send_email_task
+    reset_url = url_for("auth_views.reset_password", token=token, _external=True)
+    
+    html_content = _RESET_EMAIL_TEMPLATE.substitute(username=username, reset_url=reset_url)
+    
+    send_email_task.delay(email, "[example.com] Password Reset Request", html_content)
+
+def send_verification_email(email, token, username):
+    """
+	Send a verification email to the specified user.
+    
+    This function constructs a verification email containing a unique token and queues it to be sent to the user's email address through the Mailgun API by a background task.
+    
+    Args:
+        email (str): The recipient's email address.
+        token (str): The unique token for email verification.
+        username (str): The username of the recipient.
+    
+    Returns:
+        None
+    """
+    from tasks import send_email_task
+    verification_url = url_for("auth.verify_email", token=token, _external=True)
+    
+    html_content = _VERIFY_EMAIL_TEMPLATE.substitute(username=username, verification_url=verification_url)
+    
+    send_email_task.delay(email, "[example.com] Verify your email address", html_content)
+
+def send_email(email, subject, html_content):
+    """
+	Sends an HTML email through the Mailgun API.
+    
+    This is the blocking call behind the email helpers; it runs inside the send_email_task background task. 
+    It logs the success or failure of the email sending process.
+    
+    Args:
+        email (str): The recipient's email address.
+        subject (str): The subject line of the email.
+        html_content (str): The HTML body of the email.
+    
+    Returns:
+        bool: True if Mailgun accepted the message, otherwise False.
+    """
+    mailgun_domain = current_app.config.get("MAILGUN_DOMAIN")
+    mailgun_api_key = current_app.config.get("MAILGUN_API_KEY")
+    from_email = current_app.config.get("MAILGUN_FROM_EMAIL")
     
     data = {
         "from": from_email,
         "to": email,
-        "subject": "[example.com] Verify your email address",
+        "subject": subject,
         "html": html_content,
     }
     
-    response = requests.post(
+    response = mailgun_session.post(
         f"https://api.mailgun.net/v3/{mailgun_domain}/messages",
         auth=("api", mailgun_api_key),
         data=data
     )
     
     if response.status_code == 200:
-        current_app.logger.info("Verification email sent successfully.")
+        current_app.logger.info(f"Email '{subject}' sent successfully.")
+        return True
+    current_app.logger.error(f"Mailgun error: {response.text}")
+    return False
+
+def send_bulk_email(recipients, subject, html_template):
+    """
+	Sends one personalized HTML email to many recipients using Mailgun batch sending.
+    
+    Each recipient's values are passed as Mailgun recipient-variables, so the template references them 
+    as %recipient.<name>% (e.g. %recipient.username%). Recipients are sent in slices of MAILGUN_BATCH_SIZE, 
+    one API call per slice, and every recipient only sees their own address.
+    
+    Args:
+        recipients (list): Dictionaries with an 'email' key plus any template variables for that recipient.
+        subject (str): The subject line of the email. May also use %recipient.<name>% placeholders.
+        html_template (str): The HTML body with %recipient.<name>% placeholders.
+    
+    Returns:
+        int: The number of recipients in batches Mailgun accepted.
+    """
+    mailgun_domain = current_app.config.get("MAILGUN_DOMAIN")
+    mailgun_api_key = current_app.config.get("MAILGUN_API_KEY")
+    from_email = current_app.config.get("MAILGUN_FROM_EMAIL")
+    
+    sent = 0
+    for start in range(0, len(recipients), MAILGUN_BATCH_SIZE):
+        batch = recipients[start:start + MAILGUN_BATCH_SIZE]
+        recipient_variables = {
+            recipient["email"]: {key: value for key, value in recipient.items() if key != "email"}
+            for recipient in batch
+        }
+        data = {
+            "from": from_email,
+            "to": ", ".join(recipient_variables),
+            "subject": subject,
+            "html": html_template,
+            "recipient-variables": json.dumps(recipient_variables),
+        }
+        response = mailgun_session.post(
+            f"https://api.mailgun.net/v3/{mailgun_domain}/messages",
+            auth=("api", mailgun_api_key),
+            data=data
+        )
+        if response.status_code == 200:
+            sent += len(batch)
+        else:
+            current_app.logger.error(f"Mailgun batch error: {response.text}")
+    current_app.logger.info(f"Bulk email '{subject}' sent to {sent} of {len(recipients)} recipients.")
+    return sent
+
+def get_site_config():
+    """
+	Returns the site-wide registration and maintenance flags, cached in Redis.
+    
+    The flags are read from the first SiteConfig row at most once every
+    SITE_CONFIG_CACHE_TTL seconds; clear_site_config_cache() forces a reload.
+    
+    Returns:
+        dict: A dictionary with the boolean keys 'registration_disabled' and 'maintenance_mode'.
+    """
+    cached = redis_cache.get("site_config")
+    if cached:
+        return json.loads(cached)
+    site_config = SiteConfig.query.first()
+    config = {
+        "registration_disabled": bool(site_config and site_config.registration_disabled),
+        "maintenance_mode": bool(site_config and site_config.maintenance_mode)
+    }
+    redis_cache.setex("site_config", SITE_CONFIG_CACHE_TTL, json.dumps(config))
+    return config
+
+def clear_site_config_cache():
+    """
+	Drops the cached site configuration so the next request reads it from the database.
+    
+    Returns:
+        None
+    """
+    redis_cache.delete("site_config")
+
+def get_unread_notification_count(user_id):
+    """
+	Returns the number of unread notifications for a user from the Redis counter.
+    
+    On a cache miss the counter is seeded from a COUNT query.
+    
+    Args:
+        user_id (int): The ID of the user.
+    
+    Returns:
+        int: The number of unread notifications.
+    """
+    key = f"notif:unread:{user_id}"
+    count = redis_cache.get(key)
+    if count is None:
+        count = Notification.query.filter_by(user_id=user_id, is_read=False).count()
+        redis_cache.setex(key, UNREAD_NOTIFICATIONS_TTL, count)
+    return int(count)
+
+def increment_unread_notifications(user_id, count=1):
+    """
+	Bumps a user's unread notification counter after notifications are saved.
+    
+    The counter is only incremented if it is already seeded; otherwise the next
+    read seeds it from the database, which already includes the new notifications.
+    
+    Args:
+        user_id (int): The ID of the user who received the notifications.
+        count (int, optional): The number of notifications saved. Defaults to 1.
+    
+    Returns:
+        None
+    """
+    _incr_if_exists(keys=[f"notif:unread:{user_id}"], args=[count])
+
+def reset_unread_notifications(user_id):
+    """
+	Sets a user's unread notification counter to zero after their notifications are read or cleared.
+    
+    Args:
+        user_id (int): The ID of the user.
+    
+    Returns:
+        None
+    """
+    redis_cache.setex(f"notif:unread:{user_id}", UNREAD_NOTIFICATIONS_TTL, 0)
+
+def get_popular_tags():
+    """
+	Returns the most used tags as suggestion dictionaries, cached in Redis.
+    
+    Returns:
+        list: Up to TAG_SUGGESTION_LIMIT dictionaries with the tag's 'id' and 'value' (name),
+        ordered by the number of stories using the tag.
+    """
+    cached = redis_cache.get("tags:popular")
+    if cached:
+        return json.loads(cached)
+    rows = db.session.query(Tag.id, Tag.name)\
+        .outerjoin(story_tags, story_tags.c.tag_id == Tag.id)\
+        .group_by(Tag.id, Tag.name)\
+        .order_by(func.count(story_tags.c.story_id).desc(), Tag.name)\
+        .limit(TAG_SUGGESTION_LIMIT)\
+        .all()
+    suggestions = [{"id": tag_id, "value": name} for tag_id, name in rows]
+    redis_cache.setex("tags:popular", POPULAR_TAGS_CACHE_TTL, json.dumps(suggestions))
+    return suggestions
+
+def clear_popular_tags_cache():
+    """
+	Drops the cached popular tags so the next empty tag search rebuilds them.
+    
+    Returns:
+        None
+    """
+    redis_cache.delete("tags:popular")
+
+def get_search_cache_key(*params):
+    """
+	Builds the Redis key for a cached public story search.
+    
+    The key embeds the current search cache version, so bumping the version
+    with bump_search_cache_version() invalidates every cached search at once.
+    
+    Args:
+        *params: The normalized search parameters (e.g. tags, sort, order, page, mature filter).
+    
+    Returns:
+        str: The cache key for the given parameters.
+    """
+    version = redis_cache.get("search:version") or 0
+    return f"search:{version}:{get_payload_signature(params)}"
+
+def bump_search_cache_version():
+    """
+	Invalidates all cached public story searches by bumping the search cache version.
+    
+    Returns:
+        None
+    """
+    redis_cache.incr("search:version")
+
+def encode_cursor(value, row_id):
+    """
+	Encodes a keyset pagination cursor from the sort value and ID of the last row on a page.
+    
+    Args:
+        value: The value of the sort column for the last row. Datetimes are stored in ISO format.
+        row_id (int): The ID of the last row, used as a tie-breaker.
+    
+    Returns:
+        str: A URL-safe cursor string.
+    """
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([value, row_id]).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor):
+    """
+	Decodes a keyset pagination cursor created by encode_cursor().
+    
+    Args:
+        cursor (str): The cursor string.
+    
+    Returns:
+        tuple: The (value, row_id) pair stored in the cursor. Datetimes are returned as ISO strings.
+    
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return value, int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor.")
+
+def queue_notification(user_id, message, story_id=None):
+    """
+	Delivers a notification over the socket immediately and queues it to be saved in the background.
+    
+    The notification row is written later by persist_queued_notifications(), so the caller does not
+    wait on a database commit; the unread counter is bumped once the row is saved.
+    
+    Args:
+        user_id (int): The ID of the user to notify.
+        message (str): The notification message.
+        story_id (int, optional): The ID of the story the notification refers to.
+    
+    Returns:
+        None
+    """
+    redis_cache.lpush(NOTIFICATION_QUEUE_KEY, json.dumps({
+        "user_id": user_id,
+        "story_id": story_id,
+        "message": message,
+        "created_at": datetime.utcnow().isoformat()
+    }))
+    notify(message, user_id)
+
+def persist_queued_notifications():
+    """
+	Saves up to NOTIFICATION_BATCH_SIZE queued notifications in one bulk insert.
+    
+    The oldest queued notifications are taken first. If the bulk insert fails they are inserted one
+    by one, and any that still fail (e.g. because their story or user was deleted in the meantime) are
+    moved to NOTIFICATION_DEAD_LETTER_KEY so they cannot block the queue. Only when the database itself
+    is unreachable is the batch put back at the end of the queue to be retried on the next call.
+    Each user's unread counter is bumped by the number of their notifications actually saved.
+    
+    Returns:
+        int: The number of notifications saved.
+    """
+    pipe = redis_cache.pipeline()
+    pipe.lrange(NOTIFICATION_QUEUE_KEY, -NOTIFICATION_BATCH_SIZE, -1)
+    pipe.ltrim(NOTIFICATION_QUEUE_KEY, 0, -NOTIFICATION_BATCH_SIZE - 1)
+    items, _ = pipe.execute()
+    if not items:
+        return 0
+    queued = [json.loads(item) for item in reversed(items)]
+    notifications = []
+    for data in queued:
+        notifications.append(Notification(**dict(data, created_at=datetime.fromisoformat(data["created_at"]))))
+    try:
+        db.session.bulk_save_objects(notifications)
+        db.session.commit()
+        _increment_saved_unread(Counter(data["user_id"] for data in queued))
+        return len(notifications)
+    except OperationalError:
+        db.session.rollback()
+        redis_cache.rpush(NOTIFICATION_QUEUE_KEY, *items)
+        raise
+    except Exception:
+        db.session.rollback()
+
+    oldest_first = list(reversed(items))
+    saved = Counter()
+    for index, (item, data, notification) in enumerate(zip(oldest_first, queued, notifications)):
+        try:
+            db.session.add(notification)
+            db.session.commit()
+            saved[data["user_id"]] += 1
+        except OperationalError:
+            db.session.rollback()
+            redis_cache.rpush(NOTIFICATION_QUEUE_KEY, *reversed(oldest_first[index:]))
+            _increment_saved_unread(saved)
+            raise
+        except Exception as e:
+            db.session.rollback()
+            redis_cache.rpush(NOTIFICATION_DEAD_LETTER_KEY, item)
+            current_app.logger.error(f"Moved notification to {NOTIFICATION_DEAD_LETTER_KEY}: {e}")
+    _increment_saved_unread(saved)
+    return sum(saved.values())
+
+def _increment_saved_unread(saved):
+    for user_id, count in saved.items():
+        increment_unread_notifications(user_id, count)
+
+def conditional_response(response, max_age=None):
+    """
+	Adds an ETag to a response and turns it into a 304 when the client already has the same body.
+    
+    The ETag is an MD5 of the response body, so it changes exactly when the rendered content does.
+    The response is marked private because list pages depend on the user's settings.
+    
+    Args:
+        response (flask.Response): The response to make conditional.
+        max_age (int, optional): How many seconds the browser may reuse the response without revalidating.
+    
+    Returns:
+        flask.Response: The original response with caching headers, or an empty 304 response.
+    """
+    response.add_etag()
+    response.cache_control.private = True
+    if max_age is not None:
+        response.cache_control.max_age = max_age
     else:
-        current_app.logger.error(f"Mailgun error: {response.text}")
+        response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def ojson(obj, status=200):
+    """
+	Serializes an object to a JSON response using orjson.
+    
+    Args:
+        obj: The JSON-serializable object to return.
+        status (int): The HTTP status code of the response. Defaults to 200.
+    
+    Returns:
+        flask.Response: A response with the serialized body and an application/json mimetype.
+    """
+    return Response(orjson.dumps(obj), status=status, mimetype="application/json")
+
+def get_payload_signature(*payloads):
+    """
+	Computes a stable MD5 signature for one or more JSON-serializable payloads.
+    
+    Args:
+        *payloads: The payloads to hash, serialized with sorted keys so equal content always hashes the same.
+    
+    Returns:
+        str: The hex digest of the combined payloads.
+    """
+    digest = hashlib.md5()
+    for payload in payloads:
+        digest.update(json.dumps(payload, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+def is_payload_unchanged(kind, story_id, signature):
+    """
+	Checks whether a payload signature matches the last one saved for a story.
+    
+    Args:
+        kind (str): The kind of payload (e.g. "meta" or "arcs").
+        story_id (int): The ID of the story the payload belongs to.
+        signature (str): The signature of the incoming payload.
+    
+    Returns:
+        bool: True if the incoming payload matches the last saved one, otherwise False.
+    """
+    return redis_cache.get(f"{kind}:{story_id}:sig") == signature
+
+def store_payload_signature(kind, story_id, signature):
+    """
+	Stores the signature of the payload that was just saved for a story.
+    
+    Args:
+        kind (str): The kind of payload (e.g. "meta" or "arcs").
+        story_id (int): The ID of the story the payload belongs to.
+        signature (str): The signature of the saved payload.
+    
+    Returns:
+        None
+    """
+    redis_cache.set(f"{kind}:{story_id}:sig", signature, ex=PAYLOAD_SIGNATURE_TTL)
+
+def clear_payload_signature(kind, story_id):
+    """
+	Forgets the saved payload signature for a story.
+    
+    This must be called whenever the underlying rows change outside of the signed save path
+    (e.g. generation tasks), so a later save of the previous payload is not skipped.
+    
+    Args:
+        kind (str): The kind of payload (e.g. "meta" or "arcs").
+        story_id (int): The ID of the story the payload belongs to.
+    
+    Returns:
+        None
+    """
+    redis_cache.delete(f"{kind}:{story_id}:sig")
 
 def is_last_generation_and_negative_creds(user, _type):
     """
@@ -169,42 +626,15 @@ def is_last_generation_and_negative_creds(user, _type):
     Returns:
         bool: True if the last generation log entry matches the specified type and the user's credits for that type are negative, otherwise False.
     """
-    log_entry = GenerationLog.query.filter_by(
+    generation_type = db.session.query(GenerationLog.generation_type).filter_by(
         user_id=user.id
-    ).order_by(desc(GenerationLog.id)).first()
+    ).order_by(GenerationLog.id.desc()).limit(1).scalar()
 
-    if not log_entry:
+    if generation_type is None or generation_type != _type:
         return False
-    
-    generation_type = log_entry.generation_type
 
-    if generation_type != _type:
-        return False
-
-    
-    isCreditNegative = False
-    if generation_type == "meta":
-        if user.text_credits <= 0:
-            isCreditNegative = True
-    elif generation_type == "story_arcs":
-        if user.text_credits <= 0:
-            isCreditNegative = True
-    elif generation_type == "summaries":
-        if user.text_credits <= 0:
-            isCreditNegative = True
-    elif generation_type == "chapter_guide":
-        if user.text_credits <= 0:
-            isCreditNegative = True
-    elif generation_type == "chapter":
-        if user.text_credits <= 0:
-            isCreditNegative = True
-    elif generation_type == "chapter":
-        if user.text_credits <= 0:
-            isCreditNegative = True
-    elif generation_type == "image":
-        if user.image_credits <= 0:
-            isCreditNegative = True
-    return isCreditNegative
+    attr = _CREDIT_ATTR.get(generation_type)
+    return attr is not None and getattr(user, attr) <= 0
 
 def delete_images_for_story(story_id):
     """
@@ -213,32 +643,49 @@ def delete_images_for_story(story_id):
     Args:
         story_id (str): The unique identifier of the story whose images are to be deleted.
     
+    Keys are listed page by page (up to 1000 per page) and each page's delete_objects call is
+    submitted to a thread pool as soon as the page arrives, so listing and deleting overlap.
+    
     Returns:
-        dict or None: A dictionary containing the response from the S3 delete operation if images were deleted, 
+        list or None: The responses from the S3 delete operations, one per page of keys,
                       or None if there were no images to delete.
                       
     Raises:
         Exception: Raises an exception if there is an error during the S3 operations.
     """    
 
+    bucket = current_app.config.get("S3_IMAGE_BUCKET")
     prefix = f"stories/{story_id}"
-    response = s3_client.list_objects_v2(Bucket=current_app.config.get("S3_IMAGE_BUCKET"), Prefix=prefix)
-    if 'Contents' in response:
-        objects_to_delete = [{'Key': obj['Key']} for obj in response['Contents']]
-        delete_response = s3_client.delete_objects(
-            Bucket=current_app.config.get("S3_IMAGE_BUCKET"),
-            Delete={'Objects': objects_to_delete}
-        )
-        return delete_response
-    return None
+    paginator = s3_client.get_paginator('list_objects_v2')
+
+    futures = []
+    with ThreadPoolExecutor(max_workers=S3_DELETE_WORKERS) as executor:
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            if 'Contents' not in page:
+                continue
+            objects_to_delete = [{'Key': obj['Key']} for obj in page['Contents']]
+            futures.append(executor.submit(
+                s3_client.delete_objects,
+                Bucket=bucket,
+                Delete={'Objects': objects_to_delete, 'Quiet': True}
+            ))
+            redis_cache.delete(*[f"s3url:{obj['Key']}" for obj in objects_to_delete])
+            with _url_cache_lock:
+                for obj in objects_to_delete:
+                    _url_cache.pop(obj['Key'], None)
+
+    if not futures:
+        return None
+    return [future.result() for future in futures]
 
-def put_image(image_key, image_data):
+def put_image(image_key, image_data, content_type='image/jpeg'):
     """
 	Uploads an image to an S3 bucket.
     
     Args:
         image_key (str): The key under which the image will be stored in the S3 bucket.
         image_data (bytes): The binary data of the image to be uploaded.
+        content_type (str, optional): The content type stored with the object. Defaults to 'image/jpeg'.
     
     Returns:
         str: The key of the uploaded image.
@@ -250,12 +697,15 @@ def put_image(image_key, image_data):
         Bucket=current_app.config.get("S3_IMAGE_BUCKET"),
         Key=image_key,
         Body=image_data,
-        ContentType='image/jpeg'
+        ContentType=content_type
     )
+    redis_cache.delete(f"s3url:{image_key}")
+    with _url_cache_lock:
+        _url_cache.pop(image_key, None)
 
     return image_key
 
-def get_image_url(image_key):
+def generate_image_url(image_key, bucket=None):
     """
 	Generates a presigned URL for an image stored in an S3 bucket.
     
@@ -265,6 +715,7 @@ def get_image_url(image_key):
     
     Args:
         image_key (str): The key of the image in the S3 bucket.
+        bucket (str, optional): The bucket name. Defaults to the configured S3_IMAGE_BUCKET.
     
     Returns:
         str or bool: A presigned URL as a string if successful, or False if an
@@ -273,12 +724,89 @@ def get_image_url(image_key):
     try:
         return s3_client.generate_presigned_url(
             'get_object',
-            Params={'Bucket': current_app.config.get("S3_IMAGE_BUCKET"), 'Key': image_key},
-            ExpiresIn=3600
+            Params={'Bucket': bucket or current_app.config.get("S3_IMAGE_BUCKET"), 'Key': image_key},
+            ExpiresIn=IMAGE_URL_EXPIRY
         )
     except:
         return False
 
+def get_image_url(image_key):
+    """
+	Returns a presigned URL for an image, reusing a cached URL when one is still valid.
+    
+    URLs are looked up in a small in-process TTL cache first, then in Redis. The Redis TTL
+    leaves room for the in-process TTL, so a cached URL is always valid for at least another
+    minute when it is handed out.
+    
+    Args:
+        image_key (str): The key of the image in the S3 bucket.
+    
+    Returns:
+        str or bool: A presigned URL as a string if successful, or False if there is
+        no key or an error occurs during URL generation.
+    """
+    if not image_key:
+        return False
+    url = _url_cache.get(image_key)
+    if url:
+        return url
+    cache_key = f"s3url:{image_key}"
+    url = redis_cache.get(cache_key)
+    if not url:
+        url = generate_image_url(image_key)
+        if url:
+            redis_cache.setex(cache_key, IMAGE_URL_CACHE_TTL, url)
+    if url:
+        with _url_cache_lock:
+            _url_cache[image_key] = url
+    return url
+
+def get_image_urls(image_keys):
+    """
+	Returns presigned URLs for several images using a single cache round-trip.
+    
+    URLs held in the in-process cache are used directly. The rest are fetched with one MGET;
+    any misses are signed and written back in a single pipeline, which is skipped entirely
+    when every URL was cached.
+    
+    Presigning is a local HMAC computation with the static S3 keys (no network call),
+    so misses are signed inline rather than fanned out to a worker pool.
+    
+    Args:
+        image_keys (list): The keys of the images in the S3 bucket. Empty keys are allowed.
+    
+    Returns:
+        dict: A mapping of each non-empty image key to its presigned URL (or False on error).
+    """
+    urls = {}
+    keys = []
+    for key in {key for key in image_keys if key}:
+        url = _url_cache.get(key)
+        if url:
+            urls[key] = url
+        else:
+            keys.append(key)
+    if not keys:
+        return urls
+    cached = redis_cache.mget([f"s3url:{key}" for key in keys])
+    fetched = dict(zip(keys, cached))
+    missing = [key for key, url in fetched.items() if not url]
+    if missing:
+        bucket = current_app.config.get("S3_IMAGE_BUCKET")
+        pipe = redis_cache.pipeline()
+        for key in missing:
+            url = generate_image_url(key, bucket)
+            if url:
+                pipe.setex(f"s3url:{key}", IMAGE_URL_CACHE_TTL, url)
+            fetched[key] = url
+        pipe.execute()
+    with _url_cache_lock:
+        for key, url in fetched.items():
+            if url:
+                _url_cache[key] = url
+    urls.update(fetched)
+    return urls
+
 def generate_verification_token(user):
     """
 	Generates a verification token for a given user.
@@ -317,8 +845,7 @@ def is_valid_password(password: str) -> bool:
     Returns:
         bool: True if the password is valid, False otherwise.
     """
-    pattern = re.compile(r"^(?=.*[a-z])(?=.*[A-Z])(?=.*\d)(?=.*[\W_]).{8,}$")
-    return pattern.match(password) is not None
+    return _PW_RE.match(password) is not None
 
 def notify(message, user_id):
     """
@@ -333,9 +860,22 @@ def notify(message, user_id):
     Returns:
         None
     """
-    from flask_socketio import SocketIO
-    from app import app, socketio
-    socketio.emit("notification", {"message": message}, room=user_id)
+    _get_socketio().emit("notification", {"message": message}, room=user_id)
+
+def _get_socketio():
+    """
+	Returns the app's SocketIO instance, importing it on first use.
+    
+    app.py imports this module, so the instance cannot be imported at module scope.
+    
+    Returns:
+        flask_socketio.SocketIO: The shared SocketIO instance.
+    """
+    global _socketio
+    if _socketio is None:
+        from app import socketio
+        _socketio = socketio
+    return _socketio
 
 def get_current_user():
     """
@@ -343,6 +883,8 @@ def get_current_user():
     
     This function checks for an access token in the request cookies. If the token is found, it attempts to decode it to extract the user ID. If successful, it retrieves the corresponding user from the database. If the token is missing, invalid, or does not contain a user ID, the function returns None.
     
+    The result is memoized on flask.g, so the maintenance hook, the view and the context processors share a single lookup per request.
+    
     Returns:
         User or None: The current user object if found, otherwise None.
     
@@ -350,11 +892,40 @@ def get_current_user():
         - A warning if the token is decoded but no user ID is found.
         - An error if the token decoding fails.
     """
+    if "current_user" not in g:
+        g.current_user = _load_current_user()
+    return g.current_user
+
+def _decode_token_cached(token):
+    """
+	Decodes an access token, reusing the payload of a recent decode of the same token.
+    
+    A cached payload is only used while its own expiry is still in the future; past that
+    the token is decoded again so decode_token raises as usual.
+    
+    Args:
+        token (str): The raw JWT from the access_token cookie.
+    
+    Returns:
+        dict: The decoded token payload.
+    
+    Raises:
+        Exception: If the token is invalid or expired.
+    """
+    decoded_token = _jwt_cache.get(token)
+    if decoded_token is not None and decoded_token.get("exp", 0) > time.time():
+        return decoded_token
+    decoded_token = decode_token(token)
+    with _jwt_cache_lock:
+        _jwt_cache[token] = decoded_token
+    return decoded_token
+
+def _load_current_user():
     token = request.cookies.get("access_token")
     if not token:
         return None
     try:
-        decoded_token = decode_token(token)
+        decoded_token = _decode_token_cached(token)
         user_id = decoded_token.get("sub")
         if not user_id:
             logging.warning("Token decoded but no user id found.")
@@ -431,6 +1002,27 @@ def is_admin(func):
         return func(*args, **kwargs)
     return wrapper
 
+def _authorize_owned(model, object_id, user):
+    """
+	Fetches the owner of a row together with the user's role name in one query.
+    
+    Args:
+        model (db.Model): The model of the row, which must have a user_id column (Story or Comment).
+        object_id (int): The ID of the row.
+        user (User): The user being authorized.
+    
+    Returns:
+        tuple or None: (owner_id, is_admin) if the row exists, otherwise None.
+    """
+    row = db.session.query(model.user_id, Role.name)\
+        .select_from(model)\
+        .join(Role, Role.id == user.role_id)\
+        .filter(model.id == object_id)\
+        .first()
+    if row is None:
+        return None
+    return row[0], row[1] == "admin"
+
 def is_comment_author_or_admin(func):
     """
 	Checks if the current user is the author of a comment or an admin.
@@ -464,10 +1056,11 @@ def is_comment_author_or_admin(func):
             comment_id = json_data.get("comment_id")
         if not comment_id:
             return jsonify({"error": "comment_id not provided"}), 400
-        comment = Comment.query.get(comment_id)
-        if not comment:
+        authorization = _authorize_owned(Comment, comment_id, user)
+        if not authorization:
             return jsonify({"error": "Story not found"}), 404
-        if comment.user_id != user.id and user.role.name != "admin":
+        owner_id, user_is_admin = authorization
+        if owner_id != user.id and not user_is_admin:
             return jsonify({"error": "Unauthorized"}), 403
         return func(*args, **kwargs)
     return wrapper
@@ -503,10 +1096,11 @@ def is_story_author_or_admin(func):
             story_id = json_data.get("story_id")
         if not story_id:
             return jsonify({"error": "story_id not provided"}), 400
-        story = Story.query.get(story_id)
-        if not story:
+        authorization = _authorize_owned(Story, story_id, user)
+        if not authorization:
             return jsonify({"error": "Story not found"}), 404
-        if story.user_id != user.id and user.role.name != "admin":
+        owner_id, user_is_admin = authorization
+        if owner_id != user.id and not user_is_admin:
             return jsonify({"error": "Unauthorized"}), 403
         return func(*args, **kwargs)
     return wrapper
@@ -524,18 +1118,16 @@ def can_spend_credits(user, credit_type, cost):
         bool: True if the user has enough credits of the specified type to cover the cost, 
               False otherwise.
     """
-    if credit_type == "text":
-        return user.text_credits >= cost
-    elif credit_type == "image":
-        return user.image_credits >= cost
-    elif credit_type == "audio":
-        return user.audio_credits >= cost
-    return False
+    attr = _CREDIT_TYPE_ATTR.get(credit_type)
+    return attr is not None and getattr(user, attr) >= cost
 
 def spend_credits(user_id, credit_type, cost):
     """
 	Spends credits for a specified user and credit type.
     
+    The balance is decremented with a single atomic UPDATE, so concurrent generation tasks
+    spending for the same user cannot overwrite each other's deductions.
+    
     Args:
         user_id (int): The ID of the user whose credits are to be spent.
         credit_type (str): The type of credit to spend. Must be one of 'text', 'image', or 'audio'.
@@ -548,11 +1140,11 @@ def spend_credits(user_id, credit_type, cost):
     Returns:
         None
     """
-    user = User.query.filter_by(id=user_id).first()
-    if credit_type == "text":
-        user.text_credits -= cost
-    elif credit_type == "image":
-        user.image_credits -= cost
-    elif credit_type == "audio":
-        user.audio_credits -= cost
+    attr = _CREDIT_TYPE_ATTR.get(credit_type)
+    if attr is None:
+        raise ValueError(f"Unknown credit type: {credit_type}")
+    column = getattr(User, attr)
+    db.session.query(User).filter(User.id == user_id).update(
+        {column: column - cost}, synchronize_session=False
+    )
     db.session.commit()
@@ -1,6 +1,10 @@
+from sqlalchemy import event, exists, select
 from . import db
 
 class Chapter(db.Model):
+    __table_args__ = (
+        db.Index('ix_chapter_story_number', 'story_id', 'chapter_number'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     chapter_number = db.Column(db.Integer, nullable=False)
     title = db.Column(db.String(200), nullable=False)
@@ -8,4 +12,45 @@ class Chapter(db.Model):
     summary = db.Column(db.Text, nullable=True)
     chapter_image_key = db.Column(db.String(500), nullable=True)
     chapter_image_prompt = db.Column(db.String(500), nullable=True)
-    story_id = db.Column(db.Integer, db.ForeignKey('story.id'), nullable=False)
\ No newline at end of file
+    story_id = db.Column(db.Integer, db.ForeignKey('story.id'), nullable=False)
+
+@event.listens_for(Chapter, 'after_insert')
+def mark_story_has_chapters(mapper, connection, target):
+    """
+	Flags the chapter's story as having chapters once a chapter is inserted.
+    
+    Args:
+        mapper: The Chapter mapper.
+        connection: The connection used for the flush.
+        target (Chapter): The inserted chapter.
+    
+    Returns:
+        None
+    """
+    from .Story import Story
+    connection.execute(
+        Story.__table__.update()
+        .where(Story.__table__.c.id == target.story_id)
+        .values(has_chapters=True)
+    )
+
+@event.listens_for(Chapter, 'after_delete')
+def refresh_story_has_chapters(mapper, connection, target):
+    """
+	Recomputes the story's has_chapters flag after one of its chapters is deleted.
+    
+    Args:
+        mapper: The Chapter mapper.
+        connection: The connection used for the flush.
+        target (Chapter): The deleted chapter.
+    
+    Returns:
+        None
+    """
+    from .Story import Story
+    chapter_table = Chapter.__table__
+    connection.execute(
+        Story.__table__.update()
+        .where(Story.__table__.c.id == target.story_id)
+        .values(has_chapters=select(exists().where(chapter_table.c.story_id == target.story_id)).scalar_subquery())
+    )
@@ -1,20 +1,33 @@
 from datetime import datetime
-from sqlalchemy.ext.mutable import MutableList
-from sqlalchemy import JSON
+from sqlalchemy import JSON, DDL, event
+from sqlalchemy.dialects.postgresql import JSONB
 from . import db
 
+JSONList = JSON().with_variant(JSONB(), 'postgresql')
+
 class ChapterGuide(db.Model):
+    __table_args__ = (
+        db.Index('ix_chapter_guide_story_chapter_part', 'story_id', 'chapter_title', 'part_index'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     story_id = db.Column(db.Integer, db.ForeignKey('story.id'), nullable=False)
     chapter_title = db.Column(db.String(200), nullable=False)
     part_index = db.Column(db.Integer, nullable=False)
     part_text = db.Column(db.Text, nullable=False)
-    characters = db.Column(MutableList.as_mutable(JSON), nullable=True, default=[])
-    locations = db.Column(MutableList.as_mutable(JSON), nullable=True, default=[])   
+    # Always reassigned as whole lists; in-place edits need flag_modified(mapping, "characters").
+    characters = db.Column(JSONList, nullable=True, default=list)
+    locations = db.Column(JSONList, nullable=True, default=list)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     def __repr__(self):
         return (
             f"<ChapterGuide Story:{self.story_id} "
             f"Chapter:{self.chapter_title} Part:{self.part_index}>"
-        )
\ No newline at end of file
+        )
+
+for _column in ('characters', 'locations'):
+    event.listen(
+        ChapterGuide.__table__,
+        'after_create',
+        DDL(f"CREATE INDEX ix_cg_{_column}_gin ON chapter_guide USING gin ({_column})").execute_if(dialect='postgresql')
+    )
@@ -2,6 +2,10 @@ from datetime import datetime
 from . import db
 
 class GenerationLog(db.Model):
+    __table_args__ = (
+        db.Index('ix_genlog_user_id_desc', 'user_id', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     task_id = db.Column(db.String(100), nullable=False)
@@ -1,6 +1,9 @@
 from . import db
 
 class Location(db.Model):
+    __table_args__ = (
+        db.Index('ix_location_story_name', 'story_id', 'name'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     story_id = db.Column(db.Integer, db.ForeignKey('story.id'), nullable=False)
     name = db.Column(db.String(100), nullable=False)
@@ -1,5 +1,7 @@
 from datetime import datetime
+from sqlalchemy import event
 from . import db
+from .User import User
 
 story_flags = db.Table('story_flags',
     db.Column('story_id', db.Integer, db.ForeignKey('story.id'), primary_key=True),
@@ -12,11 +14,20 @@ story_tags = db.Table('story_tags',
 )
 
 class Story(db.Model):
+    __table_args__ = (
+        db.Index('ix_story_shared_mature_created', 'shared', 'is_mature', 'created_at',
+                 postgresql_where=db.text('shared AND has_chapters'), sqlite_where=db.text('shared AND has_chapters')),
+        db.Index('ix_story_spotlight_created', 'spotlight', 'created_at',
+                 postgresql_where=db.text('shared AND spotlight'), sqlite_where=db.text('shared AND spotlight')),
+        db.Index('ix_story_user_created', 'user_id', 'created_at'),
+        db.Index('ix_story_shared_favorites', db.text('coalesce(favorites_count, 0)'),
+                 postgresql_where=db.text('shared'), sqlite_where=db.text('shared')),
+    )
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     chapters_count = db.Column(db.Integer, nullable=False)
     details = db.Column(db.Text, nullable=True)
-    tags = db.relationship('Tag', secondary=story_tags, backref=db.backref('stories', lazy='dynamic'))
+    tags = db.relationship('Tag', secondary=story_tags, backref=db.backref('stories', lazy='dynamic'), lazy='selectin')
     shared = db.Column(db.Boolean, default=False)
     spotlight = db.Column(db.Boolean, default=False)
     flagged = db.Column(db.Boolean, default=False)
@@ -24,16 +35,36 @@ class Story(db.Model):
     writing_style = db.Column(db.Text, nullable=True)
     inspirations = db.Column(db.Text, nullable=True)
     is_mature = db.Column(db.Boolean, default=False)
+    batch_mode = db.Column(db.Boolean, default=False, nullable=False, server_default='0')
+    quality_tier = db.Column(db.String(10), nullable=True)
     comments = db.relationship('Comment', backref='story', lazy=True, cascade="all, delete-orphan")
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    chapters = db.relationship('Chapter', backref='story', lazy=True, cascade="all, delete-orphan")
+    author_username = db.Column(db.String(80), nullable=True)
+    chapters = db.relationship('Chapter', backref='story', lazy=True, cascade="all, delete-orphan", order_by='Chapter.chapter_number')
+    has_chapters = db.Column(db.Boolean, default=False, nullable=False, server_default='0')
     favorites_count = db.Column(db.Integer, default=0)
     cover_image_prompt = db.Column(db.String(500), nullable=True)
     cover_image_key = db.Column(db.String(500), nullable=True)
     flaggers = db.relationship('User', secondary=story_flags, backref=db.backref('flagged_stories', lazy='dynamic'), lazy='dynamic')
     arcs = db.relationship('StoryArc', backref='story', lazy=True, cascade="all, delete-orphan")
     
+    @property
+    def tag_names_joined(self):
+        """
+	Returns the story's tag names as a comma-separated string, computed once per instance.
+        
+        The memo is dropped whenever the tags collection changes (see reset_tag_names_joined).
+        
+        Returns:
+            str: The tag names joined with ", ", or "" if the story has no tags.
+        """
+        joined = self.__dict__.get("_tag_names_joined")
+        if joined is None:
+            joined = ", ".join(tag.name for tag in self.tags)
+            self.__dict__["_tag_names_joined"] = joined
+        return joined
+
     def to_dict(self):
         tag_list = [{"id": tag.id, "name": tag.name} for tag in self.tags]
         arcs_list = [arc.arc_text for arc in self.arcs] if self.arcs else []
@@ -53,4 +84,45 @@ class Story(db.Model):
             "user_id": self.user_id,
             "arcs": arcs_list,
             "presigned_cover_url":""
-        }
\ No newline at end of file
+        }
+
+@event.listens_for(Story.tags, 'append')
+@event.listens_for(Story.tags, 'remove')
+@event.listens_for(Story.tags, 'set')
+@event.listens_for(Story, 'expire')
+@event.listens_for(Story, 'refresh')
+def reset_tag_names_joined(target, *args):
+    """
+	Drops the memoized tag_names_joined when a story's tags change or are reloaded.
+    
+    Args:
+        target (Story): The story whose tags changed, or that was expired/refreshed.
+        *args: The remaining event arguments, which are not needed.
+    
+    Returns:
+        None
+    """
+    target.__dict__.pop("_tag_names_joined", None)
+
+@event.listens_for(User.username, 'set')
+def propagate_author_username(target, value, oldvalue, initiator):
+    """
+	Keeps Story.author_username in sync when a user's username changes.
+    
+    Args:
+        target (User): The user being renamed.
+        value (str): The new username.
+        oldvalue (str): The previous username.
+        initiator: The attribute event initiator.
+    
+    Returns:
+        None
+    """
+    if target.id is None or value == oldvalue:
+        return
+    with db.session.no_autoflush:
+        db.session.execute(
+            Story.__table__.update()
+            .where(Story.__table__.c.user_id == target.id)
+            .values(author_username=value)
+        )
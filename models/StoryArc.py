@@ -2,6 +2,9 @@ from datetime import datetime
 from . import db
 
 class StoryArc(db.Model):
+    __table_args__ = (
+        db.Index('ix_story_arc_story_order', 'story_id', 'arc_order'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     story_id = db.Column(db.Integer, db.ForeignKey('story.id'), nullable=False)
     arc_text = db.Column(db.Text, nullable=False)
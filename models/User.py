@@ -1,7 +1,5 @@
-from flask_bcrypt import Bcrypt
 from datetime import datetime
-from . import db
-bcrypt = Bcrypt()
+from . import db, bcrypt
 
 favorites = db.Table('favorites',
     db.Column('user_id', db.Integer, db.ForeignKey('user.id')),
@@ -15,7 +13,7 @@ class User(db.Model):
     email = db.Column(db.String(255), unique=True, nullable=False)
     is_verified = db.Column(db.Boolean, default=False)
     role_id = db.Column(db.Integer, db.ForeignKey('role.id'), nullable=False)
-    role = db.relationship("Role", backref="users")
+    role = db.relationship("Role", backref="users", lazy="joined")
     show_mature = db.Column(db.Boolean, default=False)
     text_credits = db.Column(db.Integer, default=0)
     image_credits = db.Column(db.Integer, default=0)
@@ -0,0 +1,100 @@
+import io
+import json
+from openai_handler import client, SPECS, model_for, max_tokens_for
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_COMPLETION_WINDOW = "24h"
+BATCH_PENDING_STATUSES = ("validating", "in_progress", "finalizing", "cancelling")
+
+def submit_chapter_batch(prompts, endpoint=BATCH_ENDPOINT, tier=None):
+    """
+	Submits chapter prompts to the OpenAI Batch API as a single job.
+
+    Each prompt becomes one JSONL request line with a custom_id of "chap-<chapter_number>", using the same model
+    and messages as generate_chapter_content_from_prompt. The file is uploaded with purpose="batch" and a batch
+    is created against it, which is billed at the discounted batch rate and completes within 24 hours.
+
+    Args:
+        prompts (list): The chapter prompts, ordered by chapter; prompts[i] is chapter i + 1.
+        endpoint (str, optional): The API endpoint the batch targets. Defaults to "/v1/chat/completions".
+        tier (str, optional): The quality tier passed to model_for. Defaults to the DEFAULT_TIER config.
+
+    Returns:
+        str: The ID of the created batch.
+
+    Raises:
+        Exception: If the upload or the batch creation fails.
+    """
+    _, role, instruction, _ = SPECS["chapter"]
+    model = model_for("chapter", tier)
+    max_tokens = max_tokens_for("chapter")
+    lines = []
+    for i, prompt in enumerate(prompts):
+        lines.append(json.dumps({
+            "custom_id": f"chap-{i + 1}",
+            "method": "POST",
+            "url": endpoint,
+            "body": {
+                "model": model,
+                "messages": [
+                    {"role": role, "content": instruction},
+                    {"role": "user", "content": prompt}
+                ],
+                **({"max_completion_tokens": max_tokens} if max_tokens else {})
+            }
+        }))
+    try:
+        batch_file = client.files.create(
+            file=("chapters.jsonl", io.BytesIO("\n".join(lines).encode("utf-8"))),
+            purpose="batch"
+        )
+        batch = client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint=endpoint,
+            completion_window=BATCH_COMPLETION_WINDOW
+        )
+        return batch.id
+    except Exception as e:
+        raise Exception("Error submitting chapter batch: " + str(e)) from e
+
+def retrieve_batch(batch_id):
+    """
+	Fetches the current state of a batch.
+
+    Args:
+        batch_id (str): The ID of the batch.
+
+    Returns:
+        openai.types.Batch: The batch, including its status and output/error file IDs.
+    """
+    return client.batches.retrieve(batch_id)
+
+def fetch_chapter_batch_results(batch):
+    """
+	Downloads the output of a completed chapter batch and maps it back to chapter numbers.
+
+    Args:
+        batch (openai.types.Batch): A batch whose status is "completed".
+
+    Returns:
+        dict: {chapter_number: {"content": str} or {"error": str}} for every line in the output file.
+    """
+    results = {}
+    if not batch.output_file_id:
+        return results
+    output = client.files.content(batch.output_file_id).text
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        chapter_number = int(item["custom_id"].split("-", 1)[1])
+        response = item.get("response") or {}
+        if item.get("error") or response.get("status_code") != 200:
+            results[chapter_number] = {"error": str(item.get("error") or response.get("body"))}
+            continue
+        choice = response["body"]["choices"][0]
+        if choice.get("finish_reason") == "length":
+            results[chapter_number] = {"error": "Hit the completion cap before the chapter finished."}
+            continue
+        results[chapter_number] = {"content": choice["message"]["content"].strip()}
+    return results
@@ -1,178 +1,543 @@
-from openai import OpenAI
-from app import app
+import os
+import base64
+import logging
+import threading
+import time
+import hashlib
+import json
+import re
+from functools import lru_cache
+from contextlib import contextmanager
+import httpx
+import tiktoken
+from openai import OpenAI, DefaultHttpxClient, NOT_GIVEN
 from flask import current_app
+from config import OPENAI_API_KEY, OPENAI_MAX_RETRIES, LLM_INFLIGHT_LIMIT, OPENAI_RPM, OPENAI_TPM
+from helpers import redis_cache
 
-client = None
-with app.app_context():
-    api_key = current_app.config.get("OPENAI_API_KEY")
-    client = OpenAI(api_key=api_key)
+RESPONSE_CACHE_TTL = 7 * 24 * 3600
+INPROC_CACHE_SIZE = 512
+SLOT_WAIT_WARNING = 1.0
+_WHITESPACE_RE = re.compile(r"\s+")
+COMPLETION_TOKEN_ESTIMATE = 1000
+EMBEDDING_MODEL = "text-embedding-3-small"
+SEMANTIC_CACHE_ENTRIES = 8
+_encoding = tiktoken.encoding_for_model("gpt-4o-mini")
+
+# One process-wide client: its HTTP/2 keep-alive pool lets every helper reuse warm TLS connections.
+# The SDK retries rate limits, 408/409/5xx responses and connection errors with exponential backoff and jitter.
+client = OpenAI(
+    api_key=os.environ.get("OPENAI_API_KEY") or OPENAI_API_KEY,
+    max_retries=OPENAI_MAX_RETRIES,
+    http_client=DefaultHttpxClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=60)
+    )
+)
+
+_llm_slots = threading.BoundedSemaphore(LLM_INFLIGHT_LIMIT)
+llm_slot_stats = {"acquired": 0, "waited": 0, "wait_seconds": 0.0, "inflight": 0}
+
+@contextmanager
+def _slot():
+    """
+	Holds one of the process-wide LLM_INFLIGHT_LIMIT slots for the duration of an OpenAI call.
+    
+    Bounding in-flight requests keeps a burst of generations under the provider's rate limit instead of
+    fanning out into a storm of 429 retries. llm_slot_stats counts acquisitions, calls that had to wait
+    and the total wait time, and tracks the current number of in-flight calls; waits longer than
+    SLOT_WAIT_WARNING seconds are logged.
+    
+    Yields:
+        None
+    """
+    started = time.monotonic()
+    _llm_slots.acquire()
+    waited = time.monotonic() - started
+    llm_slot_stats["acquired"] += 1
+    llm_slot_stats["inflight"] += 1
+    if waited > 0.001:
+        llm_slot_stats["waited"] += 1
+        llm_slot_stats["wait_seconds"] += waited
+    if waited > SLOT_WAIT_WARNING:
+        logging.warning(f"Waited {waited:.2f}s for an OpenAI slot ({llm_slot_stats['inflight']} in flight).")
+    try:
+        yield
+    finally:
+        llm_slot_stats["inflight"] -= 1
+        _llm_slots.release()
+
+class _TokenBucket:
+    """
+	A thread-safe token bucket that refills at a fixed number of units per minute.
+    
+    The bucket starts full, so a burst of up to one minute's allowance goes straight through; after that,
+    acquire blocks until enough units have trickled back in. A rate of 0 disables the bucket.
+    
+    Args:
+        per_minute (int): The number of units (requests or tokens) allowed per minute.
+    """
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.refill_rate = per_minute / 60.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        """
+	Takes amount units from the bucket, sleeping until they are available.
+        
+        Requests larger than the whole bucket are clamped to its capacity so they cannot wait forever.
+        
+        Args:
+            amount (int, optional): The number of units to take. Defaults to 1.
+        
+        Returns:
+            float: The number of seconds spent waiting.
+        """
+        if self.capacity <= 0:
+            return 0.0
+        amount = min(float(amount), self.capacity)
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.refill_rate
+            time.sleep(delay)
+            waited += delay
+
+_rpm_bucket = _TokenBucket(OPENAI_RPM)
+_tpm_bucket = _TokenBucket(OPENAI_TPM)
+
+def _throttle(messages, completion_tokens=COMPLETION_TOKEN_ESTIMATE):
+    """
+	Waits until the request and token budgets allow another chat completion.
+    
+    Shaping calls against OPENAI_RPM and OPENAI_TPM up front avoids spending a round trip on a request
+    the API would reject with a 429. The token cost is estimated as the tiktoken count of the messages
+    plus the completion cap, which is also what the API counts against the token limit.
+    
+    Args:
+        messages (list): The chat messages about to be sent.
+        completion_tokens (int, optional): The expected completion length. Defaults to COMPLETION_TOKEN_ESTIMATE.
+    
+    Returns:
+        None
+    """
+    estimated = sum(len(_encoding.encode(message["content"])) for message in messages) + completion_tokens
+    waited = _rpm_bucket.acquire() + _tpm_bucket.acquire(estimated)
+    if waited > SLOT_WAIT_WARNING:
+        logging.warning(f"Rate limiter delayed an OpenAI call by {waited:.2f}s ({estimated} tokens estimated).")
+
+def _response_cache_key(model, messages):
+    """
+	Builds the Redis key for a chat completion from its model and messages.
+    
+    Message contents are normalized before hashing (whitespace runs collapsed, ends stripped), so
+    prompts that differ only in template indentation or blank lines share one cache entry.
+    
+    Args:
+        model (str): The model name.
+        messages (list): The chat messages sent to the model.
+    
+    Returns:
+        str: "llm:<sha256>" of the canonical JSON of the model and messages.
+    """
+    skeleton = [
+        {"role": message["role"], "content": _WHITESPACE_RE.sub(" ", message["content"]).strip()}
+        for message in messages
+    ]
+    payload = json.dumps({"m": model, "messages": skeleton}, sort_keys=True)
+    return "llm:" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _semantic_cache_key(model, kind, scope):
+    return f"llm:sem:{model}:{kind}:{scope}"
+
+def _semantic_lookup(model, kind, scope, prompt):
+    """
+	Looks for a stored response to a near-identical prompt within the same scope.
+    
+    The prompt is embedded with EMBEDDING_MODEL and compared against the last SEMANTIC_CACHE_ENTRIES
+    prompts stored for (model, kind, scope). OpenAI embeddings have unit length, so the dot product is the
+    cosine similarity; a match needs at least SEMANTIC_CACHE_THRESHOLD. The scope (a story, or a story and
+    chapter number) is matched exactly, so a response is never served to another story or chapter.
+    
+    Args:
+        model (str): The model the response was generated with.
+        kind (str): The key of the generation in SPECS.
+        scope (str): The exact-match part of the key, e.g. "<story_id>:<chapter_number>".
+        prompt (str): The user prompt.
+    
+    Returns:
+        tuple: (the cached response or None, the prompt's embedding for _semantic_store).
+    """
+    with _slot():
+        vector = client.embeddings.create(model=EMBEDDING_MODEL, input=prompt).data[0].embedding
+    threshold = current_app.config.get("SEMANTIC_CACHE_THRESHOLD", 0.95)
+    for raw in redis_cache.lrange(_semantic_cache_key(model, kind, scope), 0, -1):
+        entry = json.loads(raw)
+        if sum(a * b for a, b in zip(vector, entry["v"])) >= threshold:
+            return entry["r"], vector
+    return None, vector
+
+def _semantic_store(model, kind, scope, vector, response):
+    """
+	Stores a response under its prompt embedding, keeping the newest SEMANTIC_CACHE_ENTRIES per scope.
+    
+    Args:
+        model (str): The model the response was generated with.
+        kind (str): The key of the generation in SPECS.
+        scope (str): The exact-match part of the key.
+        vector (list): The prompt embedding returned by _semantic_lookup.
+        response (str): The generated text.
+    
+    Returns:
+        None
+    """
+    key = _semantic_cache_key(model, kind, scope)
+    pipe = redis_cache.pipeline()
+    pipe.lpush(key, json.dumps({"v": vector, "r": response}))
+    pipe.ltrim(key, 0, SEMANTIC_CACHE_ENTRIES - 1)
+    pipe.expire(key, RESPONSE_CACHE_TTL)
+    pipe.execute()
+
+def _use_semantic_cache(scope, deterministic):
+    # Only callers that explicitly accept a reused reply opt in; a user's regenerate must always reach the model.
+    return scope is not None and deterministic is True and current_app.config.get("LLM_SEMANTIC_CACHE", False)
+
+def _complete(model, messages, deterministic=None, max_tokens=None):
+    """
+	Runs a chat completion through the in-process memo when LLM_INPROC_CACHE is enabled.
+    
+    The memo is meant for development and test loops that replay the same seeded prompts: identical
+    (model, messages, deterministic) calls are answered from an LRU of INPROC_CACHE_SIZE entries without
+    touching Redis or the API. It is off by default, since regenerating should normally produce a new draft.
+    
+    Args:
+        model (str): The model name.
+        messages (list): The chat messages to send.
+        deterministic (bool, optional): Passed through to _complete_shared.
+        max_tokens (int, optional): Passed through to _complete_shared.
+    
+    Returns:
+        str: The model's reply with surrounding whitespace removed.
+    """
+    if current_app.config.get("LLM_INPROC_CACHE", False):
+        message_items = tuple((message["role"], message["content"]) for message in messages)
+        return _complete_memoized(model, message_items, deterministic, max_tokens)
+    return _complete_shared(model, messages, deterministic, max_tokens)
+
+@lru_cache(maxsize=INPROC_CACHE_SIZE)
+def _complete_memoized(model, message_items, deterministic, max_tokens):
+    messages = [{"role": role, "content": content} for role, content in message_items]
+    return _complete_shared(model, messages, deterministic, max_tokens)
+
+def clear_llm_cache():
+    """
+	Empties the in-process completion memo (e.g. between tests).
+    
+    Returns:
+        None
+    """
+    _complete_memoized.cache_clear()
+
+def _complete_shared(model, messages, deterministic=None, max_tokens=None):
+    """
+	Runs a chat completion and returns its stripped text, optionally through the response cache.
+    
+    Generation is creative, so identical prompts are normally sent to the API again. When deterministic
+    is True (or, if it is None, when OPENAI_RESPONSE_CACHE is enabled in the config, e.g. for development
+    loops) the response is looked up by a SHA-256 of the model and messages first and stored for
+    RESPONSE_CACHE_TTL seconds after a miss.
+    
+    Args:
+        model (str): The model name.
+        messages (list): The chat messages to send.
+        deterministic (bool, optional): Whether identical requests may share a response. Defaults to the config.
+        max_tokens (int, optional): The max_completion_tokens cap for the reply. Defaults to no cap.
+    
+    Returns:
+        str: The model's reply with surrounding whitespace removed.
+    
+    Raises:
+        Exception: If the reply was cut off by the max_completion_tokens cap.
+    """
+    if deterministic is None:
+        deterministic = current_app.config.get("OPENAI_RESPONSE_CACHE", False)
+    cache_key = _response_cache_key(model, messages) if deterministic else None
+    if cache_key:
+        cached = redis_cache.get(cache_key)
+        if cached is not None:
+            return cached
+    _throttle(messages, max_tokens or COMPLETION_TOKEN_ESTIMATE)
+    with _slot():
+        response = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            max_completion_tokens=max_tokens or NOT_GIVEN,
+            store=current_app.config.get("OPENAI_STORE", False)
+        )
+    choice = response.choices[0]
+    if choice.finish_reason == "length":
+        # On o1 models the cap also covers hidden reasoning tokens, so a capped reply can be partial or empty.
+        raise Exception(f"Hit the completion cap of {max_tokens} tokens before the reply finished.")
+    result_text = choice.message.content.strip()
+    if cache_key:
+        redis_cache.setex(cache_key, RESPONSE_CACHE_TTL, result_text)
+    return result_text
 
 def generate_image_from_prompt(prompt, size="1024x1024"):
     """
 	Generates an image from a given text prompt using the DALL-E 3 model.
     
+    The image is requested as base64 JSON and decoded in-process, so callers get the bytes from the
+    same response instead of downloading them again from OpenAI's CDN.
+    
     Args:
         prompt (str): The text prompt to generate the image from.
         size (str, optional): The desired size of the generated image. Defaults to "1024x1024".
     
     Returns:
-        str: The URL of the generated image.
+        bytes: The generated image as PNG data.
     
     Raises:
         Exception: If there is an error during the image generation process.
     """
     try:
-        response = client.images.generate(
-            model="dall-e-3",
-            prompt=prompt,
-            n=1,
-            size=size
-        )
+        with _slot():
+            response = client.images.generate(
+                model="dall-e-3",
+                prompt=prompt,
+                n=1,
+                size=size,
+                response_format="b64_json"
+            )
         
-        image_url = response.data[0].url
-        return image_url
+        return base64.b64decode(response.data[0].b64_json)
     except Exception as e:
-        raise Exception("Error generating image from prompt: " + str(e))
+        raise Exception("Error generating image from prompt: " + str(e)) from e
+
+
+SPECS = {
+    "meta": ("gpt-4o-mini", "system", "You are a creative writer skilled in creating rich settings and characters.", "characters and locations"),
+    "summaries": ("o1-mini", "assistant", "You are an accomplished novelist with a talent for weaving intricate narrative arcs.", "chapter summaries"),
+    "story_arcs": ("o1-mini", "assistant", "You are a creative storyteller who can generate cohesive and engaging story arcs based on novel, summaries, and character details.", "story arcs"),
+    "chapter_guide": ("o1-mini", "assistant", "You are a creative storyteller who can generate cohesive and engaging breakdowns per chapter based on novel, summaries, and character details.", "chapter guide"),
+    "chapter": ("o1-mini", "assistant", "You are an expert novelist skilled in creating immersive chapters in Markdown.", "chapter content"),
+}
 
+# Model overrides per quality tier; "final" keeps each spec's own model.
+MODEL_TIERS = {"draft": "gpt-4o-mini", "final": None}
 
-def generate_meta_from_prompt(shot_prompt):
+# Built once; shared read-only across calls, only the user message is created per request.
+_INSTRUCTION_MESSAGES = {
+    kind: {"role": role, "content": instruction}
+    for kind, (model, role, instruction, label) in SPECS.items()
+}
+
+def model_for(kind, tier=None):
     """
-	Generates character and location descriptions based on a given prompt.
+	Picks the model for a generation kind at a quality tier.
     
     Args:
-        shot_prompt (str): A prompt provided by the user to guide the generation of characters and locations.
+        kind (str): The key of the generation in SPECS.
+        tier (str, optional): "draft" or "final". Defaults to the DEFAULT_TIER config.
     
     Returns:
-        str: A string containing the generated descriptions of characters and locations.
+        str: The model name; the draft tier swaps the reasoning models for the faster, cheaper gpt-4o-mini.
+    """
+    tier = tier or current_app.config.get("DEFAULT_TIER", "final")
+    return MODEL_TIERS.get(tier) or SPECS[kind][0]
+
+def max_tokens_for(kind):
+    """
+	Looks up the completion cap for a generation kind.
+    
+    Without a cap a misbehaving model can keep decoding up to the context window, so every kind has a
+    max_completion_tokens limit in the OPENAI_MAX_COMPLETION_TOKENS config. For the o1 models the cap
+    also covers their hidden reasoning tokens, which is why those limits are well above the visible output.
+    
+    Args:
+        kind (str): The key of the generation in SPECS.
+    
+    Returns:
+        int or None: The cap, or None if the config has none for this kind.
+    """
+    return current_app.config.get("OPENAI_MAX_COMPLETION_TOKENS", {}).get(kind)
+
+def _chat(kind, shot_prompt, deterministic=None, tier=None, scope=None):
+    """
+	Runs the text generation described by SPECS[kind] for a prompt.
+    
+    Each spec is (model, role of the instruction message, instruction, label used in error messages). 
+    All text helpers go through here, so caching, retries and the in-flight cap apply to each of them.
+    
+    Args:
+        kind (str): The key of the generation in SPECS (e.g. "meta" or "chapter").
+        shot_prompt (str): The user prompt.
+        deterministic (bool, optional): Reuse a cached response for an identical prompt (see _complete). Defaults to the OPENAI_RESPONSE_CACHE config.
+        tier (str, optional): The quality tier passed to model_for. Defaults to the DEFAULT_TIER config.
+        scope (str, optional): Enables the semantic cache (see _semantic_lookup) for this story/chapter when LLM_SEMANTIC_CACHE is on
+            and deterministic is True.
+    
+    Returns:
+        str: The generated text.
     
     Raises:
-        Exception: If there is an error during the generation process, an exception is raised with a descriptive message.
+        Exception: If there is an error during the generation process, with a message naming what was being generated.
     """
+    label = SPECS[kind][3]
+    model = model_for(kind, tier)
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a creative writer skilled in creating rich settings and characters."},
-                {"role": "user", "content": shot_prompt}
-            ],
-            store=True
-        )
-        result_text = response.choices[0].message.content.strip()
+        semantic = _use_semantic_cache(scope, deterministic)
+        if semantic:
+            cached, vector = _semantic_lookup(model, kind, scope, shot_prompt)
+            if cached is not None:
+                return cached
+        result_text = _complete(model, [
+            _INSTRUCTION_MESSAGES[kind],
+            {"role": "user", "content": shot_prompt}
+        ], deterministic, max_tokens_for(kind))
+        if semantic:
+            _semantic_store(model, kind, scope, vector, result_text)
         return result_text
     except Exception as e:
-        raise Exception("Error generating characters and locations: " + str(e))
+        raise Exception(f"Error generating {label}: " + str(e)) from e
 
+def generate_meta_from_prompt(shot_prompt, deterministic=None, tier=None, scope=None):
+    """
+	Generates character and location descriptions based on a given prompt.
+    
+    Args:
+        shot_prompt (str): A prompt provided by the user to guide the generation of characters and locations.
+        deterministic (bool, optional): Reuse a cached response for an identical prompt (see _complete). Defaults to the OPENAI_RESPONSE_CACHE config.
+        tier (str, optional): The quality tier, "draft" or "final". Defaults to the DEFAULT_TIER config.
+        scope (str, optional): The story (and chapter) scope for the semantic cache, used only with deterministic=True. Defaults to no semantic caching.
+    
+    Returns:
+        str: A string containing the generated descriptions of characters and locations.
+    """
+    return _chat("meta", shot_prompt, deterministic, tier, scope)
 
-def generate_chapter_summaries_from_prompt(shot_prompt):
+def generate_chapter_summaries_from_prompt(shot_prompt, deterministic=None, tier=None, scope=None):
     """
 	Generates chapter summaries based on a provided prompt using a chat model.
     
     Args:
         shot_prompt (str): A prompt that outlines the key elements or themes for the chapter summaries.
+        deterministic (bool, optional): Reuse a cached response for an identical prompt (see _complete). Defaults to the OPENAI_RESPONSE_CACHE config.
+        tier (str, optional): The quality tier, "draft" or "final". Defaults to the DEFAULT_TIER config.
+        scope (str, optional): The story (and chapter) scope for the semantic cache, used only with deterministic=True. Defaults to no semantic caching.
     
     Returns:
         str: The generated chapter summaries based on the provided prompt.
-    
-    Raises:
-        Exception: If there is an error during the generation process, an exception is raised with a descriptive message.
     """
-    try:
-        response = client.chat.completions.create(
-            model="o1-mini",
-            messages=[
-                {"role": "assistant", "content": "You are an accomplished novelist with a talent for weaving intricate narrative arcs."},
-                {"role": "user", "content": shot_prompt}
-            ],
-            store=True
-        )
-        result_text = response.choices[0].message.content.strip()
-        return result_text
-    except Exception as e:
-        raise Exception("Error generating chapter summaries: " + str(e))
+    return _chat("summaries", shot_prompt, deterministic, tier, scope)
 
-def generate_story_arcs_from_prompt(shot_prompt):
+def generate_story_arcs_from_prompt(shot_prompt, deterministic=None, tier=None, scope=None):
     """
 	Generates story arcs based on a given prompt.
     
-    This function takes a user-provided prompt and utilizes a chat model to create cohesive and engaging story arcs. It sends the prompt to the model and retrieves the generated content.
-    
     Args:
         shot_prompt (str): A string containing the user's prompt for generating story arcs.
+        deterministic (bool, optional): Reuse a cached response for an identical prompt (see _complete). Defaults to the OPENAI_RESPONSE_CACHE config.
+        tier (str, optional): The quality tier, "draft" or "final". Defaults to the DEFAULT_TIER config.
+        scope (str, optional): The story (and chapter) scope for the semantic cache, used only with deterministic=True. Defaults to no semantic caching.
     
     Returns:
         str: A string containing the generated story arcs.
-    
-    Raises:
-        Exception: If there is an error during the generation process.
     """
-    try:
-        response = client.chat.completions.create(
-            model="o1-mini",
-            messages=[
-                {"role": "assistant", "content": "You are a creative storyteller who can generate cohesive and engaging story arcs based on novel, summaries, and character details."},
-                {"role": "user", "content": shot_prompt}
-            ],
-            store=True
-        )
-        arcs_text = response.choices[0].message.content.strip()
-        return arcs_text
-    except Exception as e:
-        raise Exception("Error generating story arcs: " + str(e))
+    return _chat("story_arcs", shot_prompt, deterministic, tier, scope)
 
-def generate_chapter_guide_from_prompt(shot_prompt):
+def generate_chapter_guide_from_prompt(shot_prompt, deterministic=None, tier=None, scope=None):
     """
 	Generates chapter guides based on a given prompt.
     
-    This function takes a user-provided prompt and utilizes a chat model to create chapter guides. It sends the prompt to the model and retrieves the generated content.
-    
     Args:
         shot_prompt (str): A string containing the user's prompt for generating chapter guides.
+        deterministic (bool, optional): Reuse a cached response for an identical prompt (see _complete). Defaults to the OPENAI_RESPONSE_CACHE config.
+        tier (str, optional): The quality tier, "draft" or "final". Defaults to the DEFAULT_TIER config.
+        scope (str, optional): The story (and chapter) scope for the semantic cache, used only with deterministic=True. Defaults to no semantic caching.
     
     Returns:
         str: A string containing the generated chapter guides.
-    
-    Raises:
-        Exception: If there is an error during the generation process.
     """
-    try:
-        response = client.chat.completions.create(
-            model="o1-mini",
-            messages=[
-                {"role": "assistant", "content": "You are a creative storyteller who can generate cohesive and engaging breakdowns per chapter based on novel, summaries, and character details."},
-                {"role": "user", "content": shot_prompt}
-            ],
-            store=True
-        )
-        arcs_text = response.choices[0].message.content.strip()
-        return arcs_text
-    except Exception as e:
-        raise Exception("Error generating story arcs: " + str(e))
-    
-def generate_chapter_content_from_prompt(shot_prompt):
+    return _chat("chapter_guide", shot_prompt, deterministic, tier, scope)
+
+def generate_chapter_content_from_prompt(shot_prompt, deterministic=None, tier=None, scope=None):
     """
 	Generates chapter content based on a provided prompt.
     
-    This function interacts with a chat completion model to create immersive chapter content in Markdown format. It sends a prompt to the model and retrieves the generated content.
-    
     Args:
         shot_prompt (str): A brief prompt that guides the content generation for the chapter.
+        deterministic (bool, optional): Reuse a cached response for an identical prompt (see _complete). Defaults to the OPENAI_RESPONSE_CACHE config.
+        tier (str, optional): The quality tier, "draft" or "final". Defaults to the DEFAULT_TIER config.
+        scope (str, optional): The story (and chapter) scope for the semantic cache, used only with deterministic=True. Defaults to no semantic caching.
     
     Returns:
         str: The generated chapter content in Markdown format.
+    """
+    return _chat("chapter", shot_prompt, deterministic, tier, scope)
+
+def stream_chapter_content_from_prompt(shot_prompt, tier=None, scope=None, deterministic=None):
+    """
+	Streams chapter content for a provided prompt as it is generated.
+    
+    This is the streaming counterpart of generate_chapter_content_from_prompt: the request is made with
+    stream=True and each text delta is yielded as soon as it arrives, so callers can forward the chapter
+    progressively instead of waiting for the whole completion.
+    
+    Args:
+        shot_prompt (str): A brief prompt that guides the content generation for the chapter.
+        tier (str, optional): The quality tier, "draft" or "final". Defaults to the DEFAULT_TIER config.
+        scope (str, optional): The story (and chapter) scope for the semantic cache, used only with deterministic=True. Defaults to no semantic caching.
+        deterministic (bool, optional): Allow a semantically cached chapter to be replayed. Defaults to None (always generate).
+    
+    Yields:
+        str: Successive pieces of the chapter content in Markdown format.
     
     Raises:
-        Exception: If there is an error during the content generation process.
+        Exception: If there is an error during the content generation process, or the chapter was cut off by
+            the max_completion_tokens cap.
     """
+    model = model_for("chapter", tier)
+    messages = [_INSTRUCTION_MESSAGES["chapter"], {"role": "user", "content": shot_prompt}]
+    max_tokens = max_tokens_for("chapter")
     try:
-        response = client.chat.completions.create(
-            model="o1-mini",
-            messages=[
-                {"role": "assistant", "content": "You are an expert novelist skilled in creating immersive chapters in Markdown."},
-                {"role": "user", "content": shot_prompt}
-            ],
-            store=True
-        )
-        chapter_content = response.choices[0].message.content.strip()
-        return chapter_content
+        semantic = _use_semantic_cache(scope, deterministic)
+        if semantic:
+            cached, vector = _semantic_lookup(model, "chapter", scope, shot_prompt)
+            if cached is not None:
+                yield cached
+                return
+        parts = []
+        finish_reason = None
+        _throttle(messages, max_tokens or COMPLETION_TOKEN_ESTIMATE)
+        with _slot():
+            stream = client.chat.completions.create(
+                model=model,
+                messages=messages,
+                max_completion_tokens=max_tokens or NOT_GIVEN,
+                store=current_app.config.get("OPENAI_STORE", False),
+                stream=True
+            )
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                finish_reason = chunk.choices[0].finish_reason or finish_reason
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        if finish_reason == "length":
+            raise Exception(f"Hit the completion cap of {max_tokens} tokens before the chapter finished.")
+        if semantic:
+            _semantic_store(model, "chapter", scope, vector, "".join(parts))
     except Exception as e:
-        raise Exception("Error generating content for chapter '{}': ".format(chapter_title) + str(e))
\ No newline at end of file
+        raise Exception("Error generating chapter content: " + str(e)) from e
\ No newline at end of file
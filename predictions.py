@@ -1,12 +1,225 @@
+import threading
+import hashlib
+from dataclasses import dataclass, field
+from functools import wraps
+from cachetools import TTLCache
+from flask import current_app
 from prompt_templates import (
     build_meta_prompt,
     build_chapter_summaries_prompt,
     build_chapter_content_prompt,
     build_story_arcs_prompt,
     build_chapter_guide_prompt,
-    count_tokens
+    count_tokens,
+    count_tokens_batch,
+    estimate_tokens
 )
-from models import TokenCostConfig, CreditConfig, Character, ChapterGuide, Location, StoryArc
+from models import db, Character, ChapterGuide, Location, StoryArc
+from config_cache import get_token_cost_config, get_credit_modifier, get_credit_modifiers
+from openai_handler import model_for
+
+PREDICTED_COST_CACHE_TTL = 30
+
+_predicted_cost_cache = TTLCache(maxsize=1024, ttl=PREDICTED_COST_CACHE_TTL)
+_predicted_cost_cache_lock = threading.Lock()
+
+def _story_fingerprint(story):
+    return (
+        story.id, story.title, story.details, story.inspirations, story.writing_style,
+        story.chapters_count, story.quality_tier, story.batch_mode, tuple(tag.id for tag in story.tags)
+    )
+
+def story_cost_fingerprint(story):
+    """
+	Returns a short digest of everything the prediction cache keys a story on.
+    
+    Args:
+        story (Story): The story.
+    
+    Returns:
+        str: A hex digest that changes whenever the story's cached predictions would be invalidated.
+    """
+    return hashlib.blake2b(repr(_story_fingerprint(story)).encode("utf-8"), digest_size=8).hexdigest()
+
+def _cached_prediction(func):
+    """
+	Memoizes a calculate_predicted_*_cost function for PREDICTED_COST_CACHE_TTL seconds.
+    
+    The key is the function, the story's own columns and tags, and the remaining arguments, so edits to
+    the story itself take effect immediately. Changes to related rows (characters, chapters, guides) are
+    picked up once the entry expires, which is enough for a preview. Generation requests pass fresh=True,
+    which skips the lookup (the result is still cached) so the prompt they send reflects the current rows.
+    The cached CostBreakdown is frozen, so it is returned as is.
+    
+    The memoized function's peek(story, *args, **kwargs) returns the cached result for those arguments,
+    or None, without computing anything.
+    
+    Args:
+        func (callable): A predicted-cost function taking the story as its first argument.
+    
+    Returns:
+        callable: The memoized function.
+    """
+    def cache_key(story, args, kwargs):
+        return (func.__name__, _story_fingerprint(story), args, tuple(sorted(kwargs.items())))
+
+    @wraps(func)
+    def wrapper(story, *args, fresh=False, **kwargs):
+        key = cache_key(story, args, kwargs)
+        costs = None if fresh else _predicted_cost_cache.get(key)
+        if costs is None:
+            costs = func(story, *args, **kwargs)
+            with _predicted_cost_cache_lock:
+                _predicted_cost_cache[key] = costs
+        return costs
+
+    def peek(story, *args, **kwargs):
+        return _predicted_cost_cache.get(cache_key(story, args, kwargs))
+
+    wrapper.peek = peek
+    return wrapper
+
+@dataclass(slots=True, frozen=True)
+class CostBreakdown:
+    """
+	The token counts and credit costs of one generation, predicted or actual.
+    
+    Internal callers read the attributes directly; to_dict() builds the JSON shape for API responses,
+    task results and logs.
+    
+    Attributes:
+        input_tokens (int): The number of input tokens.
+        output_tokens (int): The actual or predicted number of output tokens.
+        input_tokens_per_credit (float): The number of input tokens covered by one credit.
+        output_tokens_per_credit (float): The number of output tokens covered by one credit.
+        base_credit_cost_input (int): The base credit cost for the input tokens.
+        modified_credit_cost_input (int): The input cost after applying the credit modifier.
+        base_credit_cost_output (int): The base credit cost for the output tokens.
+        modified_credit_cost_output (int): The output cost after applying the credit modifier.
+        total_credit_cost (int): The modified input and output costs combined.
+        model (str): The model that produced the output for actual costs, or None for predictions.
+        prompt (str): The prompt a prediction was computed from, for the generation request to send as is.
+            None for actual costs. Left out of to_dict().
+    """
+    input_tokens: int
+    output_tokens: int
+    input_tokens_per_credit: float
+    output_tokens_per_credit: float
+    base_credit_cost_input: int
+    modified_credit_cost_input: int
+    base_credit_cost_output: int
+    modified_credit_cost_output: int
+    total_credit_cost: int
+    model: str = None
+    prompt: str = field(default=None, repr=False, compare=False)
+
+    def to_dict(self):
+        """
+	Returns the breakdown as a dict.
+        
+        Returns:
+            dict: Predicted costs have the keys predicted_output_tokens and total_predicted_credit_cost;
+                actual costs have output_tokens, model and total_actual_credit_cost. Both include input_tokens,
+                the tokens-per-credit rates and the base and modified costs for each side.
+        """
+        costs = {"input_tokens": self.input_tokens}
+        if self.model is None:
+            costs["predicted_output_tokens"] = self.output_tokens
+        else:
+            costs["output_tokens"] = self.output_tokens
+            costs["model"] = self.model
+        costs.update({
+            "input_tokens_per_credit": self.input_tokens_per_credit,
+            "output_tokens_per_credit": self.output_tokens_per_credit,
+            "base_credit_cost_input": self.base_credit_cost_input,
+            "modified_credit_cost_input": self.modified_credit_cost_input,
+            "base_credit_cost_output": self.base_credit_cost_output,
+            "modified_credit_cost_output": self.modified_credit_cost_output,
+            "total_predicted_credit_cost" if self.model is None else "total_actual_credit_cost": self.total_credit_cost
+        })
+        return costs
+
+def get_story_meta_bulk(story_id):
+    """
+	Fetches the (name, description) pairs of a story's characters and locations.
+    
+    Only the two columns are selected, so no ORM objects are built for what the cost prompts read.
+    
+    Args:
+        story_id (int): The ID of the story.
+    
+    Returns:
+        tuple: (characters, locations), each a list of (name, description) rows.
+    """
+    characters = db.session.query(Character.name, Character.description).filter(Character.story_id == story_id).all()
+    locations = db.session.query(Location.name, Location.description).filter(Location.story_id == story_id).all()
+    return characters, locations
+
+def _round_div(numerator, denominator):
+    """
+	Divides two integers and rounds half to even, exactly like round(numerator / denominator) without the float.
+    
+    Args:
+        numerator (int): The dividend.
+        denominator (int): The divisor.
+    
+    Returns:
+        int: The rounded quotient.
+    """
+    quotient, remainder = divmod(numerator, denominator)
+    if 2 * remainder > denominator or (2 * remainder == denominator and quotient % 2):
+        quotient += 1
+    return quotient
+
+def _pricing_for(model):
+    """
+	Picks the tokens-per-credit rates for the family a model belongs to.
+    
+    Args:
+        model (str): The model name, e.g. "o1-mini" or "gpt-4o-mini".
+    
+    Returns:
+        PricingTuple: The o1 rates for o1 models, otherwise the gpt4o rates.
+    """
+    config = get_token_cost_config()
+    return config.o1 if model.startswith("o1") else config.gpt4o
+
+def _compute_costs(input_tokens, output_tokens, pricing, action_pair, minimum=1, model=None, prompt=None):
+    """
+	Converts token counts into credit costs using the cached pricing and credit modifiers.
+    
+    Args:
+        input_tokens (int): The number of input tokens.
+        output_tokens (int): The actual or predicted number of output tokens.
+        pricing (PricingTuple): The model family's rates, from _pricing_for.
+        action_pair (tuple): The CreditConfig actions for the input and output modifiers, e.g. ("meta_input", "meta_output").
+        minimum (int, optional): The lowest base credit cost per side. Defaults to 1.
+        model (str, optional): The model that produced the output. When given the result describes an actual cost,
+            otherwise a predicted one.
+        prompt (str, optional): The prompt a prediction was computed from, kept on the breakdown.
+    
+    Returns:
+        CostBreakdown: The cost breakdown, with model set only for actual costs.
+    """
+    input_tokens_per_credit, output_tokens_per_credit, input_tpc_hundredths, output_tpc_hundredths = pricing
+
+    # Tokens-per-credit rates have two decimals, so scaling the token counts by 100 keeps the division in integers.
+    base_credit_cost_input = max(minimum, _round_div(input_tokens * 100, input_tpc_hundredths))
+    base_credit_cost_output = max(minimum, _round_div(output_tokens * 100, output_tpc_hundredths))
+
+    action_input, action_output = action_pair
+    modifiers = get_credit_modifiers(action_pair)
+    modified_credit_cost_input = round(base_credit_cost_input * modifiers[action_input])
+    modified_credit_cost_output = round(base_credit_cost_output * modifiers[action_output])
+
+    return CostBreakdown(
+        input_tokens, output_tokens,
+        input_tokens_per_credit, output_tokens_per_credit,
+        base_credit_cost_input, modified_credit_cost_input,
+        base_credit_cost_output, modified_credit_cost_output,
+        modified_credit_cost_input + modified_credit_cost_output,
+        model, prompt
+    )
 
 def calculate_image_cost():
     """
@@ -22,10 +235,9 @@ def calculate_image_cost():
             - modifier (float): The modifier applied to the base cost.
             - total_credit_cost (float): The total cost in credits for generating a single image after applying the modifier.
     """
-    tokenCostConfig = TokenCostConfig.query.first()
+    tokenCostConfig = get_token_cost_config()
     base_credit_cost = tokenCostConfig.dall_e_price_per_image  
-    config = CreditConfig.query.filter_by(action="image").first()
-    modifier = config.modifier if config else 2
+    modifier = get_credit_modifier("image")
 
     
     total_credit_cost = base_credit_cost * modifier
@@ -36,61 +248,46 @@ def calculate_image_cost():
         "total_credit_cost": total_credit_cost
     }
 
-def calculate_predicted_meta_cost(story, model='gpt-4o-mini'):
+@_cached_prediction
+def calculate_predicted_meta_cost(story, model=None, estimate=False, tier=None):
     """
 	Calculate the predicted meta cost for a given story based on input and output token counts.
     
     Args:
         story (Story): The story object containing details such as title, details, tags, inspirations, and chapter count.
-        model (str, optional): The model to be used for token counting. Defaults to 'gpt-4o-mini'.
+        model (str, optional): The model the generation will run on; it picks the tokenizer and the pricing. Defaults to model_for("meta") at the tier.
+        estimate (bool, optional): Use estimate_tokens instead of an exact count, for display-only previews. Defaults to False.
+        tier (str, optional): The quality tier used to pick the model. Defaults to story.quality_tier.
     
     Returns:
-        dict: A dictionary containing the following keys:
-            - input_tokens (int): The number of input tokens calculated from the full prompt.
-            - predicted_output_tokens (int): The predicted number of output tokens (default is 200).
-            - input_tokens_per_credit (float): The number of input tokens that can be processed per credit.
-            - output_tokens_per_credit (float): The number of output tokens that can be processed per credit.
-            - base_credit_cost_input (int): The base credit cost for input tokens.
-            - modified_credit_cost_input (int): The modified credit cost for input tokens after applying any modifiers.
-            - base_credit_cost_output (int): The base credit cost for output tokens.
-            - modified_credit_cost_output (int): The modified credit cost for output tokens after applying any modifiers.
-            - total_predicted_credit_cost (int): The total predicted credit cost combining both input and output costs.
-    """
-    tags = ", ".join([tag.name for tag in story.tags]) if story.tags else ""
+        CostBreakdown: The predicted token counts and credit costs, with the prompt they were computed from; to_dict() gives the API keys, including total_predicted_credit_cost.
+    """
+    model = model or model_for("meta", tier or story.quality_tier)
+    tags = story.tag_names_joined
     full_prompt = build_meta_prompt(story.title, story.details, tags, story.inspirations, story.chapters_count)
-    input_token_count = count_tokens(full_prompt, model)
-    
-    tokenCostConfig = TokenCostConfig.query.first()
-    cost_per_million_input = tokenCostConfig.cost_per_1m_input
-    cost_per_million_output = tokenCostConfig.cost_per_1m_output
-    credit_cost_dollar = tokenCostConfig.cost_per_credit
+    input_token_count = (estimate_tokens if estimate else count_tokens)(full_prompt, model)
+    return _compute_costs(input_token_count, 200, _pricing_for(model), ("meta_input", "meta_output"), prompt=full_prompt)
 
-    input_tokens_per_credit = round((credit_cost_dollar * 1_000_000) / cost_per_million_input, 2)
-    output_tokens_per_credit = round((credit_cost_dollar * 1_000_000) / cost_per_million_output, 2)
-    base_credit_cost_input = max(1, round(input_token_count / input_tokens_per_credit))
-    
-    predicted_output_tokens = 200
-    base_credit_cost_output = max(1, round(predicted_output_tokens / output_tokens_per_credit))
+def calculate_predicted_meta_cost_batch(stories, model='gpt-4o-mini'):
+    """
+	Calculate the predicted meta cost for several stories, tokenizing their prompts in one batch.
     
-    config_in = CreditConfig.query.filter_by(action="meta_input").first()
-    modifier_input = config_in.modifier if config_in else 2
-    config_out = CreditConfig.query.filter_by(action="meta_output").first()
-    modifier_output = config_out.modifier if config_out else 2
+    Args:
+        stories (list): The Story objects to estimate.
+        model (str, optional): The model to be used for token counting. Defaults to 'gpt-4o-mini'.
     
-    modified_credit_cost_input = round(base_credit_cost_input * modifier_input)
-    modified_credit_cost_output = round(base_credit_cost_output * modifier_output)
-    total_predicted_credit_cost = modified_credit_cost_input + modified_credit_cost_output
-
+    Returns:
+        dict: {story_id: CostBreakdown}, one per story as returned by calculate_predicted_meta_cost.
+    """
+    prompts = [
+        build_meta_prompt(story.title, story.details, story.tag_names_joined, story.inspirations, story.chapters_count)
+        for story in stories
+    ]
+    token_counts = count_tokens_batch(prompts, model)
+    pricing = _pricing_for(model)
     return {
-        "input_tokens": input_token_count,
-        "predicted_output_tokens": predicted_output_tokens,
-        "input_tokens_per_credit": input_tokens_per_credit,
-        "output_tokens_per_credit": output_tokens_per_credit,
-        "base_credit_cost_input": base_credit_cost_input,
-        "modified_credit_cost_input": modified_credit_cost_input,
-        "base_credit_cost_output": base_credit_cost_output,
-        "modified_credit_cost_output": modified_credit_cost_output,
-        "total_predicted_credit_cost": total_predicted_credit_cost
+        story.id: _compute_costs(input_token_count, 200, pricing, ("meta_input", "meta_output"))
+        for story, input_token_count in zip(stories, token_counts)
     }
 
 def calculate_actual_meta_cost(input_token_count, meta_text, model='gpt-4o-mini'):
@@ -100,119 +297,41 @@ def calculate_actual_meta_cost(input_token_count, meta_text, model='gpt-4o-mini'
     Args:
         input_token_count (int): The number of input tokens.
         meta_text (str): The text for which the meta cost is calculated.
-        model (str, optional): The model to be used for token counting. Defaults to 'gpt-4o-mini'.
+        model (str, optional): The model that produced the text; it picks the tokenizer and the pricing. Defaults to 'gpt-4o-mini'.
     
     Returns:
-        dict: A dictionary containing the following keys:
-            - input_tokens (int): The number of input tokens.
-            - output_tokens (int): The number of output tokens calculated from the meta text.
-            - model (str): The model used for the calculation.
-            - input_tokens_per_credit (float): The number of input tokens that can be covered by one credit.
-            - output_tokens_per_credit (float): The number of output tokens that can be covered by one credit.
-            - base_credit_cost_input (int): The base credit cost for the input tokens.
-            - modified_credit_cost_input (int): The modified credit cost for the input tokens after applying any modifiers.
-            - base_credit_cost_output (int): The base credit cost for the output tokens.
-            - modified_credit_cost_output (int): The modified credit cost for the output tokens after applying any modifiers.
-            - total_actual_credit_cost (int): The total actual credit cost combining both input and output costs.
+        CostBreakdown: The actual token counts and credit costs, with model set; to_dict() gives the API keys, including total_actual_credit_cost.
     """
     output_token_count = count_tokens(meta_text, model)
-    
-    tokenCostConfig = TokenCostConfig.query.first()
-    cost_per_million_input = tokenCostConfig.cost_per_1m_input
-    cost_per_million_output = tokenCostConfig.cost_per_1m_output
-    credit_cost_dollar = tokenCostConfig.cost_per_credit
-
-    input_tokens_per_credit = round((credit_cost_dollar * 1_000_000) / cost_per_million_input, 2)
-    output_tokens_per_credit = round((credit_cost_dollar * 1_000_000) / cost_per_million_output, 2)
-    
-    base_credit_cost_input = max(1, round(input_token_count / input_tokens_per_credit))
-    base_credit_cost_output = max(1, round(output_token_count / output_tokens_per_credit))
-    
-    config_in = CreditConfig.query.filter_by(action="meta_input").first()
-    modifier_input = config_in.modifier if config_in else 2
-    config_out = CreditConfig.query.filter_by(action="meta_output").first()
-    modifier_output = config_out.modifier if config_out else 2
-    
-    modified_credit_cost_input = round(base_credit_cost_input * modifier_input)
-    modified_credit_cost_output = round(base_credit_cost_output * modifier_output)
-    total_actual_credit_cost = modified_credit_cost_input + modified_credit_cost_output
+    return _compute_costs(input_token_count, output_token_count, _pricing_for(model), ("meta_input", "meta_output"), model=model)
 
-    return {
-        "input_tokens": input_token_count,
-        "output_tokens": output_token_count,
-        "model": model,
-        "input_tokens_per_credit": input_tokens_per_credit,
-        "output_tokens_per_credit": output_tokens_per_credit,
-        "base_credit_cost_input": base_credit_cost_input,
-        "modified_credit_cost_input": modified_credit_cost_input,
-        "base_credit_cost_output": base_credit_cost_output,
-        "modified_credit_cost_output": modified_credit_cost_output,
-        "total_actual_credit_cost": total_actual_credit_cost
-    }
-
-def calculate_predicted_summaries_cost(story, model='o1-mini'):
+@_cached_prediction
+def calculate_predicted_summaries_cost(story, model=None, estimate=False, tier=None):
     """
 	Calculate the predicted cost of generating summaries for a given story.
     
     Args:
         story (Story): The story object containing details such as title, details, tags, inspirations, and chapters count.
-        model (str, optional): The model to be used for token counting. Defaults to 'o1-mini'.
+        model (str, optional): The model the generation will run on; it picks the tokenizer and the pricing. Defaults to model_for("summaries") at the tier.
+        estimate (bool, optional): Use estimate_tokens instead of an exact count, for display-only previews. Defaults to False.
+        tier (str, optional): The quality tier used to pick the model. Defaults to story.quality_tier.
     
     Returns:
-        dict: A dictionary containing the following keys:
-            - input_tokens (int): The number of input tokens calculated from the full prompt.
-            - predicted_output_tokens (int): The predicted number of output tokens based on the chapters count.
-            - input_tokens_per_credit (float): The number of input tokens that can be processed per credit.
-            - output_tokens_per_credit (float): The number of output tokens that can be processed per credit.
-            - base_credit_cost_input (int): The base credit cost for input tokens.
-            - modified_credit_cost_input (int): The modified credit cost for input tokens after applying any modifiers.
-            - base_credit_cost_output (int): The base credit cost for output tokens.
-            - modified_credit_cost_output (int): The modified credit cost for output tokens after applying any modifiers.
-            - total_predicted_credit_cost (int): The total predicted credit cost for both input and output tokens.
-    """
-    tags = ", ".join([tag.name for tag in story.tags]) if story.tags else ""
+        CostBreakdown: The predicted token counts and credit costs, with the prompt they were computed from; to_dict() gives the API keys, including total_predicted_credit_cost.
+    """
+    model = model or model_for("summaries", tier or story.quality_tier)
+    tags = story.tag_names_joined
     inspirations = story.inspirations
-    meta_characters = [{"name": c.name, "description": c.description} for c in Character.query.filter_by(story_id=story.id).all()]
-    meta_locations = [{"name": l.name, "description": l.description} for l in Location.query.filter_by(story_id=story.id).all()]
+    characters, locations = get_story_meta_bulk(story.id)
+    meta_characters = [{"name": name, "description": description} for name, description in characters]
+    meta_locations = [{"name": name, "description": description} for name, description in locations]
     meta = {"characters": meta_characters, "locations": meta_locations}
-    arcs = [arc.arc_text for arc in story.arcs] if hasattr(story, 'arcs') else []
+    arcs = [arc.arc_text for arc in story.arcs]
 
     full_prompt = build_chapter_summaries_prompt(story.title, story.details, tags, meta, arcs, inspirations, story.chapters_count)
     
-    input_token_count = count_tokens(full_prompt, model)
-    predicted_output_tokens = story.chapters_count * 50
-
-    tokenCostConfig = TokenCostConfig.query.first()
-    cost_per_million_input = tokenCostConfig.o1_cost_per_1m_input
-    cost_per_million_output = tokenCostConfig.o1_cost_per_1m_output
-    credit_cost_dollar = tokenCostConfig.o1_cost_per_credit
-
-    input_tokens_per_credit = round((credit_cost_dollar * 1_000_000) / cost_per_million_input, 2)
-    output_tokens_per_credit = round((credit_cost_dollar * 1_000_000) / cost_per_million_output, 2)
-
-    base_credit_cost_input = round(input_token_count / input_tokens_per_credit)
-    base_credit_cost_output = round(predicted_output_tokens / output_tokens_per_credit)
-
-    config_in = CreditConfig.query.filter_by(action="summary_input").first()
-    modifier_input = config_in.modifier if config_in else 2
-    config_out = CreditConfig.query.filter_by(action="summary_output").first()
-    modifier_output = config_out.modifier if config_out else 2
-
-    modified_credit_cost_input = round(base_credit_cost_input * modifier_input)
-    modified_credit_cost_output = round(base_credit_cost_output * modifier_output)
-    total_predicted_credit_cost = modified_credit_cost_input + modified_credit_cost_output
-
-    return {
-        "input_tokens": input_token_count,
-        "predicted_output_tokens": predicted_output_tokens,
-        "input_tokens_per_credit": input_tokens_per_credit,
-        "output_tokens_per_credit": output_tokens_per_credit,
-        "base_credit_cost_input": base_credit_cost_input,
-        "modified_credit_cost_input": modified_credit_cost_input,
-        "base_credit_cost_output": base_credit_cost_output,
-        "modified_credit_cost_output": modified_credit_cost_output,
-        "total_predicted_credit_cost": total_predicted_credit_cost
-    }
+    input_token_count = (estimate_tokens if estimate else count_tokens)(full_prompt, model)
+    return _compute_costs(input_token_count, story.chapters_count * 50, _pricing_for(model), ("summary_input", "summary_output"), minimum=0, prompt=full_prompt)
 
 def calculate_actual_summaries_cost(input_token_count, summaries_text, model='o1-mini'):
     """
@@ -221,117 +340,37 @@ def calculate_actual_summaries_cost(input_token_count, summaries_text, model='o1
     Args:
         input_token_count (int): The number of input tokens.
         summaries_text (str): The text of the summaries for which the cost is calculated.
-        model (str, optional): The model used for token counting. Defaults to 'o1-mini'.
+        model (str, optional): The model that produced the text; it picks the tokenizer and the pricing. Defaults to 'o1-mini'.
     
     Returns:
-        dict: A dictionary containing the following keys:
-            - input_tokens (int): The number of input tokens.
-            - output_tokens (int): The number of output tokens calculated from summaries text.
-            - model (str): The model used for the calculation.
-            - input_tokens_per_credit (float): The number of input tokens per credit.
-            - output_tokens_per_credit (float): The number of output tokens per credit.
-            - base_credit_cost_input (int): The base credit cost for input tokens.
-            - modified_credit_cost_input (int): The modified credit cost for input tokens after applying any modifiers.
-            - base_credit_cost_output (int): The base credit cost for output tokens.
-            - modified_credit_cost_output (int): The modified credit cost for output tokens after applying any modifiers.
-            - total_actual_credit_cost (int): The total actual credit cost for both input and output tokens.
+        CostBreakdown: The actual token counts and credit costs, with model set; to_dict() gives the API keys, including total_actual_credit_cost.
     """
     output_token_count = count_tokens(summaries_text, model)
-    
-    tokenCostConfig = TokenCostConfig.query.first()
-    cost_per_million_input = tokenCostConfig.o1_cost_per_1m_input
-    cost_per_million_output = tokenCostConfig.o1_cost_per_1m_output
-    credit_cost_dollar = tokenCostConfig.o1_cost_per_credit
+    return _compute_costs(input_token_count, output_token_count, _pricing_for(model), ("summary_input", "summary_output"), minimum=0, model=model)
 
-    input_tokens_per_credit = round((credit_cost_dollar * 1_000_000) / cost_per_million_input, 2)
-    output_tokens_per_credit = round((credit_cost_dollar * 1_000_000) / cost_per_million_output, 2)
-    
-    base_credit_cost_input = round(input_token_count / input_tokens_per_credit)
-    base_credit_cost_output = round(output_token_count / output_tokens_per_credit)
-    
-    config_in = CreditConfig.query.filter_by(action="summary_input").first()
-    modifier_input = config_in.modifier if config_in else 2
-    config_out = CreditConfig.query.filter_by(action="summary_output").first()
-    modifier_output = config_out.modifier if config_out else 2
-    
-    modified_credit_cost_input = round(base_credit_cost_input * modifier_input)
-    modified_credit_cost_output = round(base_credit_cost_output * modifier_output)
-    total_actual_credit_cost = modified_credit_cost_input + modified_credit_cost_output
-
-    return {
-        "input_tokens": input_token_count,
-        "output_tokens": output_token_count,
-        "model": model,
-        "input_tokens_per_credit": input_tokens_per_credit,
-        "output_tokens_per_credit": output_tokens_per_credit,
-        "base_credit_cost_input": base_credit_cost_input,
-        "modified_credit_cost_input": modified_credit_cost_input,
-        "base_credit_cost_output": base_credit_cost_output,
-        "modified_credit_cost_output": modified_credit_cost_output,
-        "total_actual_credit_cost": total_actual_credit_cost
-    }
-
-def calculate_predicted_story_arcs_cost(story, model='o1-mini'):
+@_cached_prediction
+def calculate_predicted_story_arcs_cost(story, model=None, estimate=False, tier=None):
     """
 	Calculate the predicted cost of story arcs based on the provided story and model.
     
     Args:
         story (Story): The story object containing details such as title, chapters, characters, and locations.
-        model (str, optional): The model to be used for token counting. Defaults to 'o1-mini'.
+        model (str, optional): The model the generation will run on; it picks the tokenizer and the pricing. Defaults to model_for("story_arcs") at the tier.
+        estimate (bool, optional): Use estimate_tokens instead of an exact count, for display-only previews. Defaults to False.
+        tier (str, optional): The quality tier used to pick the model. Defaults to story.quality_tier.
     
     Returns:
-        dict: A dictionary containing the following keys:
-            - input_tokens (int): The number of input tokens calculated from the story prompt.
-            - predicted_output_tokens (int): The predicted number of output tokens (fixed at 250).
-            - input_tokens_per_credit (float): The number of input tokens that can be processed per credit.
-            - output_tokens_per_credit (float): The number of output tokens that can be processed per credit.
-            - base_credit_cost_input (int): The base credit cost for input tokens.
-            - modified_credit_cost_input (int): The modified credit cost for input tokens after applying any modifiers.
-            - base_credit_cost_output (int): The base credit cost for output tokens.
-            - modified_credit_cost_output (int): The modified credit cost for output tokens after applying any modifiers.
-            - total_predicted_credit_cost (int): The total predicted credit cost for processing the story arcs.
+        CostBreakdown: The predicted token counts and credit costs, with the prompt they were computed from; to_dict() gives the API keys, including total_predicted_credit_cost.
     """
+    model = model or model_for("story_arcs", tier or story.quality_tier)
     num_chapters = story.chapters_count
-    characters = Character.query.filter_by(story_id=story.id).all()
-    locations = Location.query.filter_by(story_id=story.id).all()
+    characters, locations = get_story_meta_bulk(story.id)
     full_prompt = build_story_arcs_prompt(story.title, story.details, num_chapters,
-                                          ", ".join([tag.name for tag in story.tags]) if story.tags else "",
-                                          {"characters": [{"name": c.name, "description": c.description} for c in characters],
-                                           "locations": [{"name": l.name, "description": l.description} for l in locations]})
-    input_token_count = count_tokens(full_prompt, model)
-
-    tokenCostConfig = TokenCostConfig.query.first()
-    cost_per_million_input = tokenCostConfig.o1_cost_per_1m_input
-    cost_per_million_output = tokenCostConfig.o1_cost_per_1m_output
-    credit_cost_dollar = tokenCostConfig.o1_cost_per_credit
-
-    input_tokens_per_credit = round((credit_cost_dollar * 1_000_000) / cost_per_million_input, 2)
-    output_tokens_per_credit = round((credit_cost_dollar * 1_000_000) / cost_per_million_output, 2)
-
-    base_credit_cost_input = max(1, round(input_token_count / input_tokens_per_credit))
-    predicted_output_tokens = 250
-    base_credit_cost_output = max(1, round(predicted_output_tokens / output_tokens_per_credit))
-
-    config_in = CreditConfig.query.filter_by(action="arcs_input").first()
-    modifier_input = config_in.modifier if config_in else 2
-    config_out = CreditConfig.query.filter_by(action="arcs_output").first()
-    modifier_output = config_out.modifier if config_out else 2
-
-    modified_credit_cost_input = round(base_credit_cost_input * modifier_input)
-    modified_credit_cost_output = round(base_credit_cost_output * modifier_output)
-    total_predicted_credit_cost = modified_credit_cost_input + modified_credit_cost_output
-
-    return {
-        "input_tokens": input_token_count,
-        "predicted_output_tokens": predicted_output_tokens,
-        "input_tokens_per_credit": input_tokens_per_credit,
-        "output_tokens_per_credit": output_tokens_per_credit,
-        "base_credit_cost_input": base_credit_cost_input,
-        "modified_credit_cost_input": modified_credit_cost_input,
-        "base_credit_cost_output": base_credit_cost_output,
-        "modified_credit_cost_output": modified_credit_cost_output,
-        "total_predicted_credit_cost": total_predicted_credit_cost
-    }
+                                          story.tag_names_joined,
+                                          {"characters": [{"name": name, "description": description} for name, description in characters],
+                                           "locations": [{"name": name, "description": description} for name, description in locations]})
+    input_token_count = (estimate_tokens if estimate else count_tokens)(full_prompt, model)
+    return _compute_costs(input_token_count, 250, _pricing_for(model), ("arcs_input", "arcs_output"), prompt=full_prompt)
 
 def calculate_actual_story_arcs_cost(input_token_count, arcs_text, model='o1-mini'):
     """
@@ -340,86 +379,39 @@ def calculate_actual_story_arcs_cost(input_token_count, arcs_text, model='o1-min
     Args:
         input_token_count (int): The number of input tokens.
         arcs_text (str): The text of the story arcs for which the cost is being calculated.
-        model (str, optional): The model to be used for token counting. Defaults to 'o1-mini'.
+        model (str, optional): The model that produced the text; it picks the tokenizer and the pricing. Defaults to 'o1-mini'.
     
     Returns:
-        dict: A dictionary containing the following keys:
-            - input_tokens (int): The number of input tokens.
-            - output_tokens (int): The number of output tokens calculated from arcs_text.
-            - model (str): The model used for the calculation.
-            - input_tokens_per_credit (float): The number of input tokens that can be purchased per credit.
-            - output_tokens_per_credit (float): The number of output tokens that can be purchased per credit.
-            - base_credit_cost_input (int): The base credit cost for input tokens.
-            - modified_credit_cost_input (int): The modified credit cost for input tokens after applying any modifiers.
-            - base_credit_cost_output (int): The base credit cost for output tokens.
-            - modified_credit_cost_output (int): The modified credit cost for output tokens after applying any modifiers.
-            - total_actual_credit_cost (int): The total actual credit cost for both input and output tokens.
+        CostBreakdown: The actual token counts and credit costs, with model set; to_dict() gives the API keys, including total_actual_credit_cost.
     """
     output_token_count = count_tokens(arcs_text, model)
+    return _compute_costs(input_token_count, output_token_count, _pricing_for(model), ("arcs_input", "arcs_output"), model=model)
 
-    tokenCostConfig = TokenCostConfig.query.first()
-    cost_per_million_input = tokenCostConfig.o1_cost_per_1m_input
-    cost_per_million_output = tokenCostConfig.o1_cost_per_1m_output
-    credit_cost_dollar = tokenCostConfig.o1_cost_per_credit
-
-    input_tokens_per_credit = round((credit_cost_dollar * 1_000_000) / cost_per_million_input, 2)
-    output_tokens_per_credit = round((credit_cost_dollar * 1_000_000) / cost_per_million_output, 2)
-
-    base_credit_cost_input = max(1, round(input_token_count / input_tokens_per_credit))
-    base_credit_cost_output = max(1, round(output_token_count / output_tokens_per_credit))
-
-    config_in = CreditConfig.query.filter_by(action="arcs_input").first()
-    modifier_input = config_in.modifier if config_in else 2
-    config_out = CreditConfig.query.filter_by(action="arcs_output").first()
-    modifier_output = config_out.modifier if config_out else 2
-
-    modified_credit_cost_input = round(base_credit_cost_input * modifier_input)
-    modified_credit_cost_output = round(base_credit_cost_output * modifier_output)
-    total_actual_credit_cost = modified_credit_cost_input + modified_credit_cost_output
-
-    return {
-        "input_tokens": input_token_count,
-        "output_tokens": output_token_count,
-        "model": model,
-        "input_tokens_per_credit": input_tokens_per_credit,
-        "output_tokens_per_credit": output_tokens_per_credit,
-        "base_credit_cost_input": base_credit_cost_input,
-        "modified_credit_cost_input": modified_credit_cost_input,
-        "base_credit_cost_output": base_credit_cost_output,
-        "modified_credit_cost_output": modified_credit_cost_output,
-        "total_actual_credit_cost": total_actual_credit_cost
-    }
-
-def calculate_predicted_chapter_guide_cost(story, model='o1-mini'):
+@_cached_prediction
+def calculate_predicted_chapter_guide_cost(story, model=None, estimate=False, tier=None):
     """
 	Calculate the predicted cost of Chapter Guides for a given story.
     
     Args:
         story (Story): The story object containing details such as title, tags, chapters, and arcs.
-        model (str, optional): The model to be used for token counting. Defaults to 'o1-mini'.
+        model (str, optional): The model the generation will run on; it picks the tokenizer and the pricing. Defaults to model_for("chapter_guide") at the tier.
+        estimate (bool, optional): Use estimate_tokens instead of an exact count, for display-only previews. Defaults to False.
+        tier (str, optional): The quality tier used to pick the model. Defaults to story.quality_tier.
     
     Returns:
-        dict: A dictionary containing the following keys:
-            - input_tokens (int): The number of input tokens calculated from the prompt.
-            - predicted_output_tokens (int): The predicted number of output tokens.
-            - input_tokens_per_credit (float): The number of input tokens that can be processed per credit.
-            - output_tokens_per_credit (float): The number of output tokens that can be generated per credit.
-            - base_credit_cost_input (int): The base credit cost for input tokens.
-            - modified_credit_cost_input (int): The modified credit cost for input tokens after applying any modifiers.
-            - base_credit_cost_output (int): The base credit cost for output tokens.
-            - modified_credit_cost_output (int): The modified credit cost for output tokens after applying any modifiers.
-            - total_predicted_credit_cost (int): The total predicted credit cost combining both input and output costs.
-    """
-    tags = ", ".join([tag.name for tag in story.tags]) if story.tags else ""
+        CostBreakdown: The predicted token counts and credit costs, with the prompt they were computed from; to_dict() gives the API keys, including total_predicted_credit_cost.
+    """
+    model = model or model_for("chapter_guide", tier or story.quality_tier)
+    tags = story.tag_names_joined
+    characters, locations = get_story_meta_bulk(story.id)
     meta = {
-        "characters": [{"name": c.name, "description": c.description or ""} 
-                       for c in Character.query.filter_by(story_id=story.id).all()],
-        "locations": [{"name": l.name, "description": l.description or ""} 
-                      for l in Location.query.filter_by(story_id=story.id).all()]
+        "characters": [{"name": name, "description": description or ""} for name, description in characters],
+        "locations": [{"name": name, "description": description or ""} for name, description in locations]
     }
-    chapters = sorted(story.chapters, key=lambda c: c.chapter_number)
-    chapter_titles = [ch.title for ch in chapters]
-    summaries = [ch.summary or "" for ch in chapters]
+    chapter_titles, summaries = [], []
+    for ch in story.chapters:
+        chapter_titles.append(ch.title)
+        summaries.append(ch.summary or "")
     overall_arcs = [arc.arc_text for arc in story.arcs] if story.arcs else []
     
     prompt = build_chapter_guide_prompt(
@@ -431,40 +423,8 @@ def calculate_predicted_chapter_guide_cost(story, model='o1-mini'):
         summaries,
         overall_arcs
     )
-    input_token_count = count_tokens(prompt, model)
-    
-    tokenCostConfig = TokenCostConfig.query.first()
-    cost_per_million_input = tokenCostConfig.o1_cost_per_1m_input
-    cost_per_million_output = tokenCostConfig.o1_cost_per_1m_output
-    credit_cost_dollar = tokenCostConfig.o1_cost_per_credit
-
-    input_tokens_per_credit = round((credit_cost_dollar * 1_000_000) / cost_per_million_input, 2)
-    output_tokens_per_credit = round((credit_cost_dollar * 1_000_000) / cost_per_million_output, 2)
-    
-    base_credit_cost_input = max(1, round(input_token_count / input_tokens_per_credit))
-    predicted_output_tokens = 250
-    base_credit_cost_output = max(1, round(predicted_output_tokens / output_tokens_per_credit))
-    
-    config_in = CreditConfig.query.filter_by(action="chapter_guide_input").first()
-    modifier_input = config_in.modifier if config_in else 2
-    config_out = CreditConfig.query.filter_by(action="chapter_guide_output").first()
-    modifier_output = config_out.modifier if config_out else 2
-    
-    modified_credit_cost_input = round(base_credit_cost_input * modifier_input)
-    modified_credit_cost_output = round(base_credit_cost_output * modifier_output)
-    total_predicted_credit_cost = modified_credit_cost_input + modified_credit_cost_output
-    
-    return {
-        "input_tokens": input_token_count,
-        "predicted_output_tokens": predicted_output_tokens,
-        "input_tokens_per_credit": input_tokens_per_credit,
-        "output_tokens_per_credit": output_tokens_per_credit,
-        "base_credit_cost_input": base_credit_cost_input,
-        "modified_credit_cost_input": modified_credit_cost_input,
-        "base_credit_cost_output": base_credit_cost_output,
-        "modified_credit_cost_output": modified_credit_cost_output,
-        "total_predicted_credit_cost": total_predicted_credit_cost
-    }
+    input_token_count = (estimate_tokens if estimate else count_tokens)(prompt, model)
+    return _compute_costs(input_token_count, 250, _pricing_for(model), ("chapter_guide_input", "chapter_guide_output"), prompt=prompt)
 
 def calculate_actual_chapter_guide_cost(input_token_count, chapter_guide_text, model='o1-mini'):
     """
@@ -473,236 +433,182 @@ def calculate_actual_chapter_guide_cost(input_token_count, chapter_guide_text, m
     Args:
         input_token_count (int): The number of input tokens.
         chapter_guide_text (str): The text containing Chapter Guides for which the cost is to be calculated.
-        model (str, optional): The model to be used for token counting. Defaults to 'o1-mini'.
+        model (str, optional): The model that produced the text; it picks the tokenizer and the pricing. Defaults to 'o1-mini'.
     
     Returns:
-        dict: A dictionary containing the following keys:
-            - input_tokens (int): The number of input tokens.
-            - output_tokens (int): The number of output tokens calculated from the Chapter Guides text.
-            - model (str): The model used for the calculation.
-            - input_tokens_per_credit (float): The number of input tokens that can be purchased per credit.
-            - output_tokens_per_credit (float): The number of output tokens that can be purchased per credit.
-            - base_credit_cost_input (int): The base credit cost for input tokens.
-            - modified_credit_cost_input (int): The modified credit cost for input tokens after applying any modifiers.
-            - base_credit_cost_output (int): The base credit cost for output tokens.
-            - modified_credit_cost_output (int): The modified credit cost for output tokens after applying any modifiers.
-            - total_actual_credit_cost (int): The total actual credit cost combining both input and output costs.
+        CostBreakdown: The actual token counts and credit costs, with model set; to_dict() gives the API keys, including total_actual_credit_cost.
     """
     output_token_count = count_tokens(chapter_guide_text, model)
-    
-    tokenCostConfig = TokenCostConfig.query.first()
-    cost_per_million_input = tokenCostConfig.o1_cost_per_1m_input
-    cost_per_million_output = tokenCostConfig.o1_cost_per_1m_output
-    credit_cost_dollar = tokenCostConfig.o1_cost_per_credit
+    return _compute_costs(input_token_count, output_token_count, _pricing_for(model), ("chapter_guide_input", "chapter_guide_output"), model=model)
 
-    input_tokens_per_credit = round((credit_cost_dollar * 1_000_000) / cost_per_million_input, 2)
-    output_tokens_per_credit = round((credit_cost_dollar * 1_000_000) / cost_per_million_output, 2)
+@dataclass(slots=True)
+class ChapterCostContext:
+    """
+	The rows a chapter prompt draws on, loaded once so every chapter of a story can share them.
     
-    base_credit_cost_input = max(1, round(input_token_count / input_tokens_per_credit))
-    base_credit_cost_output = max(1, round(output_token_count / output_tokens_per_credit))
+    Attributes:
+        chapters (list): The story's chapters, ordered by chapter_number.
+        guides_by_title (dict): {chapter_title: [ChapterGuide, ...]}, each list ordered by part_index.
+        characters_by_name (dict): {name: {"description": str, "example_dialogue": str}}.
+        locations_by_name (dict): {name: description}.
+    """
+    chapters: list
+    guides_by_title: dict
+    characters_by_name: dict
+    locations_by_name: dict
+
+def build_chapter_cost_context(story, chapter_titles=None):
+    """
+	Loads the chapter guides, characters and locations needed to price a story's chapters.
     
-    config_in = CreditConfig.query.filter_by(action="chapter_guide_input").first()
-    modifier_input = config_in.modifier if config_in else 2
-    config_out = CreditConfig.query.filter_by(action="chapter_guide_output").first()
-    modifier_output = config_out.modifier if config_out else 2
+    Without chapter_titles every guide, character and location of the story is fetched, one query each.
+    With chapter_titles only those chapters' guides are fetched, and only the characters and locations
+    they mention.
     
-    modified_credit_cost_input = round(base_credit_cost_input * modifier_input)
-    modified_credit_cost_output = round(base_credit_cost_output * modifier_output)
-    total_actual_credit_cost = modified_credit_cost_input + modified_credit_cost_output
+    Args:
+        story (Story): The story whose chapters are priced.
+        chapter_titles (list, optional): Restrict the context to these chapter titles. Defaults to None.
     
-    return {
-        "input_tokens": input_token_count,
-        "output_tokens": output_token_count,
-        "model": model,
-        "input_tokens_per_credit": input_tokens_per_credit,
-        "output_tokens_per_credit": output_tokens_per_credit,
-        "base_credit_cost_input": base_credit_cost_input,
-        "modified_credit_cost_input": modified_credit_cost_input,
-        "base_credit_cost_output": base_credit_cost_output,
-        "modified_credit_cost_output": modified_credit_cost_output,
-        "total_actual_credit_cost": total_actual_credit_cost
-    }
+    Returns:
+        ChapterCostContext: The prefetched rows.
+    """
+    guide_query = ChapterGuide.query.filter_by(story_id=story.id)
+    if chapter_titles is not None:
+        guide_query = guide_query.filter(ChapterGuide.chapter_title.in_(chapter_titles))
+    guides = guide_query.order_by(ChapterGuide.part_index).all()
+    guides_by_title = {}
+    for guide in guides:
+        guides_by_title.setdefault(guide.chapter_title, []).append(guide)
+
+    character_query = db.session.query(Character.name, Character.description, Character.example_dialogue).filter(
+        Character.story_id == story.id
+    )
+    location_query = db.session.query(Location.name, Location.description).filter(Location.story_id == story.id)
+    if chapter_titles is not None:
+        character_names = {name for guide in guides for name in guide.characters or ()}
+        location_names = {name for guide in guides for name in guide.locations or ()}
+        character_query = character_query.filter(Character.name.in_(list(character_names)))
+        location_query = location_query.filter(Location.name.in_(list(location_names)))
+
+    return ChapterCostContext(
+        chapters=story.chapters,
+        guides_by_title=guides_by_title,
+        characters_by_name={
+            name: {"description": description, "example_dialogue": example_dialogue}
+            for name, description, example_dialogue in character_query.all()
+        },
+        locations_by_name={name: description for name, description in location_query.all()}
+    )
+
+def _chapter_actions(batch):
+    return ("chapter_batch_input", "chapter_batch_output") if batch else ("chapter_input", "chapter_output")
 
-def calculate_predicted_chapter_cost(story, chapter_index, model='o1-mini'):
+def _compute_chapter_cost(story, chapter_index, ctx, model='o1-mini', estimate=False, batch=False):
     """
-	Calculate the predicted cost of generating a chapter based on the provided story and chapter index.
+	Builds one chapter's prompt from a ChapterCostContext and prices it.
     
     Args:
-        story (Story): The story object containing details about the chapters, title, inspirations, writing style, and tags.
-        chapter_index (int): The index of the chapter for which the cost is to be calculated.
+        story (Story): The story the chapter belongs to.
+        chapter_index (int): The zero-based index of the chapter.
+        ctx (ChapterCostContext): The prefetched rows, from build_chapter_cost_context.
         model (str, optional): The model to be used for token counting. Defaults to 'o1-mini'.
+        estimate (bool, optional): Use estimate_tokens instead of an exact count. Defaults to False.
+        batch (bool, optional): Price it with the chapter_batch_* modifiers of the Batch API. Defaults to False.
     
     Returns:
-        dict: A dictionary containing the following keys:
-            - input_tokens (int): The number of input tokens required.
-            - predicted_output_tokens (int): The predicted number of output tokens.
-            - input_tokens_per_credit (float): The number of input tokens that can be generated per credit.
-            - output_tokens_per_credit (float): The number of output tokens that can be generated per credit.
-            - base_credit_cost_input (int): The base credit cost for input tokens.
-            - modified_credit_cost_input (int): The modified credit cost for input tokens after applying any modifiers.
-            - base_credit_cost_output (int): The base credit cost for output tokens.
-            - modified_credit_cost_output (int): The modified credit cost for output tokens after applying any modifiers.
-            - total_predicted_credit_cost (int): The total predicted credit cost for generating the chapter.
-    """
-    chapters = sorted(story.chapters, key=lambda c: c.chapter_number) if story.chapters else []
-    if chapter_index < len(chapters):
-        chapter_obj = chapters[chapter_index]
-    else:
-        chapter_obj = None
+        CostBreakdown: The predicted costs and the prompt, as returned by calculate_predicted_chapter_cost.
+    """
+    chapters = ctx.chapters
+    chapter_obj = chapters[chapter_index] if chapter_index < len(chapters) else None
     chapter_title = chapter_obj.title if chapter_obj else ""
     chapter_summary = chapter_obj.summary if (chapter_obj and chapter_obj.summary) else ""
-    
-    details = story.details or ""
-    book_title = story.title
-    inspirations = story.inspirations or ""
-    writing_style = story.writing_style or ""
-    tags = ", ".join([tag.name for tag in story.tags]) if story.tags else ""
-    
     previous_summary = chapters[chapter_index - 1].summary if chapter_index - 1 >= 0 else ""
     next_summary = chapters[chapter_index + 1].summary if chapter_index + 1 < len(chapters) else ""
-    
-    chapter_mappings = ChapterGuide.query.filter_by(
-        story_id=story.id, chapter_title=chapter_title
-    ).order_by(ChapterGuide.part_index).all()
+
     detailed_arc_parts = [{
          "arc": mapping.part_index,
          "arc_text": mapping.part_text,
          "characters": mapping.characters,
          "locations": mapping.locations
-    } for mapping in chapter_mappings]
-    
+    } for mapping in ctx.guides_by_title.get(chapter_title, ())]
+
     unique_characters = set()
     unique_locations = set()
     for part in detailed_arc_parts:
-        for char in part.get("characters", []):
-            unique_characters.add(char)
-        for loc in part.get("locations", []):
-            unique_locations.add(loc)
-
-    character_objs = Character.query.filter(
-        Character.story_id == story.id,
-        Character.name.in_(list(unique_characters))
-    ).all()
-
-    location_objs = Location.query.filter(
-        Location.story_id == story.id,
-        Location.name.in_(list(unique_locations))
-    ).all()
-
+        unique_characters.update(part.get("characters") or ())
+        unique_locations.update(part.get("locations") or ())
     character_details = {
-        character.name: {
-            "description": character.description,
-            "example_dialogue": character.example_dialogue
-        }
-        for character in character_objs
+        name: details for name, details in ctx.characters_by_name.items() if name in unique_characters
+    }
+    location_details = {
+        name: description for name, description in ctx.locations_by_name.items() if name in unique_locations
     }
-    location_details = {location.name: location.description for location in location_objs}
 
     full_prompt = build_chapter_content_prompt(
-        chapter_title, chapter_summary, book_title, details, tags,
+        chapter_title, chapter_summary, story.title, story.details or "", story.tag_names_joined,
         detailed_arc_parts,
         previous_summary, next_summary,
-        inspirations, writing_style,
+        story.inspirations or "", story.writing_style or "",
         character_details, location_details
     )
-    input_token_count = count_tokens(full_prompt, model)
-    predicted_output_tokens = 300
+    input_token_count = (estimate_tokens if estimate else count_tokens)(full_prompt, model)
+    return _compute_costs(input_token_count, 300, _pricing_for(model), _chapter_actions(batch), minimum=0, prompt=full_prompt)
 
-    tokenCostConfig = TokenCostConfig.query.first()
-    cost_per_million_input = tokenCostConfig.o1_cost_per_1m_input
-    cost_per_million_output = tokenCostConfig.o1_cost_per_1m_output
-    credit_cost_dollar = tokenCostConfig.o1_cost_per_credit
-
-    input_tokens_per_credit = round((credit_cost_dollar * 1_000_000) / cost_per_million_input, 2)
-    output_tokens_per_credit = round((credit_cost_dollar * 1_000_000) / cost_per_million_output, 2)
-    base_credit_cost_input = round(input_token_count / input_tokens_per_credit)
-    base_credit_cost_output = round(predicted_output_tokens / output_tokens_per_credit)
-
-    config_in = CreditConfig.query.filter_by(action="chapter_input").first()
-    modifier_input = config_in.modifier if config_in else 2
-    config_out = CreditConfig.query.filter_by(action="chapter_output").first()
-    modifier_output = config_out.modifier if config_out else 2
-
-    modified_credit_cost_input = round(base_credit_cost_input * modifier_input)
-    modified_credit_cost_output = round(base_credit_cost_output * modifier_output)
-    total_predicted_credit_cost = modified_credit_cost_input + modified_credit_cost_output
-
-    return {
-        "input_tokens": input_token_count,
-        "predicted_output_tokens": predicted_output_tokens,
-        "input_tokens_per_credit": input_tokens_per_credit,
-        "output_tokens_per_credit": output_tokens_per_credit,
-        "base_credit_cost_input": base_credit_cost_input,
-        "modified_credit_cost_input": modified_credit_cost_input,
-        "base_credit_cost_output": base_credit_cost_output,
-        "modified_credit_cost_output": modified_credit_cost_output,
-        "total_predicted_credit_cost": total_predicted_credit_cost
-    }
+@_cached_prediction
+def calculate_predicted_chapter_cost(story, chapter_index, model=None, estimate=False, tier=None):
+    """
+	Calculate the predicted cost of generating a chapter based on the provided story and chapter index.
+    
+    Only the guides, characters and locations of this chapter are loaded; use
+    calculate_predicted_all_chapters_cost to price every chapter with one set of queries.
+    
+    Args:
+        story (Story): The story object containing details about the chapters, title, inspirations, writing style, and tags.
+        chapter_index (int): The index of the chapter for which the cost is to be calculated.
+        model (str, optional): The model the generation will run on; it picks the tokenizer and the pricing. Defaults to model_for("chapter") at the tier.
+        estimate (bool, optional): Use estimate_tokens instead of an exact count, for display-only previews. Defaults to False.
+        tier (str, optional): The quality tier used to pick the model. Defaults to story.quality_tier.
+    
+    Returns:
+        CostBreakdown: The predicted token counts and credit costs, with the prompt they were computed from; to_dict() gives the API keys, including total_predicted_credit_cost.
+    """
+    model = model or model_for("chapter", tier or story.quality_tier)
+    chapters = story.chapters
+    chapter_title = chapters[chapter_index].title if chapter_index < len(chapters) else ""
+    ctx = build_chapter_cost_context(story, [chapter_title])
+    return _compute_chapter_cost(story, chapter_index, ctx, model, estimate)
 
 
-def calculate_actual_chapter_cost(input_token_count, chapter_text, model='o1-mini'):
+def calculate_actual_chapter_cost(input_token_count, chapter_text, model='o1-mini', batch=False):
     """
 	Calculates the actual cost of processing a chapter based on input and output token counts.
     
     Args:
         input_token_count (int): The number of input tokens for the chapter.
         chapter_text (str): The text of the chapter to be processed.
-        model (str, optional): The model used for token counting. Defaults to 'o1-mini'.
+        model (str, optional): The model that produced the text; it picks the tokenizer and the pricing. Defaults to 'o1-mini'.
+        batch (bool, optional): The chapter came back from an OpenAI batch, so the chapter_batch_* modifiers apply. Defaults to False.
     
     Returns:
-        dict: A dictionary containing the following keys:
-            - input_tokens (int): The number of input tokens.
-            - output_tokens (int): The number of output tokens calculated from the chapter text.
-            - model (str): The model used for the calculation.
-            - input_tokens_per_credit (float): The number of input tokens that can be processed per credit.
-            - output_tokens_per_credit (float): The number of output tokens that can be processed per credit.
-            - base_credit_cost_input (int): The base credit cost for input tokens.
-            - modified_credit_cost_input (int): The modified credit cost for input tokens after applying any modifiers.
-            - base_credit_cost_output (int): The base credit cost for output tokens.
-            - modified_credit_cost_output (int): The modified credit cost for output tokens after applying any modifiers.
-            - total_actual_credit_cost (int): The total actual credit cost for processing the chapter.
+        CostBreakdown: The actual token counts and credit costs, with model set; to_dict() gives the API keys, including total_actual_credit_cost.
     """
     output_token_count = count_tokens(chapter_text, model)
-    
-    tokenCostConfig = TokenCostConfig.query.first()
-    cost_per_million_input = tokenCostConfig.o1_cost_per_1m_input
-    cost_per_million_output = tokenCostConfig.o1_cost_per_1m_output
-    credit_cost_dollar = tokenCostConfig.o1_cost_per_credit
-    
-    input_tokens_per_credit = round((credit_cost_dollar * 1_000_000) / cost_per_million_input, 2)
-    output_tokens_per_credit = round((credit_cost_dollar * 1_000_000) / cost_per_million_output, 2)
-    base_credit_cost_input = round(input_token_count / input_tokens_per_credit)
-    base_credit_cost_output = round(output_token_count / output_tokens_per_credit)
-    
-    config_in = CreditConfig.query.filter_by(action="chapter_input").first()
-    modifier_input = config_in.modifier if config_in else 2
-    config_out = CreditConfig.query.filter_by(action="chapter_output").first()
-    modifier_output = config_out.modifier if config_out else 2
-    
-    modified_credit_cost_input = round(base_credit_cost_input * modifier_input)
-    modified_credit_cost_output = round(base_credit_cost_output * modifier_output)
-    total_actual_credit_cost = modified_credit_cost_input + modified_credit_cost_output
-    
-    return {
-        "input_tokens": input_token_count,
-        "output_tokens": output_token_count,
-        "model": model,
-        "input_tokens_per_credit": input_tokens_per_credit,
-        "output_tokens_per_credit": output_tokens_per_credit,
-        "base_credit_cost_input": base_credit_cost_input,
-        "modified_credit_cost_input": modified_credit_cost_input,
-        "base_credit_cost_output": base_credit_cost_output,
-        "modified_credit_cost_output": modified_credit_cost_output,
-        "total_actual_credit_cost": total_actual_credit_cost
-    }
+    return _compute_costs(input_token_count, output_token_count, _pricing_for(model), _chapter_actions(batch), minimum=0, model=model)
 
-def calculate_predicted_all_chapters_cost(story, model='o1-mini'):
+@_cached_prediction
+def calculate_predicted_all_chapters_cost(story, model=None, estimate=False, tier=None, batch=False):
     """
 	Calculates the predicted total cost for all chapters in a story using a specified model.
     
+    The story's chapter guides, characters and locations are loaded once into a ChapterCostContext and
+    shared by every chapter, so the query count does not grow with the number of chapters.
+    
     Args:
         story (Story): The story object containing chapters to be evaluated.
-        model (str, optional): The model to use for cost prediction. Defaults to 'o1-mini'.
+        model (str, optional): The model the generation will run on; it picks the tokenizer and the pricing. Defaults to model_for("chapter") at the tier.
+        estimate (bool, optional): Use estimate_tokens instead of an exact count, for display-only previews. Defaults to False.
+        tier (str, optional): The quality tier used to pick the model. Defaults to story.quality_tier.
+        batch (bool, optional): The chapters will go through the OpenAI Batch API, so the chapter_batch_* modifiers apply. Defaults to False.
     
     Returns:
         dict: A dictionary containing the total predicted credit cost and a breakdown of costs for each chapter.
@@ -710,20 +616,58 @@ def calculate_predicted_all_chapters_cost(story, model='o1-mini'):
             - chapters (list): A list of dictionaries, each containing:
                 - chapter_index (int): The index of the chapter.
                 - predicted_cost (float): The predicted cost for the chapter.
-                - details (dict): Additional details about the cost prediction for the chapter.
+                - details (CostBreakdown): The chapter's full cost prediction.
     """
-    chapters = sorted(story.chapters, key=lambda c: c.chapter_number) if story.chapters else []
+    model = model or model_for("chapter", tier or story.quality_tier)
+    ctx = build_chapter_cost_context(story)
     total_cost = 0
     breakdown = []
-    for i in range(len(chapters)):
-        cost_info = calculate_predicted_chapter_cost(story, i, model)
+    for i in range(len(ctx.chapters)):
+        cost_info = _compute_chapter_cost(story, i, ctx, model, estimate, batch)
         breakdown.append({
             "chapter_index": i,
-            "predicted_cost": cost_info["total_predicted_credit_cost"],
+            "predicted_cost": cost_info.total_credit_cost,
             "details": cost_info
         })
-        total_cost += cost_info["total_predicted_credit_cost"]
+        total_cost += cost_info.total_credit_cost
     return {
         "total_predicted_credit_cost": total_cost,
         "chapters": breakdown
-    }
\ No newline at end of file
+    }
+
+PREDICTED_COST_FUNCTIONS = {
+    "meta": calculate_predicted_meta_cost,
+    "arcs": calculate_predicted_story_arcs_cost,
+    "summaries": calculate_predicted_summaries_cost,
+    "chapter_guide": calculate_predicted_chapter_guide_cost,
+    "chapter": calculate_predicted_chapter_cost,
+    "all_chapters": calculate_predicted_all_chapters_cost
+}
+
+def calculate_predicted_total_cost(kind, story, chapter_index=None, estimate=False, cached_only=False):
+    """
+	Returns just the total predicted credit cost of a generation, for cost previews.
+    
+    The arguments are passed to the predictor exactly as the generation routes pass them, so an exact
+    prediction made for a generation request is found again here.
+    
+    Args:
+        kind (str): A PREDICTED_COST_FUNCTIONS key, e.g. "meta" or "chapter".
+        story (Story): The story to price.
+        chapter_index (int, optional): The zero-based chapter index when kind is "chapter".
+        estimate (bool, optional): Use estimate_tokens instead of an exact count. Defaults to False.
+        cached_only (bool, optional): Only look in the prediction cache and never compute. Defaults to False.
+    
+    Returns:
+        int or None: The total predicted credit cost, or None if cached_only is set and nothing is cached.
+    """
+    predictor = PREDICTED_COST_FUNCTIONS[kind]
+    args = (chapter_index,) if kind == "chapter" else ()
+    kwargs = {"estimate": True} if estimate else {}
+    if kind == "all_chapters":
+        kwargs["tier"] = story.quality_tier or current_app.config.get("BULK_DEFAULT_TIER", "draft")
+        kwargs["batch"] = bool(story.batch_mode)
+    prediction = (predictor.peek if cached_only else predictor)(story, *args, **kwargs)
+    if prediction is None:
+        return None
+    return prediction["total_predicted_credit_cost"] if kind == "all_chapters" else prediction.total_credit_cost
@@ -1,9 +1,85 @@
 
+import hashlib
+import re
+import threading
+from functools import lru_cache
 import tiktoken
+from cachetools import LRUCache
+
+TOKEN_COUNT_CACHE_SIZE = 4096
+TOKEN_BATCH_THREADS = 8
+_TEMPLATE_FIELD_RE = re.compile(r"\{(\w+)\}")
+
+# Keyed by a digest of the text rather than the text itself, so large prompts are not kept alive.
+_token_count_cache = LRUCache(maxsize=TOKEN_COUNT_CACHE_SIZE)
+_token_count_cache_lock = threading.Lock()
+
+@lru_cache(maxsize=None)
+def _get_encoding(model):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        return tiktoken.get_encoding("cl100k_base")
+
+# Average UTF-8 bytes per token for English prose, per encoding.
+BYTES_PER_TOKEN = {"cl100k_base": 3.8, "o200k_base": 3.9}
+
+@lru_cache(maxsize=None)
+def _encoding_name(model):
+    try:
+        return tiktoken.encoding_name_for_model(model)
+    except Exception:
+        return "cl100k_base"
+
+def count_tokens_batch(prompts, model="gpt-4o-mini"):
+    """
+    Counts the tokens of several prompts, encoding the uncached ones in one tiktoken batch.
+    
+    encode_batch spreads the BPE work over TOKEN_BATCH_THREADS threads, which release the GIL, so a
+    list of prompts is counted much faster than calling count_tokens in a loop. Results share
+    count_tokens' memo.
+    
+    Args:
+        prompts (list): The prompts to count.
+        model (str, optional): The model to use for encoding. Defaults to "gpt-4o-mini".
+    
+    Returns:
+        list: The token count of each prompt, in order.
+    """
+    keys = [(hashlib.blake2b(prompt.encode("utf-8"), digest_size=16).digest(), model) for prompt in prompts]
+    counts = [_token_count_cache.get(key) for key in keys]
+    missing = [i for i, count in enumerate(counts) if count is None]
+    if missing:
+        encoded = _get_encoding(model).encode_batch([prompts[i] for i in missing], num_threads=TOKEN_BATCH_THREADS)
+        with _token_count_cache_lock:
+            for i, tokens in zip(missing, encoded):
+                counts[i] = len(tokens)
+                _token_count_cache[keys[i]] = counts[i]
+    return counts
+
+def estimate_tokens(prompt, model="gpt-4o-mini"):
+    """
+    Estimates the number of tokens in a prompt from its UTF-8 length.
+    
+    This is for display-only previews: it never loads a tiktoken vocabulary or runs BPE, at the price
+    of a few percent of error. Anything that is billed or charged must use count_tokens.
+    
+    Args:
+        prompt (str): The input text.
+        model (str, optional): The model whose encoding sets the bytes-per-token ratio. Defaults to "gpt-4o-mini".
+    
+    Returns:
+        int: The estimated number of tokens.
+    """
+    return round(len(prompt.encode("utf-8")) / BYTES_PER_TOKEN.get(_encoding_name(model), 3.8))
+
 def count_tokens(prompt, model="gpt-4o-mini"):
     """
     Counts the number of tokens in a given prompt using the specified model.
     
+    Counts are memoized by (BLAKE2b digest of the prompt, model), so re-estimating the same
+    prompt (previews, retries) skips the BPE encoding.
+    
     Args:
         prompt (str): The input text for which to count the tokens.
         model (str, optional): The model to use for encoding. Defaults to "gpt-4o-mini".
@@ -14,12 +90,58 @@ def count_tokens(prompt, model="gpt-4o-mini"):
     Raises:
         Exception: If the model is not recognized, it falls back to the default encoding.
     """
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-    except Exception:
-        encoding = tiktoken.get_encoding("cl100k_base")
-    return len(encoding.encode(prompt))
+    cache_key = (hashlib.blake2b(prompt.encode("utf-8"), digest_size=16).digest(), model)
+    count = _token_count_cache.get(cache_key)
+    if count is None:
+        count = len(_get_encoding(model).encode(prompt))
+        with _token_count_cache_lock:
+            _token_count_cache[cache_key] = count
+    return count
+
+
+META_PROMPT_TEMPLATE = (
+    "You are a creative, experienced novelist tasked with establishing the foundational world of a new novel. "
+    "Please avoid clichéd or generic phrases and focus on rich, bursty narrative details.\n\n"
+    "<story>\n"
+    "  <title>{title}</title>\n"
+    "  <details>{details}</details>\n"
+    "  <tags>{tags}</tags>\n"
+    "  {inspirations_prompt}\n"
+    "  <structure totalChapters='{total_chapters}' />\n"
+    "</story>\n\n"
+    "Your task: Generate a JSON object with two keys: 'locations' and 'characters'. Each key must map to an array of objects. "
+    "Each object in 'locations' must include 'name' and 'description'. Each object in 'characters' must include 'name', "
+    "'description', and an 'example_dialogue' field. "
+    "Ensure your response is creative, contextually rich, and strictly in JSON format with no markdown formatting."
+)
 
+@lru_cache(maxsize=None)
+def _static_template_tokens(template, model):
+    return sum(count_tokens(fragment, model) for fragment in _TEMPLATE_FIELD_RE.split(template)[::2])
+
+def count_prompt_tokens_meta(title, details, tags, inspirations, total_chapters, model="gpt-4o-mini"):
+    """
+    Counts the tokens of the prompt build_meta_prompt would produce, without building it.
+    
+    The static parts of META_PROMPT_TEMPLATE are tokenized once per model; only the story fields are
+    counted per call (and those counts are memoized by count_tokens). BPE merges across a field boundary
+    can make this differ from counting the assembled prompt by a token or so per field, so use it for
+    display only; anything that is billed must count the built prompt with count_tokens.
+    
+    Args:
+        title (str): The title of the story.
+        details (str): A brief description of the story.
+        tags (str): Tags associated with the story.
+        inspirations (str): Sources of inspiration for the story (optional).
+        total_chapters (int): The total number of chapters in the story.
+        model (str, optional): The model to use for encoding. Defaults to "gpt-4o-mini".
+    
+    Returns:
+        int: The number of tokens in the prompt.
+    """
+    inspirations_prompt = f"<inspirations>{inspirations}</inspirations>" if inspirations else ""
+    fields = (title, details, tags, inspirations_prompt, total_chapters)
+    return _static_template_tokens(META_PROMPT_TEMPLATE, model) + sum(count_tokens(str(field), model) for field in fields)
 
 def build_meta_prompt(title, details, tags, inspirations, total_chapters):
     """
@@ -39,22 +161,7 @@ def build_meta_prompt(title, details, tags, inspirations, total_chapters):
         str: A formatted prompt with XML instructions.
     """
     inspirations_prompt = f"<inspirations>{inspirations}</inspirations>" if inspirations else ""
-    template = (
-        "You are a creative, experienced novelist tasked with establishing the foundational world of a new novel. "
-        "Please avoid clichéd or generic phrases and focus on rich, bursty narrative details.\n\n"
-        "<story>\n"
-        "  <title>{title}</title>\n"
-        "  <details>{details}</details>\n"
-        "  <tags>{tags}</tags>\n"
-        "  {inspirations_prompt}\n"
-        "  <structure totalChapters='{total_chapters}' />\n"
-        "</story>\n\n"
-        "Your task: Generate a JSON object with two keys: 'locations' and 'characters'. Each key must map to an array of objects. "
-        "Each object in 'locations' must include 'name' and 'description'. Each object in 'characters' must include 'name', "
-        "'description', and an 'example_dialogue' field. "
-        "Ensure your response is creative, contextually rich, and strictly in JSON format with no markdown formatting."
-    )
-    return template.format(
+    return META_PROMPT_TEMPLATE.format(
         title=title,
         details=details,
         tags=tags,
@@ -215,6 +322,10 @@ def build_chapter_content_prompt(chapter_title, chapter_summary, book_title, det
     
     The prompt is designed to guide the output to be engaging, varied in tone, and narrative-driven.
     
+    The story-wide fields (book title, details, tags, inspirations, writing style) come first and the
+    chapter-specific fields after them, so every chapter prompt of a story starts with the same bytes and
+    the provider's automatic prompt-prefix cache can be reused across the chapters.
+    
     Args:
         chapter_title (str): The title of the chapter.
         chapter_summary (str): A brief summary of the chapter.
@@ -267,14 +378,14 @@ def build_chapter_content_prompt(chapter_title, chapter_summary, book_title, det
         "Your language should be vivid, dynamic, and avoid formulaic phrasing. Below is the XML-structured context for this chapter.\n\n"
         "<chapterContext>\n"
         "  <bookTitle>{book_title}</bookTitle>\n"
-        "  <chapterTitle>{chapter_title}</chapterTitle>\n"
-        "  <chapterSummary>{chapter_summary}</chapterSummary>\n"
-        "  <previousSummary>{prev_summary}</previousSummary>\n"
-        "  <nextSummary>{next_summary}</nextSummary>\n"
         "  <details>{details}</details>\n"
         "  <tags>{tags}</tags>\n"
         "  {inspirations_prompt}\n"
         "  {writing_style_prompt}\n"
+        "  <chapterTitle>{chapter_title}</chapterTitle>\n"
+        "  <chapterSummary>{chapter_summary}</chapterSummary>\n"
+        "  <previousSummary>{prev_summary}</previousSummary>\n"
+        "  <nextSummary>{next_summary}</nextSummary>\n"
         "  <metadata>\n"
         "    <characters>\n{character_mapping}\n    </characters>\n"
         "    <locations>\n{location_mapping}\n    </locations>\n"
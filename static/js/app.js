@@ -8,6 +8,24 @@ socket.on("connect", function () {
 
 socket.on("generation_error", function (data) {});
 
+// Preview endpoints answer with an estimate and a job_id; the exact cost arrives later as "cost_predicted".
+const pendingCostPredictions = {};
+
+function showPredictedCost(element, data) {
+  element.innerText = data.total_predicted_credit_cost ?? "";
+  if (data.job_id) {
+    pendingCostPredictions[data.job_id] = element;
+  }
+}
+
+socket.on("cost_predicted", function (data) {
+  const element = pendingCostPredictions[data.job_id];
+  delete pendingCostPredictions[data.job_id];
+  if (element && element.innerText !== "" && data.total_predicted_credit_cost != null) {
+    element.innerText = data.total_predicted_credit_cost;
+  }
+});
+
 socket.on("notification", function (data) {
   let container = document.querySelector(".message-container");
 
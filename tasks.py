@@ -2,27 +2,32 @@ import eventlet
 eventlet.monkey_patch(all=False, socket=True)
 celery = eventlet.import_patched("celery")
 from celery import Celery
+from eventlet.green import subprocess
 import json
+import time
+from sqlalchemy import update
 from models import db, Story, GenerationLog, Chapter, Character, Location, StoryArc, ChapterGuide
 from openai_handler import (
     generate_meta_from_prompt,
     generate_chapter_summaries_from_prompt,
-    generate_chapter_content_from_prompt,
+    stream_chapter_content_from_prompt,
     generate_story_arcs_from_prompt,
     generate_image_from_prompt,
-    generate_chapter_guide_from_prompt
+    generate_chapter_guide_from_prompt,
+    model_for
 )
 from predictions import ( 
     calculate_actual_meta_cost,
     calculate_actual_summaries_cost,
     calculate_actual_chapter_cost,
     calculate_actual_story_arcs_cost,
-    calculate_actual_chapter_guide_cost
+    calculate_actual_chapter_guide_cost,
+    calculate_predicted_total_cost,
+    PREDICTED_COST_CACHE_TTL
 )
-from api.generation import clear_user_generation_lock
-from helpers import get_image_url, spend_credits, notify, put_image
+from api.generation import clear_user_generation_lock, locking_queue
+from helpers import get_image_url, spend_credits, notify, put_image, clear_payload_signature, send_email, send_bulk_email
 from app import app, socketio
-import requests
 
 celery_app = Celery(app.import_name,
                     broker=app.config['CELERY_BROKER_URL'],
@@ -35,6 +40,13 @@ class ContextTask(celery_app.Task):
             return self.run(*args, **kwargs)
 celery_app.Task = ContextTask
 
+CHAPTER_STREAM_EMIT_INTERVAL = 0.1
+CHAPTER_PERSIST_CHARS = 512
+CHAPTER_BATCH_POLL_INTERVAL = 60
+CHAPTER_BATCH_MAX_RETRIES = 60
+# Cost previews run on their own worker queue so long generation tasks never hold them up.
+COST_PREDICTION_QUEUE = "predictions"
+
 @celery_app.task(name="generate_image_task")
 def generate_image_task(story_id, image_key, prompt, user_id, credit_cost, chapter_id=None):
     """
@@ -61,22 +73,22 @@ def generate_image_task(story_id, image_key, prompt, user_id, credit_cost, chapt
         task_id=task_id, user_id=user_id, generation_type="image"
     ).first()
     try:
-        result_url = generate_image_from_prompt(prompt, size="1024x1024")
-        image_data = requests.get(result_url).content
+        image_data = generate_image_from_prompt(prompt, size="1024x1024")
+        content_type = "image/png"
         
         if chapter_id is None:
             story = Story.query.get(story_id)
             if not story:
                 notify("Story not found", user_id)
                 return {"status": "error", "error": "Story not found."}
-            new_image_url = put_image(image_key, image_data)
+            new_image_url = put_image(image_key, image_data, content_type=content_type)
             story.cover_image_key = new_image_url
         else:
             chapter = Chapter.query.filter_by(story_id=story_id, id=chapter_id).first()
             if not chapter:
                 notify("Chapter not found", user_id)
                 return {"status": "error", "error": "Chapter not found."}
-            new_image_url = put_image(image_key, image_data)
+            new_image_url = put_image(image_key, image_data, content_type=content_type)
             chapter.chapter_image_key = new_image_url
         
         db.session.commit()
@@ -112,7 +124,7 @@ def generate_image_task(story_id, image_key, prompt, user_id, credit_cost, chapt
         db.session.remove()
 
 @celery_app.task(name="generate_meta_task")
-def generate_meta_task(story_id, prompt, user_id, predicted_input_tokens):
+def generate_meta_task(story_id, prompt, user_id, predicted_input_tokens, tier=None):
     """
 	Generates metadata for a story based on the provided prompt and user information.
     
@@ -123,6 +135,7 @@ def generate_meta_task(story_id, prompt, user_id, predicted_input_tokens):
         prompt (str): The prompt used to generate character and location data.
         user_id (int): The ID of the user requesting the metadata generation.
         predicted_input_tokens (int): The estimated number of input tokens for cost calculation.
+        tier (str, optional): The quality tier for the model choice. Defaults to the DEFAULT_TIER config.
     
     Returns:
         dict: A dictionary containing the status of the operation and the generated metadata, or an error message if the operation fails.
@@ -135,7 +148,7 @@ def generate_meta_task(story_id, prompt, user_id, predicted_input_tokens):
         task_id=task_id, user_id=user_id, generation_type="meta"
     ).first()
     try:
-        result_text = generate_meta_from_prompt(prompt)
+        result_text = generate_meta_from_prompt(prompt, tier=tier, scope=story_id)
         try:
             result = json.loads(result_text)
         except Exception:
@@ -165,16 +178,17 @@ def generate_meta_task(story_id, prompt, user_id, predicted_input_tokens):
                 )
                 db.session.add(new_loc)
             db.session.commit()
+            clear_payload_signature("meta", story.id)
 
-        actual_cost = calculate_actual_meta_cost(predicted_input_tokens, result_text)
-        real_total_cost = actual_cost.get("total_actual_credit_cost")
+        actual_cost = calculate_actual_meta_cost(predicted_input_tokens, result_text, model_for("meta", tier))
+        real_total_cost = actual_cost.total_credit_cost
         spend_credits(user_id, "text", real_total_cost)
         if log_entry:
             log_entry.real_cost = real_total_cost
             log_entry.status = "succeeded"
-            log_entry.input_tokens = actual_cost.get("input_tokens", 0)
-            log_entry.output_tokens = actual_cost.get("output_tokens", 0)
-            log_entry.model = actual_cost.get("model", "")
+            log_entry.input_tokens = actual_cost.input_tokens
+            log_entry.output_tokens = actual_cost.output_tokens
+            log_entry.model = actual_cost.model
             db.session.commit()
 
         notify("Metadata Generation Successful", user_id)
@@ -185,7 +199,7 @@ def generate_meta_task(story_id, prompt, user_id, predicted_input_tokens):
                           for l in Location.query.filter_by(story_id=story.id).all()]
         }
         socketio.emit("meta_generated", {"story_id": story_id, "meta": meta}, room=user_id)
-        return {"status": "success", "meta": meta, "actual_cost": actual_cost}
+        return {"status": "success", "meta": meta, "actual_cost": actual_cost.to_dict()}
     except Exception as e:
         if log_entry:
             log_entry.status = "failed"
@@ -199,7 +213,7 @@ def generate_meta_task(story_id, prompt, user_id, predicted_input_tokens):
         db.session.remove()
 
 @celery_app.task(name="generate_story_arcs_task")
-def generate_story_arcs_task(story_id, prompt, user_id, predicted_input_tokens):
+def generate_story_arcs_task(story_id, prompt, user_id, predicted_input_tokens, tier=None):
     """
 	Generates story arcs based on a given prompt and updates the database with the new arcs.
     
@@ -208,6 +222,7 @@ def generate_story_arcs_task(story_id, prompt, user_id, predicted_input_tokens):
         prompt (str): The prompt used to generate the story arcs.
         user_id (int): The ID of the user requesting the story arcs.
         predicted_input_tokens (int): The predicted number of input tokens for cost calculation.
+        tier (str, optional): The quality tier for the model choice. Defaults to the DEFAULT_TIER config.
     
     Returns:
         dict: A dictionary containing the status of the operation, the generated arcs, and the actual cost.
@@ -222,7 +237,7 @@ def generate_story_arcs_task(story_id, prompt, user_id, predicted_input_tokens):
         task_id=task_id, user_id=user_id, generation_type="story_arcs"
     ).first()
     try:
-        arcs_text = generate_story_arcs_from_prompt(prompt)
+        arcs_text = generate_story_arcs_from_prompt(prompt, tier=tier, scope=story_id)
         arcs = json.loads(arcs_text)
         story = Story.query.get(story_id)
         if story:
@@ -231,19 +246,20 @@ def generate_story_arcs_task(story_id, prompt, user_id, predicted_input_tokens):
                 new_arc = StoryArc(story_id=story.id, arc_text=arc, arc_order=index + 1)
                 db.session.add(new_arc)
             db.session.commit()
-        actual_cost = calculate_actual_story_arcs_cost(predicted_input_tokens, arcs_text)
-        real_total_cost = actual_cost.get("total_actual_credit_cost")
+            clear_payload_signature("arcs", story.id)
+        actual_cost = calculate_actual_story_arcs_cost(predicted_input_tokens, arcs_text, model_for("story_arcs", tier))
+        real_total_cost = actual_cost.total_credit_cost
         spend_credits(user_id, "text", real_total_cost)
         if log_entry:
             log_entry.real_cost = real_total_cost
             log_entry.status = "succeeded"
-            log_entry.input_tokens = actual_cost.get("input_tokens", 0)
-            log_entry.output_tokens = actual_cost.get("output_tokens", 0)
-            log_entry.model = actual_cost.get("model", "")
+            log_entry.input_tokens = actual_cost.input_tokens
+            log_entry.output_tokens = actual_cost.output_tokens
+            log_entry.model = actual_cost.model
             db.session.commit()
         notify("Story Arcs Generation Successful", user_id)
         socketio.emit("arcs_generated", {"story_id": story_id, "arcs": arcs}, room=user_id)
-        return {"status": "success", "arcs": arcs, "actual_cost": actual_cost}
+        return {"status": "success", "arcs": arcs, "actual_cost": actual_cost.to_dict()}
     except Exception as e:
         if log_entry:
             log_entry.status = "failed"
@@ -257,7 +273,7 @@ def generate_story_arcs_task(story_id, prompt, user_id, predicted_input_tokens):
         db.session.remove()
 
 @celery_app.task(name="generate_summaries_task")
-def generate_summaries_task(story_id, prompt, user_id, predicted_input_tokens):
+def generate_summaries_task(story_id, prompt, user_id, predicted_input_tokens, tier=None):
     """
 	Generates summaries for a given story based on a prompt and logs the generation process.
     
@@ -266,6 +282,7 @@ def generate_summaries_task(story_id, prompt, user_id, predicted_input_tokens):
         prompt (str): The prompt used to generate chapter summaries.
         user_id (int): The ID of the user requesting the summary generation.
         predicted_input_tokens (int): The estimated number of input tokens for cost calculation.
+        tier (str, optional): The quality tier for the model choice. Defaults to the DEFAULT_TIER config.
     
     Returns:
         dict: A dictionary containing the status of the operation and the generated summaries, 
@@ -285,7 +302,7 @@ def generate_summaries_task(story_id, prompt, user_id, predicted_input_tokens):
     ).first()
     try:
         story = Story.query.get(story_id)
-        generated_summaries_text = generate_chapter_summaries_from_prompt(prompt)
+        generated_summaries_text = generate_chapter_summaries_from_prompt(prompt, tier=tier, scope=story_id)
         if not generated_summaries_text.strip():
             raise ValueError("Empty response received for Chapter Summaries.")
         try:
@@ -308,23 +325,23 @@ def generate_summaries_task(story_id, prompt, user_id, predicted_input_tokens):
                 chapter.summary = chapter_data.get("summary", chapter.summary)
         db.session.commit()
 
-        actual_cost = calculate_actual_summaries_cost(predicted_input_tokens, generated_summaries_text)
-        real_total_cost = actual_cost.get("total_actual_credit_cost")
+        actual_cost = calculate_actual_summaries_cost(predicted_input_tokens, generated_summaries_text, model_for("summaries", tier))
+        real_total_cost = actual_cost.total_credit_cost
         spend_credits(user_id, "text", real_total_cost)
         if log_entry:
             log_entry.real_cost = real_total_cost
             log_entry.status = "succeeded"
-            log_entry.input_tokens = actual_cost.get("input_tokens", 0)
-            log_entry.output_tokens = actual_cost.get("output_tokens", 0)
-            log_entry.model = actual_cost.get("model", "")
+            log_entry.input_tokens = actual_cost.input_tokens
+            log_entry.output_tokens = actual_cost.output_tokens
+            log_entry.model = actual_cost.model
             db.session.commit()
         notify("Summaries Generation Successful", user_id)
         summaries = [
             {"id": ch.id, "title": ch.title, "summary": ch.summary or ""}
-            for ch in sorted(story.chapters, key=lambda c: c.chapter_number)
+            for ch in story.chapters
         ]
         socketio.emit("summaries_generated", {"story_id": story_id, "summaries": summaries}, room=user_id)
-        return {"status": "success", "summaries": summaries, "actual_cost": actual_cost}
+        return {"status": "success", "summaries": summaries, "actual_cost": actual_cost.to_dict()}
     except Exception as e:
         if log_entry:
             log_entry.status = "failed"
@@ -338,7 +355,7 @@ def generate_summaries_task(story_id, prompt, user_id, predicted_input_tokens):
         db.session.remove()
 
 @celery_app.task(name="generate_chapter_guide_task")
-def generate_chapter_guide_task(story_id, full_prompt, user_id, predicted_input_tokens):
+def generate_chapter_guide_task(story_id, full_prompt, user_id, predicted_input_tokens, tier=None):
     """
 	Generates detailed story arcs for a given story based on a full prompt and user input.
     
@@ -347,6 +364,7 @@ def generate_chapter_guide_task(story_id, full_prompt, user_id, predicted_input_
         full_prompt (str): The prompt used to generate the detailed story arcs.
         user_id (int): The unique identifier for the user requesting the generation.
         predicted_input_tokens (int): The estimated number of input tokens for cost calculation.
+        tier (str, optional): The quality tier for the model choice. Defaults to the DEFAULT_TIER config.
     
     Returns:
         dict: A dictionary containing the status of the operation, the generated Chapter Guides, and the actual cost incurred.
@@ -363,7 +381,7 @@ def generate_chapter_guide_task(story_id, full_prompt, user_id, predicted_input_
     ).first()
     
     try:
-        chapter_guide_text = generate_chapter_guide_from_prompt(full_prompt)
+        chapter_guide_text = generate_chapter_guide_from_prompt(full_prompt, tier=tier, scope=story_id)
         chapter_guide = json.loads(chapter_guide_text)
         
         ChapterGuide.query.filter_by(story_id=story_id).delete()
@@ -387,16 +405,16 @@ def generate_chapter_guide_task(story_id, full_prompt, user_id, predicted_input_
                 db.session.add(mapping)
         db.session.commit()
         
-        actual_cost = calculate_actual_chapter_guide_cost(predicted_input_tokens, chapter_guide_text)
-        real_total_cost = actual_cost.get("total_actual_credit_cost")
+        actual_cost = calculate_actual_chapter_guide_cost(predicted_input_tokens, chapter_guide_text, model_for("chapter_guide", tier))
+        real_total_cost = actual_cost.total_credit_cost
         spend_credits(user_id, "text", real_total_cost)
         
         if log_entry:
             log_entry.real_cost = real_total_cost
             log_entry.status = "succeeded"
-            log_entry.input_tokens = actual_cost.get("input_tokens", 0)
-            log_entry.output_tokens = actual_cost.get("output_tokens", 0)
-            log_entry.model = actual_cost.get("model", "")
+            log_entry.input_tokens = actual_cost.input_tokens
+            log_entry.output_tokens = actual_cost.output_tokens
+            log_entry.model = actual_cost.model
             db.session.commit()
         
         notify("Detailed Story Arcs Generation Successful", user_id)
@@ -419,7 +437,7 @@ def generate_chapter_guide_task(story_id, full_prompt, user_id, predicted_input_
             grouped_arcs[chapter_title] = sorted(parts, key=lambda x: x["arc"])
 
         socketio.emit("chapter_guide_generated", {"story_id": story_id, "chapter_guide": grouped_arcs}, room=user_id)
-        return {"status": "success", "chapter_guide": grouped_arcs, "actual_cost": actual_cost}
+        return {"status": "success", "chapter_guide": grouped_arcs, "actual_cost": actual_cost.to_dict()}
     
     except Exception as e:
         if log_entry:
@@ -435,16 +453,23 @@ def generate_chapter_guide_task(story_id, full_prompt, user_id, predicted_input_
         db.session.remove()
 
 @celery_app.task(name="generate_chapter_task")
-def generate_chapter_task(story_id, prompt, chapter_number, user_id, predicted_input_tokens):
+def generate_chapter_task(story_id, prompt, chapter_number, user_id, predicted_input_tokens, tier=None):
     """
 	Generates a chapter for a given story based on the provided prompt and updates the database accordingly.
     
+    The chapter's content is cleared when the stream starts and every CHAPTER_PERSIST_CHARS characters are
+    appended to it as they arrive, so a reload shows the partial chapter and a crashed worker leaves the text
+    generated so far. The final commit stores the stripped text; an error before that commit restores the
+    previous content and marks the log failed, while a later error (e.g. while notifying) leaves the saved
+    chapter and its charge alone.
+    
     Args:
         story_id (int): The ID of the story to which the chapter belongs.
         prompt (str): The prompt used to generate the chapter content.
         chapter_number (int): The number of the chapter being generated.
         user_id (int): The ID of the user requesting the chapter generation.
         predicted_input_tokens (int): The estimated number of input tokens for cost calculation.
+        tier (str, optional): The quality tier for the model choice. Defaults to the DEFAULT_TIER config.
     
     Returns:
         dict: A dictionary containing the status of the operation, the chapter number, and the actual cost if successful.
@@ -457,35 +482,77 @@ def generate_chapter_task(story_id, prompt, chapter_number, user_id, predicted_i
     log_entry = GenerationLog.query.filter_by(
         task_id=task_id, user_id=user_id, generation_type="chapter"
     ).first()
+    chapter = None
+    previous_content = None
+    generated = False
     try:
-        content = generate_chapter_content_from_prompt(prompt)
         chapter = Chapter.query.filter_by(story_id=story_id, chapter_number=chapter_number).first()
+        if chapter:
+            previous_content = chapter.content
+            chapter.content = ""
+            db.session.commit()
+        parts = []
+        pending = []
+        unsaved = []
+        unsaved_chars = 0
+        last_emit = time.monotonic()
+        for delta in stream_chapter_content_from_prompt(prompt, tier=tier, scope=f"{story_id}:{chapter_number}"):
+            parts.append(delta)
+            pending.append(delta)
+            unsaved.append(delta)
+            unsaved_chars += len(delta)
+            if chapter and unsaved_chars >= CHAPTER_PERSIST_CHARS:
+                _append_chapter_content(chapter.id, "".join(unsaved))
+                unsaved = []
+                unsaved_chars = 0
+            if time.monotonic() - last_emit >= CHAPTER_STREAM_EMIT_INTERVAL:
+                socketio.emit("chapter_content_delta", {
+                    "story_id": story_id,
+                    "chapter_number": chapter_number,
+                    "delta": "".join(pending)
+                }, room=user_id)
+                pending = []
+                last_emit = time.monotonic()
+        if pending:
+            socketio.emit("chapter_content_delta", {
+                "story_id": story_id,
+                "chapter_number": chapter_number,
+                "delta": "".join(pending)
+            }, room=user_id)
+        content = "".join(parts).strip()
         if chapter:
             chapter.content = content
         db.session.commit()
-        actual_cost = calculate_actual_chapter_cost(predicted_input_tokens, content)
-        real_total_cost = actual_cost.get("total_actual_credit_cost")
+        generated = True
+        actual_cost = calculate_actual_chapter_cost(predicted_input_tokens, content, model_for("chapter", tier))
+        real_total_cost = actual_cost.total_credit_cost
         spend_credits(user_id, "text", real_total_cost)
         if log_entry:
             log_entry.real_cost = real_total_cost
             log_entry.status = "succeeded"
-            log_entry.input_tokens = actual_cost.get("input_tokens", 0)
-            log_entry.output_tokens = actual_cost.get("output_tokens", 0)
-            log_entry.model = actual_cost.get("model", "")
+            log_entry.input_tokens = actual_cost.input_tokens
+            log_entry.output_tokens = actual_cost.output_tokens
+            log_entry.model = actual_cost.model
             db.session.commit()
         notify("Chapter Generation Successful", user_id)
         socketio.emit("chapter_generated", {
             "story_id": story_id,
-            "title": chapter.title,
+            "title": chapter.title if chapter else None,
             "chapter_number": chapter_number,
             "content": content
         }, room=user_id)
-        return {"status": "success", "chapter": chapter_number, "actual_cost": actual_cost}
+        return {"status": "success", "chapter": chapter_number, "actual_cost": actual_cost.to_dict()}
     except Exception as e:
+        db.session.rollback()
+        if generated:
+            # The new chapter is already saved (and possibly charged), so don't roll it back.
+            return {"status": "error", "chapter": chapter_number, "error": str(e)}
+        if chapter:
+            chapter.content = previous_content
         if log_entry:
             log_entry.status = "failed"
             log_entry.error_message = str(e)
-            db.session.commit()
+        db.session.commit()
         notify("Chapter Generation Failed", user_id)
         socketio.emit("generation_error", {
             "story_id": story_id, "chapter_number": chapter_number, "error": str(e)
@@ -494,3 +561,248 @@ def generate_chapter_task(story_id, prompt, chapter_number, user_id, predicted_i
     finally:
         clear_user_generation_lock(user_id)
         db.session.remove()
+
+def _append_chapter_content(chapter_id, text):
+    """
+	Appends streamed text to a chapter's stored content and commits it.
+    
+    The concatenation happens in a single UPDATE, so the row is never read back and a concurrent
+    writer cannot interleave a stale read-modify-write.
+    
+    Args:
+        chapter_id (int): The ID of the chapter being generated.
+        text (str): The text to append.
+    
+    Returns:
+        None
+    """
+    db.session.execute(
+        update(Chapter).where(Chapter.id == chapter_id).values(content=Chapter.content + text)
+    )
+    db.session.commit()
+
+@celery_app.task(name="poll_chapter_batch_task", bind=True, max_retries=CHAPTER_BATCH_MAX_RETRIES)
+def poll_chapter_batch_task(self, batch_id, story_id, user_id, predicted_input_tokens, model=None):
+    """
+	Polls an OpenAI chapter batch and writes its results back to the story's chapters.
+    
+    While the batch is still running the task re-queues itself every CHAPTER_BATCH_POLL_INTERVAL seconds. 
+    Once it has completed, each chapter's content is saved and charged exactly like generate_chapter_task, 
+    its GenerationLog (task_id "<batch_id>:<chapter_number>") is updated, and a "chapter_generated" event is 
+    emitted. Chapters missing from the output, or a failed/expired/cancelled batch, are logged as failed.
+    
+    API and database errors are retried after CHAPTER_BATCH_POLL_INTERVAL seconds, up to
+    CHAPTER_BATCH_MAX_RETRIES times. Each chapter's content, log entry and charge are committed together and
+    chapters whose log entry already succeeded are skipped, so a retry never charges a chapter twice.
+    
+    Args:
+        batch_id (str): The ID of the OpenAI batch.
+        story_id (int): The ID of the story the chapters belong to.
+        user_id (int): The ID of the user who requested the generation.
+        predicted_input_tokens (dict): Predicted input tokens keyed by chapter number (as a string, after JSON serialization).
+        model (str, optional): The model the batch was submitted with, used for pricing and logging. Defaults to model_for("chapter").
+    
+    Returns:
+        dict: {"status": "pending"} while the batch runs, otherwise {"status": "success"|"error", ...}.
+    """
+    from openai_batch import retrieve_batch, fetch_chapter_batch_results, BATCH_PENDING_STATUSES
+    finished = False
+    try:
+        batch = retrieve_batch(batch_id)
+        if batch.status in BATCH_PENDING_STATUSES:
+            poll_chapter_batch_task.apply_async(
+                args=[batch_id, story_id, user_id, predicted_input_tokens, model],
+                countdown=CHAPTER_BATCH_POLL_INTERVAL
+            )
+            return {"status": "pending", "batch_status": batch.status}
+
+        results = fetch_chapter_batch_results(batch) if batch.status == "completed" else {}
+        chapters = Chapter.query.filter_by(story_id=story_id).order_by(Chapter.chapter_number).all()
+        for chapter in chapters:
+            chapter_number = chapter.chapter_number
+            log_entry = GenerationLog.query.filter_by(
+                task_id=f"{batch_id}:{chapter_number}", user_id=user_id, generation_type="chapter"
+            ).first()
+            if log_entry and log_entry.status == "succeeded":
+                continue
+            result = results.get(chapter_number) or {"error": f"Batch {batch.status} without a result for this chapter."}
+            if "error" in result:
+                if log_entry:
+                    log_entry.status = "failed"
+                    log_entry.error_message = result["error"]
+                    db.session.commit()
+                socketio.emit("generation_error", {
+                    "story_id": story_id, "chapter_number": chapter_number, "error": result["error"]
+                }, room=user_id)
+                continue
+            content = result["content"]
+            chapter.content = content
+            actual_cost = calculate_actual_chapter_cost(
+                predicted_input_tokens.get(str(chapter_number), 0), content, model or model_for("chapter"), batch=True
+            )
+            real_total_cost = actual_cost.total_credit_cost
+            if log_entry:
+                log_entry.real_cost = real_total_cost
+                log_entry.status = "succeeded"
+                log_entry.input_tokens = actual_cost.input_tokens
+                log_entry.output_tokens = actual_cost.output_tokens
+                log_entry.model = actual_cost.model
+            # spend_credits commits the session, so the content, the log entry and the charge land together.
+            spend_credits(user_id, "text", real_total_cost)
+            socketio.emit("chapter_generated", {
+                "story_id": story_id,
+                "title": chapter.title,
+                "chapter_number": chapter_number,
+                "content": content
+            }, room=user_id)
+        finished = True
+        if batch.status == "completed":
+            notify("Chapter Generation Successful", user_id)
+            return {"status": "success", "batch_id": batch_id}
+        notify("Chapter Generation Failed", user_id)
+        return {"status": "error", "batch_id": batch_id, "error": f"Batch {batch.status}"}
+    except Exception as e:
+        db.session.rollback()
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=e, countdown=CHAPTER_BATCH_POLL_INTERVAL)
+        finished = True
+        notify("Chapter Generation Failed", user_id)
+        socketio.emit("generation_error", {"story_id": story_id, "error": str(e)}, room=user_id)
+        return {"status": "error", "batch_id": batch_id, "error": str(e)}
+    finally:
+        if finished:
+            clear_user_generation_lock(user_id)
+        db.session.remove()
+
+@celery_app.task(name="generate_epub_task")
+def generate_epub_task(story_id, user_id):
+    """
+	Builds an EPUB for a story with pandoc and uploads it to the S3 bucket.
+    
+    The story's final markdown is used when present; otherwise the chapters are combined in order. 
+    When the upload succeeds the user receives an "epub_generated" event with a presigned download URL.
+    
+    Args:
+        story_id (int): The ID of the story to export.
+        user_id (int): The ID of the user who requested the export.
+    
+    Returns:
+        dict: {"status": "success", "epub_key": "<key>"} on success, or {"status": "error", "error": "<error_message>"} on failure.
+    """
+    try:
+        story = Story.query.get(story_id)
+        if not story:
+            notify("Story not found", user_id)
+            return {"status": "error", "error": "Story not found."}
+
+        if story.final_markdown:
+            combined_md = story.final_markdown
+        else:
+            chapters = Chapter.query.filter_by(story_id=story.id).order_by(Chapter.chapter_number).all()
+            combined_md = (
+                f"# {story.title}\n\n"
+                f"**Date:** {story.created_at.strftime('%B %d, %Y')}\n\n"
+            )
+            for chapter in chapters:
+                combined_md += (
+                    f"# Chapter {chapter.chapter_number}: {chapter.title}\n\n"
+                    f"{chapter.content}\n\n"
+                )
+
+        cmd = [
+            "pandoc",
+            "--from", "markdown",
+            "--to", "epub",
+            "--epub-chapter-level=2",
+            "--metadata", f"title={story.title}",
+            "--metadata", "language=English",
+            "-"
+        ]
+
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        epub_data, err = proc.communicate(input=combined_md.encode("utf-8"))
+
+        if proc.returncode != 0:
+            raise Exception(err.decode("utf-8"))
+
+        epub_key = put_image(f"stories/{story.id}/novel.epub", epub_data, content_type="application/epub+zip")
+        socketio.emit("epub_generated", {"story_id": story_id, "url": get_image_url(epub_key)}, room=user_id)
+        return {"status": "success", "epub_key": epub_key}
+    except Exception as e:
+        notify("EPUB Generation Failed", user_id)
+        socketio.emit("epub_error", {"story_id": story_id, "error": str(e)}, room=user_id)
+        return {"status": "error", "error": str(e)}
+    finally:
+        db.session.remove()
+
+@celery_app.task(name="predict_cost_task", bind=True, queue=COST_PREDICTION_QUEUE)
+def predict_cost_task(self, kind, story_id, user_id, chapter_index=None, result_key=None):
+    """
+	Computes an exact predicted cost outside of the request and pushes it to the user.
+    
+    The preview endpoints answer immediately with a byte-based estimate and queue this task; once the
+    prompt has been tokenized a "cost_predicted" event carrying the task ID as job_id is emitted to the
+    user's room so the page can replace the estimate. The total is also stored under result_key so
+    repeat previews of the same story state are answered inline instead of queueing again.
+    
+    Args:
+        kind (str): One of the PREDICTED_COST_FUNCTIONS keys, e.g. "meta", "chapter" or "all_chapters".
+        story_id (int): The ID of the story to price.
+        user_id (int): The ID of the user who requested the prediction.
+        chapter_index (int, optional): The zero-based chapter index when kind is "chapter".
+        result_key (str, optional): The Redis key from cost_prediction_key to store the total under.
+    
+    Returns:
+        dict: {"status": "success", "total_predicted_credit_cost": <int>} on success, or {"status": "error", "error": "<error_message>"} on failure.
+    """
+    try:
+        story = Story.query.get(story_id)
+        if not story:
+            return {"status": "error", "error": "Story not found."}
+        total = calculate_predicted_total_cost(kind, story, chapter_index)
+        if result_key:
+            locking_queue.hset(result_key, "total", total)
+            locking_queue.expire(result_key, PREDICTED_COST_CACHE_TTL)
+        socketio.emit("cost_predicted", {
+            "job_id": self.request.id,
+            "story_id": story_id,
+            "kind": kind,
+            "total_predicted_credit_cost": total
+        }, room=user_id)
+        return {"status": "success", "total_predicted_credit_cost": total}
+    except Exception as e:
+        if result_key:
+            locking_queue.delete(result_key)
+        return {"status": "error", "error": str(e)}
+    finally:
+        db.session.remove()
+
+@celery_app.task(name="send_email_task")
+def send_email_task(email, subject, html_content):
+    """
+	Sends an email through Mailgun outside of the web request.
+    
+    Args:
+        email (str): The recipient's email address.
+        subject (str): The subject line of the email.
+        html_content (str): The HTML body of the email.
+    
+    Returns:
+        dict: {"status": "success"} if Mailgun accepted the message, otherwise {"status": "error"}.
+    """
+    return {"status": "success" if send_email(email, subject, html_content) else "error"}
+
+@celery_app.task(name="send_bulk_email_task")
+def send_bulk_email_task(recipients, subject, html_template):
+    """
+	Sends a personalized email to many recipients through Mailgun batch sending outside of the web request.
+    
+    Args:
+        recipients (list): Dictionaries with an 'email' key plus the recipient's template variables.
+        subject (str): The subject line of the email.
+        html_template (str): The HTML body with %recipient.<name>% placeholders.
+    
+    Returns:
+        dict: {"status": "success", "sent": <count>} with the number of recipients Mailgun accepted.
+    """
+    return {"status": "success", "sent": send_bulk_email(recipients, subject, html_template)}
@@ -0,0 +1,6 @@
+import eventlet
+eventlet.monkey_patch()
+
+from app import app, socketio, notification_writer
+
+socketio.start_background_task(notification_writer)